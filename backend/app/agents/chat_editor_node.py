@@ -13,15 +13,26 @@ EDIT TYPES:
 - remove: delete a piece of furniture from layout and image
 """
 
-import json
-import base64
+import re
+import orjson
+import numpy as np
 import asyncio
-from typing import List, Optional, Dict, Any, Tuple
-from google import genai
+import copy
+import difflib
+import hashlib
+import time
+from collections import OrderedDict
+from functools import lru_cache
+from typing import Callable, List, Optional, Dict, Any, Tuple
 from google.genai import types
+from langgraph.config import get_stream_writer
 
 from app.models.state import AgentState
-from app.models.room import RoomObject, RoomDimensions
+from app.models.room import RoomObject, RoomDimensions, ObjectType
+from app.core import gemini, imaging
+from app.core.background_loop import run_sync
+from app.config import get_settings
+from app.tools.edit_image import get_edit_image_tool
 
 # LangSmith tracing
 try:
@@ -35,6 +46,421 @@ except ImportError:
         return decorator
 
 
+# Request configs are the same on every call; build them once
+_JSON_CONFIG = types.GenerateContentConfig(response_mime_type="application/json")
+_IMAGE_EDIT_CONFIG = types.GenerateContentConfig(response_modalities=["image", "text"], temperature=0.2)
+
+# Parsed-command cache: (command, furniture signature, plan) -> (expires_at, (edit_type, orjson bytes))
+_PARSE_CACHE_MAX = 256
+_PARSE_CACHE_TTL_S = 600.0
+_parse_cache: "OrderedDict[tuple, Tuple[float, Tuple[str, bytes]]]" = OrderedDict()
+
+# Move step sizes (percent of room) and (bbox axis, sign) per direction
+MOVE_DISTANCES = {"small": 5, "medium": 10, "large": 20}
+MOVE_DIRECTIONS = {
+    "left": (0, -1),
+    "right": (0, 1),
+    "up": (1, -1),
+    "down": (1, 1),
+}
+
+# Cosmetic edit results keyed on (image digest, instruction). Entries hold
+# whole base64 images, so the cap is kept small.
+_IMAGE_EDIT_CACHE_MAX = 32
+_image_edit_cache: "OrderedDict[Tuple[bytes, str], str]" = OrderedDict()
+
+# Simple commands that are parsed locally instead of by Gemini
+_FAST_MOVE = re.compile(
+    r"^\s*move\s+(?:the\s+)?(?P<obj>[\w\s]+?)\s+(?:to\s+the\s+)?(?P<dir>left|right|up|down)"
+    r"(?:\s+(?:by\s+)?(?:a\s+)?(?P<dist>small|medium|large|little|lot|bit))?\s*\.?\s*$",
+    re.IGNORECASE,
+)
+_FAST_ROTATE = re.compile(
+    r"^\s*rotate\s+(?:the\s+)?(?P<obj>[\w\s]+?)(?:\s+(?:by\s+)?(?P<deg>90|180|270))?"
+    r"(?:\s*(?:degrees|deg|°))?\s*\.?\s*$",
+    re.IGNORECASE,
+)
+_FAST_DISTANCE_WORDS = {
+    "small": "small", "little": "small", "bit": "small",
+    "medium": "medium",
+    "large": "large", "lot": "large",
+}
+
+# Prompt trimming: labels matched in the command (difflib ratio >= cutoff)
+# plus this many nearest neighbours are sent instead of the whole room.
+_SHORTLIST_SCORE_CUTOFF = 0.6
+_SHORTLIST_MAX_LABELS = 3
+_SHORTLIST_NEIGHBOURS = 2
+
+# Commands parsed within this window against the same layout share one call
+_PARSE_BATCH_WINDOW_S = 0.02
+_PARSE_BATCH_MAX = 8
+
+# Words that usually mean a layout/remove/replace edit
+STRUCTURAL_COMMAND_KEYWORDS = {
+    "move", "shift", "rotate", "turn", "swap", "replace", "convert", "into",
+    "remove", "delete", "rid", "take", "clear", "left", "right", "up", "down",
+    "put", "place", "want",
+}
+
+# Words that clearly mean a cosmetic edit. A speculative image edit (paid,
+# and billed even if cancelled) only starts alongside parsing when one of
+# these is present and no structural keyword is.
+COSMETIC_COMMAND_KEYWORDS = {
+    "color", "colour", "colors", "colours", "paint", "painted", "repaint",
+    "style", "styled", "material", "materials", "texture", "finish",
+    "lighting", "light", "lights", "brighter", "darker", "bright", "dark",
+    "warm", "warmer", "cozy", "cozier", "modern", "rustic", "minimalist",
+    "wood", "wooden", "marble", "fabric", "velvet", "leather", "wallpaper",
+}
+
+# Static parts of the _parse_command prompt, built once at import.
+_PARSE_PROMPT_HEADER = """You are an interior design assistant parsing user edit commands.
+
+CURRENT FURNITURE IN ROOM:
+"""
+
+_PARSE_PROMPT_TAIL = """Classify this command and parse it into a structured format.
+
+EDIT TYPES:
+1. "layout" - Commands that move, rotate, or reposition furniture
+   Examples: "move desk to left", "rotate bed 90 degrees", "swap desk and dresser positions"
+   
+2. "cosmetic" - Commands that change appearance without moving or replacing furniture
+   Examples: "make it more cozy", "change lighting", "make rug blue", "add plants"
+
+3. "replace" - Commands that replace/swap/change one piece of furniture INTO a different type of furniture
+   Examples: "change the table into a workdesk", "replace the sofa with an armchair",
+             "turn the chair into a bean bag", "swap the nightstand for a bookshelf",
+             "make the desk a standing desk", "convert the table to a dining table"
+   KEY: The user wants the OLD furniture REMOVED and a NEW different furniture placed at the EXACT SAME position.
+
+4. "remove" - Commands that DELETE/REMOVE a piece of furniture entirely from the room
+   Examples: "remove the desk", "delete the rug", "get rid of the nightstand",
+             "take out the lamp", "I don't want the dresser", "remove chair_1",
+             "clear the coffee table", "take away the plant"
+   KEY: The user wants a specific object COMPLETELY GONE from the room — not replaced, not moved, just removed.
+   IMPORTANT: For remove, you MUST set target_object_id to the matching furniture id from the list above.
+   If the user says a label like "desk", find the matching id (e.g. "desk_1") from the furniture list.
+
+Return JSON:
+{
+  "edit_type": "layout" | "cosmetic" | "replace" | "remove",
+  "action": "move" | "rotate" | "style" | "add" | "remove" | "replace",
+  "target_object_id": "id of the furniture being acted on, or null",
+  "target_object_ids": ["ids when one move applies to several pieces together, otherwise omit"],
+  "parameters": {
+    "direction": "left|right|up|down" (for move),
+    "distance": "small|medium|large" (for move),
+    "rotation": 90 (degrees, for rotate),
+    "style_change": "description" (for cosmetic),
+    "old_furniture": "what the current furniture is" (for replace),
+    "new_furniture": "what it should become" (for replace)
+  },
+  "natural_description": "Human-readable description of the change"
+}"""
+
+_PARSE_BATCH_SUFFIX = """
+
+Apply the format above to EVERY numbered command and return JSON:
+{"results": [<one object per command, in the same order>]}"""
+
+
+@lru_cache(maxsize=128)
+def _furniture_json(furniture: Tuple[Tuple[str, str], ...]) -> str:
+    """Compact JSON of (id, label) pairs, reused across edits on the same layout."""
+    return orjson.dumps(
+        [{"id": obj_id, "label": label} for obj_id, label in furniture]
+    ).decode()
+
+
+def _furniture_signature(current_layout: List[RoomObject]) -> Tuple[Tuple[str, str], ...]:
+    return tuple((obj.id, obj.label) for obj in current_layout)
+
+
+def _label_score(label: str, words: List[str], command: str) -> float:
+    """Fuzzy score of an object label against the command (1.0 = exact mention)."""
+    label = label.lower().replace("_", " ")
+    if label in command:
+        return 1.0
+    label_words = label.split()
+    n = len(label_words)
+    best = 0.0
+    for i in range(len(words) - n + 1):
+        ratio = difflib.SequenceMatcher(None, label, " ".join(words[i:i + n])).ratio()
+        best = max(best, ratio)
+    return best
+
+
+def _shortlist_targets(command: str, current_layout: List[RoomObject]) -> List[RoomObject]:
+    """
+    Objects the command most likely refers to, plus a couple of spatial
+    neighbours for context. Falls back to the full layout when nothing in
+    the command matches a label or id.
+    """
+    command = command.lower()
+    words = command.replace(",", " ").split()
+    scores: Dict[str, float] = {}
+    for obj in current_layout:
+        if obj.id.lower() in command:
+            scores[obj.label.lower()] = 1.0
+        elif obj.label.lower() not in scores:
+            scores[obj.label.lower()] = _label_score(obj.label, words, command)
+
+    matched = sorted(
+        (label for label, score in scores.items() if score >= _SHORTLIST_SCORE_CUTOFF),
+        key=lambda label: -scores[label],
+    )[:_SHORTLIST_MAX_LABELS]
+    if not matched:
+        return current_layout
+
+    shortlist = [o for o in current_layout if o.label.lower() in matched]
+    anchor_x, anchor_y = shortlist[0].center
+    others = [o for o in current_layout if o.label.lower() not in matched]
+    others.sort(key=lambda o: (o.center[0] - anchor_x) ** 2 + (o.center[1] - anchor_y) ** 2)
+    shortlist.extend(others[:_SHORTLIST_NEIGHBOURS])
+    return shortlist if len(shortlist) < len(current_layout) else current_layout
+
+
+def _fast_parse(command: str, current_layout: List[RoomObject]) -> Optional[Dict[str, Any]]:
+    """
+    Parse plain "move X left" / "rotate X 90" commands without Gemini.
+    Returns None when the command or its target is ambiguous.
+    """
+    match = _FAST_MOVE.match(command) or _FAST_ROTATE.match(command)
+    if not match:
+        return None
+
+    name = match.group("obj").strip().lower()
+    candidates = [o for o in current_layout if o.id.lower() == name]
+    if not candidates:
+        candidates = [
+            o for o in current_layout
+            if o.label.lower().replace("_", " ") == name.replace("_", " ")
+        ]
+    if len(candidates) != 1:
+        return None
+    target = candidates[0]
+
+    if match.re is _FAST_MOVE:
+        direction = match.group("dir").lower()
+        distance = _FAST_DISTANCE_WORDS.get((match.group("dist") or "medium").lower(), "medium")
+        return {
+            "edit_type": "layout",
+            "action": "move",
+            "target_object_id": target.id,
+            "parameters": {"direction": direction, "distance": distance},
+            "natural_description": f"Move {target.label} {direction}",
+        }
+
+    rotation = int(match.group("deg") or 90)
+    return {
+        "edit_type": "layout",
+        "action": "rotate",
+        "target_object_id": target.id,
+        "parameters": {"rotation": rotation},
+        "natural_description": f"Rotate {target.label} by {rotation} degrees",
+    }
+
+
+def _design_context(layout_plan: Optional[Dict[str, Any]]) -> str:
+    """Format design context from layout_plan if available."""
+    if not layout_plan:
+        return ""
+    return f"""
+DESIGN CONTEXT (The current layout follows this plan):
+- Concept: {layout_plan.get('concept_name', 'Custom Layout')}
+- Description: {layout_plan.get('description', 'User generated layout')}
+- Intent (Furniture Placement): {orjson.dumps(layout_plan.get('furniture_placement', {}), option=orjson.OPT_INDENT_2).decode()}
+"""
+
+
+def _cosmetic_fallback(command: str) -> Dict[str, Any]:
+    return {
+        "edit_type": "cosmetic",
+        "action": "style",
+        "natural_description": command
+    }
+
+
+def _parse_cache_key(
+    command: str,
+    furniture: Tuple[Tuple[str, str], ...],
+    layout_plan: Optional[Dict[str, Any]]
+) -> tuple:
+    return (
+        command.strip().lower(),
+        furniture,
+        orjson.dumps(layout_plan, option=orjson.OPT_SORT_KEYS | orjson.OPT_NON_STR_KEYS, default=str) if layout_plan else None,
+    )
+
+
+def _parse_cache_get(key: tuple) -> Optional[Tuple[str, Dict[str, Any]]]:
+    cached = _parse_cache.get(key)
+    if cached is None:
+        return None
+    if cached[0] <= time.monotonic():
+        del _parse_cache[key]
+        return None
+    _parse_cache.move_to_end(key)
+    # Stored serialized so every hit gets its own nested dicts
+    edit_type, blob = cached[1]
+    return edit_type, orjson.loads(blob)
+
+
+def _parse_cache_put(key: tuple, parsed: Dict[str, Any]) -> Tuple[str, Dict[str, Any]]:
+    edit_type = parsed.get("edit_type", "cosmetic")
+    _parse_cache[key] = (time.monotonic() + _PARSE_CACHE_TTL_S, (edit_type, orjson.dumps(parsed)))
+    if len(_parse_cache) > _PARSE_CACHE_MAX:
+        _parse_cache.popitem(last=False)
+    return edit_type, parsed
+
+
+def layout_to_soa(objects: List[RoomObject]) -> np.ndarray:
+    """Stack object bboxes into an (N, 4) int array of [x, y, w, h] rows."""
+    return np.asarray([o.bbox for o in objects], dtype=np.int64).reshape(-1, 4)
+
+
+def move_bboxes(bboxes: np.ndarray, direction: str, distance: int) -> np.ndarray:
+    """Translate (N, 4) bboxes and clamp each so it stays inside 0-100."""
+    axis, sign = MOVE_DIRECTIONS[direction]
+    delta = np.zeros(2, dtype=bboxes.dtype)
+    delta[axis] = sign * distance
+    moved = bboxes.copy()
+    moved[:, :2] = np.clip(
+        moved[:, :2] + delta,
+        0,
+        np.maximum(100 - moved[:, 2:], 0),
+    )
+    return moved
+
+
+def _image_edit_cache_key(image_base64: str, instruction: str) -> Tuple[bytes, str]:
+    # Hash the base64 text itself; decoding a multi-MB render just to key it is wasted work
+    image_base64 = imaging.strip_data_url(image_base64)
+    digest = hashlib.blake2b(image_base64.encode(), digest_size=16).digest()
+    return digest, instruction.strip()
+
+
+def _emit_image_frame(frame: str) -> None:
+    """Forward a partial edit to LangGraph's custom stream, if inside a graph run."""
+    try:
+        writer = get_stream_writer()
+    except RuntimeError:
+        return
+    writer({"output_image_base64": frame})
+
+
+class _FrameRelay:
+    """
+    Frame sink for a speculative edit: frames are held back until the parse
+    confirms the edit (release), then the backlog is streamed and later
+    frames go out live. Dropped unseen if the edit is cancelled.
+    """
+
+    def __init__(self):
+        self._held: List[str] = []
+        self._live = False
+
+    def __call__(self, frame: str) -> None:
+        if self._live:
+            _emit_image_frame(frame)
+        else:
+            self._held.append(frame)
+
+    def release(self) -> None:
+        self._live = True
+        for frame in self._held:
+            _emit_image_frame(frame)
+        self._held.clear()
+
+
+class _ParseBatcher:
+    """
+    Micro-batches _parse_command calls. Commands arriving within a short
+    window for the same layout are classified in one Gemini request.
+    """
+
+    def __init__(self, editor: "ChatEditor"):
+        self._editor = editor
+        self._pending: Dict[tuple, List[Tuple[str, asyncio.Future]]] = {}
+        self._timers: Dict[tuple, asyncio.TimerHandle] = {}
+        # Strong refs: the loop only holds weak ones to running tasks
+        self._flush_tasks: set = set()
+
+    async def parse(
+        self,
+        command: str,
+        current_layout: List[RoomObject],
+        layout_plan: Optional[Dict[str, Any]] = None
+    ) -> Tuple[str, Dict[str, Any]]:
+        fast = _fast_parse(command, current_layout)
+        if fast is not None:
+            return fast["edit_type"], fast
+
+        furniture = _furniture_signature(current_layout)
+        cached = _parse_cache_get(_parse_cache_key(command, furniture, layout_plan))
+        if cached is not None:
+            return cached
+
+        loop = asyncio.get_running_loop()
+        key = (loop, furniture, _parse_cache_key("", furniture, layout_plan)[2])
+        future = loop.create_future()
+        batch = self._pending.get(key)
+        if batch is None:
+            batch = self._pending[key] = []
+            self._timers[key] = loop.call_later(
+                _PARSE_BATCH_WINDOW_S, self._start_flush, key, current_layout, layout_plan
+            )
+        batch.append((command, future))
+        if len(batch) >= _PARSE_BATCH_MAX:
+            self._start_flush(key, current_layout, layout_plan)
+        return await future
+
+    def _start_flush(
+        self,
+        key: tuple,
+        current_layout: List[RoomObject],
+        layout_plan: Optional[Dict[str, Any]]
+    ) -> None:
+        # Take the batch now so later commands open a fresh window, and drop
+        # its timer so it can't fire early on that next batch
+        timer = self._timers.pop(key, None)
+        if timer is not None:
+            timer.cancel()
+        batch = self._pending.pop(key, None)
+        if not batch:
+            return
+        task = asyncio.get_running_loop().create_task(self._flush(batch, current_layout, layout_plan))
+        self._flush_tasks.add(task)
+        task.add_done_callback(self._flush_tasks.discard)
+
+    async def _flush(
+        self,
+        batch: List[Tuple[str, asyncio.Future]],
+        current_layout: List[RoomObject],
+        layout_plan: Optional[Dict[str, Any]]
+    ) -> None:
+        # A double submit lands in the same window: parse each distinct
+        # command once and resolve every future waiting on it
+        commands = list(dict.fromkeys(command for command, _ in batch))
+        try:
+            if len(commands) == 1:
+                results = [await self._editor._parse_command(commands[0], current_layout, layout_plan)]
+            else:
+                results = await self._editor._parse_commands_batch(commands, current_layout, layout_plan)
+        except Exception as e:
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+        by_command = dict(zip(commands, results))
+        for command, future in batch:
+            if not future.done():
+                edit_type, parsed = by_command[command]
+                future.set_result((edit_type, copy.deepcopy(parsed)))
+
+
 class ChatEditor:
     """
     Conversational editing agent for room layouts and renders.
@@ -42,17 +468,16 @@ class ChatEditor:
     """
     
     def __init__(self):
-        from app.config import get_settings
-        from app.tools.edit_image import EditImageTool
-        
         settings = get_settings()
         api_key = settings.google_api_key
         if not api_key:
             raise ValueError("GOOGLE_API_KEY not set in .env file")
-        self.client = genai.Client(api_key=api_key)
+        self.client = gemini.get_genai_client(api_key)
         self.reasoning_model = settings.planning_model_name
         self.render_image_model_name = settings.render_image_model_name
-        self.edit_tool = EditImageTool()
+        self.edit_tool = get_edit_image_tool()
+        self._parse_batcher = _ParseBatcher(self)
+        self._inflight: Dict[tuple, asyncio.Task] = {}
 
     @traceable(
         name="chat_editor.process_edit_command", 
@@ -72,8 +497,38 @@ class ChatEditor:
         Process a natural language editing command.
         TRACED: Full chain with command parsing and edit application.
         """
-        # First, classify the edit type (traced)
-        edit_type, parsed_command = await self._parse_command(command, current_layout, layout_plan)
+        # Classify the edit type (traced). When the command reads like a
+        # cosmetic tweak, start the image edit alongside the parse so the two
+        # Gemini round-trips overlap; it is cancelled if the parse disagrees.
+        speculative_edit = None
+        if current_image_base64 and self._looks_cosmetic(command):
+            relay = _FrameRelay()
+            speculative_edit = asyncio.create_task(
+                self._speculative_image_edit(command, current_image_base64, relay)
+            )
+
+        try:
+            edit_type, parsed_command = await self._parse_batcher.parse(command, current_layout, layout_plan)
+        except BaseException:
+            if speculative_edit:
+                speculative_edit.cancel()
+            raise
+
+        # The speculative edit was prompted with the user's own command, so it
+        # stands whenever the parse confirms a cosmetic edit; the parser's
+        # rewording of natural_description doesn't warrant a second paid edit
+        if speculative_edit and edit_type not in ("layout", "remove", "replace"):
+            relay.release()
+            updated_image, explanation = await speculative_edit
+            return {
+                "edit_type": "cosmetic",
+                "updated_layout": current_layout,
+                "updated_image_base64": updated_image,
+                "explanation": explanation,
+                "needs_rerender": False
+            }
+        if speculative_edit:
+            speculative_edit.cancel()
         
         if edit_type == "layout":
             # Structural edit - modify layout positions
@@ -149,6 +604,24 @@ class ChatEditor:
                     "needs_rerender": True
                 }
 
+    @staticmethod
+    def _looks_cosmetic(command: str) -> bool:
+        """Cheap keyword check used to decide whether to prefetch a cosmetic edit."""
+        words = set(command.lower().replace(",", " ").replace(".", " ").split())
+        return bool(words & COSMETIC_COMMAND_KEYWORDS) and not (words & STRUCTURAL_COMMAND_KEYWORDS)
+
+    async def _speculative_image_edit(
+        self,
+        command: str,
+        current_image_base64: str,
+        relay: "_FrameRelay"
+    ) -> Tuple[str, str]:
+        """Cosmetic edit using the raw command, run while the command is parsed."""
+        # Frames go to the relay: this edit may be cancelled if the parse disagrees
+        return await self._apply_image_edit(
+            {"natural_description": command}, current_image_base64, on_frame=relay
+        )
+
     @traceable(
         name="gemini_parse_command", 
         run_type="llm", 
@@ -163,86 +636,118 @@ class ChatEditor:
     ) -> Tuple[str, Dict[str, Any]]:
         """
         Parse natural language command into structured edit instruction.
+        Results are cached per (command, furniture set, plan) for a short TTL.
         TRACED as an LLM call.
         """
-        furniture_list = [{"id": obj.id, "label": obj.label} for obj in current_layout]
-        
-        # Format design context from layout_plan if available
-        design_context = ""
-        if layout_plan:
-            design_context = f"""
-DESIGN CONTEXT (The current layout follows this plan):
-- Concept: {layout_plan.get('concept_name', 'Custom Layout')}
-- Description: {layout_plan.get('description', 'User generated layout')}
-- Intent (Furniture Placement): {json.dumps(layout_plan.get('furniture_placement', {}), indent=2)}
-"""
-
-        prompt = f"""You are an interior design assistant parsing user edit commands.
-
-CURRENT FURNITURE IN ROOM:
-{json.dumps(furniture_list, indent=2)}
-{design_context}
-
-USER COMMAND: "{command}"
-
-Classify this command and parse it into a structured format.
-
-EDIT TYPES:
-1. "layout" - Commands that move, rotate, or reposition furniture
-   Examples: "move desk to left", "rotate bed 90 degrees", "swap desk and dresser positions"
-   
-2. "cosmetic" - Commands that change appearance without moving or replacing furniture
-   Examples: "make it more cozy", "change lighting", "make rug blue", "add plants"
+        fast = _fast_parse(command, current_layout)
+        if fast is not None:
+            return fast["edit_type"], fast
 
-3. "replace" - Commands that replace/swap/change one piece of furniture INTO a different type of furniture
-   Examples: "change the table into a workdesk", "replace the sofa with an armchair",
-             "turn the chair into a bean bag", "swap the nightstand for a bookshelf",
-             "make the desk a standing desk", "convert the table to a dining table"
-   KEY: The user wants the OLD furniture REMOVED and a NEW different furniture placed at the EXACT SAME position.
+        furniture = _furniture_signature(current_layout)
+        cache_key = _parse_cache_key(command, furniture, layout_plan)
+        cached = _parse_cache_get(cache_key)
+        if cached is not None:
+            return cached
 
-4. "remove" - Commands that DELETE/REMOVE a piece of furniture entirely from the room
-   Examples: "remove the desk", "delete the rug", "get rid of the nightstand",
-             "take out the lamp", "I don't want the dresser", "remove chair_1",
-             "clear the coffee table", "take away the plant"
-   KEY: The user wants a specific object COMPLETELY GONE from the room — not replaced, not moved, just removed.
-   IMPORTANT: For remove, you MUST set target_object_id to the matching furniture id from the list above.
-   If the user says a label like "desk", find the matching id (e.g. "desk_1") from the furniture list.
+        # Single-flight: identical concurrent parses (double submits) share
+        # one Gemini request instead of each making their own.
+        loop = asyncio.get_running_loop()
+        inflight_key = (loop, cache_key)
+        task = self._inflight.get(inflight_key)
+        if task is None:
+            task = loop.create_task(
+                self._request_parse(command, current_layout, layout_plan, cache_key)
+            )
+            self._inflight[inflight_key] = task
+            task.add_done_callback(lambda _: self._inflight.pop(inflight_key, None))
+        edit_type, parsed = await asyncio.shield(task)
+        return edit_type, copy.deepcopy(parsed)
 
-Return JSON:
-{{
-  "edit_type": "layout" | "cosmetic" | "replace" | "remove",
-  "action": "move" | "rotate" | "style" | "add" | "remove" | "replace",
-  "target_object_id": "id of the furniture being acted on, or null",
-  "parameters": {{
-    "direction": "left|right|up|down" (for move),
-    "distance": "small|medium|large" (for move),
-    "rotation": 90 (degrees, for rotate),
-    "style_change": "description" (for cosmetic),
-    "old_furniture": "what the current furniture is" (for replace),
-    "new_furniture": "what it should become" (for replace)
-  }},
-  "natural_description": "Human-readable description of the change"
-}}"""
+    async def _request_parse(
+        self,
+        command: str,
+        current_layout: List[RoomObject],
+        layout_plan: Optional[Dict[str, Any]],
+        cache_key: tuple
+    ) -> Tuple[str, Dict[str, Any]]:
+        """Gemini half of _parse_command; falls back to a cosmetic edit on failure."""
+        prompt = "".join([
+            _PARSE_PROMPT_HEADER,
+            _furniture_json(_furniture_signature(_shortlist_targets(command, current_layout))),
+            "\n",
+            _design_context(layout_plan),
+            '\n\nUSER COMMAND: "',
+            command,
+            '"\n\n',
+            _PARSE_PROMPT_TAIL,
+        ])
 
         try:
-            response = self.client.models.generate_content(
+            response = await gemini.generate_content(
+                self.client,
                 model=self.reasoning_model,
                 contents=[prompt],
-                config=types.GenerateContentConfig(
-                    response_mime_type="application/json"
-                )
+                config=_JSON_CONFIG
             )
             
-            parsed = json.loads(response.text)
-            return parsed.get("edit_type", "cosmetic"), parsed
+            parsed = orjson.loads(response.text)
+            return _parse_cache_put(cache_key, parsed)
             
         except Exception as e:
             # Default to cosmetic if parsing fails
-            return "cosmetic", {
-                "edit_type": "cosmetic",
-                "action": "style",
-                "natural_description": command
-            }
+            return "cosmetic", _cosmetic_fallback(command)
+
+    @traceable(
+        name="gemini_parse_commands_batch",
+        run_type="llm",
+        tags=["gemini", "chat", "parsing", "batch", "api-call"],
+        metadata={"model_type": "gemini-pro", "task": "command_parsing"}
+    )
+    async def _parse_commands_batch(
+        self,
+        commands: List[str],
+        current_layout: List[RoomObject],
+        layout_plan: Optional[Dict[str, Any]] = None
+    ) -> List[Tuple[str, Dict[str, Any]]]:
+        """
+        Classify several commands against the same layout in one Gemini call.
+        The furniture context is sent once; results come back in command order.
+        TRACED as an LLM call.
+        """
+        furniture = _furniture_signature(current_layout)
+        numbered = "\n".join(f'{i}. "{cmd}"' for i, cmd in enumerate(commands, 1))
+        prompt = "".join([
+            _PARSE_PROMPT_HEADER,
+            _furniture_json(furniture),
+            "\n",
+            _design_context(layout_plan),
+            "\n\nUSER COMMANDS:\n",
+            numbered,
+            "\n\nEach numbered command is independent. ",
+            _PARSE_PROMPT_TAIL,
+            _PARSE_BATCH_SUFFIX,
+        ])
+
+        try:
+            response = await gemini.generate_content(
+                self.client,
+                model=self.reasoning_model,
+                contents=[prompt],
+                config=_JSON_CONFIG
+            )
+            results = orjson.loads(response.text).get("results", [])
+        except Exception:
+            results = []
+
+        parsed_all = []
+        for i, command in enumerate(commands):
+            parsed = results[i] if i < len(results) else None
+            if isinstance(parsed, dict):
+                key = _parse_cache_key(command, furniture, layout_plan)
+                parsed_all.append(_parse_cache_put(key, parsed))
+            else:
+                parsed_all.append(("cosmetic", _cosmetic_fallback(command)))
+        return parsed_all
 
     @traceable(name="apply_layout_edit", run_type="chain", tags=["edit", "layout"])
     async def _apply_layout_edit(
@@ -259,59 +764,72 @@ Return JSON:
         action = parsed_command.get("action", "move")
         params = parsed_command.get("parameters", {})
         
-        # Find target object
-        target_obj = None
+        # Find target object, keeping its position for the in-place update
+        target_index, target_obj = None, None
         if target_id:
-            target_obj = next((o for o in current_layout if o.id == target_id), None)
+            target_index, target_obj = next(
+                ((i, o) for i, o in enumerate(current_layout) if o.id == target_id), (None, None)
+            )
         
-        if not target_obj and action in ["move", "rotate"]:
+        if action not in ("move", "rotate"):
+            # Nothing to reposition; hand back the layout as-is
+            return current_layout, f"Processed command: {parsed_command.get('natural_description', 'Unknown edit')}"
+        
+        # Group moves ("move the desk and chair left") are clamped in one pass
+        group_ids = parsed_command.get("target_object_ids") or []
+        if action == "move" and len(group_ids) > 1:
+            return self._apply_group_move(group_ids, params, current_layout)
+        
+        if not target_obj:
             return current_layout, f"Could not find target object for edit. Available: {[o.label for o in current_layout]}"
         
-        # Create updated layout
-        updated_layout = []
-        explanation = ""
+        # Reuse untouched objects; only the edited one gets a fresh copy
+        obj = target_obj
+        new_obj = obj.model_copy(update={"bbox": list(obj.bbox)})
         
-        for obj in current_layout:
-            new_obj = RoomObject(
-                id=obj.id,
-                label=obj.label,
-                bbox=obj.bbox.copy(),
-                type=obj.type,
-                orientation=obj.orientation,
-                is_locked=obj.is_locked,
-                z_index=obj.z_index,
-                material_hint=obj.material_hint
-            )
+        if action == "move":
+            direction = params.get("direction", "")
+            distance = MOVE_DISTANCES.get(params.get("distance", "medium"), 10)
             
-            if target_obj and obj.id == target_obj.id:
-                if action == "move":
-                    direction = params.get("direction", "")
-                    distance_map = {"small": 5, "medium": 10, "large": 20}
-                    distance = distance_map.get(params.get("distance", "medium"), 10)
-                    
-                    if direction == "left":
-                        new_obj.bbox[0] = max(0, new_obj.bbox[0] - distance)
-                    elif direction == "right":
-                        new_obj.bbox[0] = min(100 - new_obj.bbox[2], new_obj.bbox[0] + distance)
-                    elif direction == "up":
-                        new_obj.bbox[1] = max(0, new_obj.bbox[1] - distance)
-                    elif direction == "down":
-                        new_obj.bbox[1] = min(100 - new_obj.bbox[3], new_obj.bbox[1] + distance)
-                    
-                    explanation = f"Moved {obj.label} {direction} by {distance}%"
-                
-                elif action == "rotate":
-                    rotation = params.get("rotation", 90)
-                    new_obj.orientation = (new_obj.orientation + rotation) % 360
-                    explanation = f"Rotated {obj.label} by {rotation} degrees (now facing {new_obj.orientation}deg)"
+            if direction in MOVE_DIRECTIONS:
+                axis, sign = MOVE_DIRECTIONS[direction]
+                bbox = new_obj.bbox
+                bbox[axis] = max(0, min(100 - bbox[axis + 2], bbox[axis] + sign * distance))
             
-            updated_layout.append(new_obj)
+            explanation = f"Moved {obj.label} {direction} by {distance}%"
         
-        if not explanation:
-            explanation = f"Processed command: {parsed_command.get('natural_description', 'Unknown edit')}"
+        else:
+            rotation = params.get("rotation", 90)
+            new_obj.orientation = (new_obj.orientation + rotation) % 360
+            explanation = f"Rotated {obj.label} by {rotation} degrees (now facing {new_obj.orientation}deg)"
         
+        updated_layout = list(current_layout)
+        updated_layout[target_index] = new_obj
         return updated_layout, explanation
 
+    def _apply_group_move(
+        self,
+        target_ids: List[str],
+        params: Dict[str, Any],
+        current_layout: List[RoomObject]
+    ) -> Tuple[List[RoomObject], str]:
+        """Move several objects together, clamping all bboxes with NumPy."""
+        direction = params.get("direction", "")
+        distance = MOVE_DISTANCES.get(params.get("distance", "medium"), 10)
+        wanted = set(target_ids)
+        indices = [i for i, o in enumerate(current_layout) if o.id in wanted]
+        if not indices or direction not in MOVE_DIRECTIONS:
+            return current_layout, f"Could not find target objects for edit. Available: {[o.label for o in current_layout]}"
+        
+        bboxes = layout_to_soa([current_layout[i] for i in indices])
+        moved = move_bboxes(bboxes, direction, distance).tolist()
+        
+        updated_layout = list(current_layout)
+        for i, bbox in zip(indices, moved):
+            updated_layout[i] = current_layout[i].model_copy(update={"bbox": bbox})
+        labels = ", ".join(current_layout[i].label for i in indices)
+        return updated_layout, f"Moved {labels} {direction} by {distance}%"
+
     # ========================================================================
     # REMOVE EDIT — remove object from layout data
     # ========================================================================
@@ -343,15 +861,15 @@ Return JSON:
                     break
 
         if not target_obj:
-            available = [f"{o.id} ({o.label})" for o in current_layout if o.type.value == "movable"]
+            available = ", ".join(f"{o.id} ({o.label})" for o in current_layout if o.type is ObjectType.MOVABLE)
             return (
                 current_layout,
                 None,
-                f"Could not find the object to remove. Available movable objects: {', '.join(available)}"
+                f"Could not find the object to remove. Available movable objects: {available}"
             )
 
         # Prevent removing structural objects
-        if target_obj.type.value == "structural":
+        if target_obj.type is ObjectType.STRUCTURAL:
             return (
                 current_layout,
                 None,
@@ -404,22 +922,18 @@ CRITICAL RULES:
 Generate the edited room photograph with the {removed_label} removed."""
 
         try:
-            if "," in current_image_base64:
-                current_image_base64 = current_image_base64.split(",")[1]
+            current_image_base64 = imaging.strip_data_url(current_image_base64)
 
-            image_data = base64.b64decode(current_image_base64)
+            image_data = imaging.b64decode(current_image_base64)
 
-            response = await asyncio.to_thread(
-                self.client.models.generate_content,
+            response = await gemini.generate_content(
+                self.client,
                 model=self.render_image_model_name,
                 contents=[
                     types.Part.from_bytes(data=image_data, mime_type="image/png"),
                     prompt
                 ],
-                config=types.GenerateContentConfig(
-                    response_modalities=["image", "text"],
-                    temperature=0.2,
-                )
+                config=_IMAGE_EDIT_CONFIG
             )
 
             if (response.candidates
@@ -427,7 +941,7 @@ Generate the edited room photograph with the {removed_label} removed."""
                     and response.candidates[0].content.parts):
                 for part in response.candidates[0].content.parts:
                     if hasattr(part, 'inline_data') and part.inline_data:
-                        new_image = base64.b64encode(part.inline_data.data).decode('utf-8')
+                        new_image = imaging.b64encode_str(part.inline_data.data)
                         return new_image, f"Visually erased the {removed_label} from the image."
 
             return current_image_base64, f"Could not erase {removed_label} from image — model returned no image."
@@ -494,22 +1008,18 @@ REQUIREMENTS:
 Generate the edited room photograph."""
 
         try:
-            if "," in current_image_base64:
-                current_image_base64 = current_image_base64.split(",")[1]
+            current_image_base64 = imaging.strip_data_url(current_image_base64)
 
-            image_data = base64.b64decode(current_image_base64)
+            image_data = imaging.b64decode(current_image_base64)
 
-            response = await asyncio.to_thread(
-                self.client.models.generate_content,
+            response = await gemini.generate_content(
+                self.client,
                 model=self.render_image_model_name,
                 contents=[
                     types.Part.from_bytes(data=image_data, mime_type="image/png"),
                     prompt
                 ],
-                config=types.GenerateContentConfig(
-                    response_modalities=["image", "text"],
-                    temperature=0.2,
-                )
+                config=_IMAGE_EDIT_CONFIG
             )
 
             if (response.candidates
@@ -517,7 +1027,7 @@ Generate the edited room photograph."""
                     and response.candidates[0].content.parts):
                 for part in response.candidates[0].content.parts:
                     if hasattr(part, 'inline_data') and part.inline_data:
-                        new_image = base64.b64encode(part.inline_data.data).decode('utf-8')
+                        new_image = imaging.b64encode_str(part.inline_data.data)
                         return new_image, f"Replaced {old_furniture} with {new_furniture} at the same position."
 
             return current_image_base64, f"Could not generate replacement image. The model returned no image."
@@ -534,25 +1044,47 @@ Generate the edited room photograph."""
     async def _apply_image_edit(
         self,
         parsed_command: Dict[str, Any],
-        current_image_base64: str
+        current_image_base64: str,
+        on_frame: Callable[[str], None] = _emit_image_frame
     ) -> Tuple[str, str]:
         """
         Apply a cosmetic edit to the rendered image.
+        The edit is streamed; each frame goes to on_frame as it arrives,
+        which by default pushes it to LangGraph's custom stream when running
+        inside a graph.
         TRACED as an LLM/image-gen call.
         """
         edit_description = parsed_command.get("natural_description", "Apply the requested change")
         
         try:
-            new_image = await self.edit_tool.edit_image(
+            cache_key = _image_edit_cache_key(current_image_base64, edit_description)
+            cached = _image_edit_cache.get(cache_key)
+            if cached is not None:
+                _image_edit_cache.move_to_end(cache_key)
+                return cached, f"Applied: {edit_description}"
+            
+            new_image = None
+            async for frame in self.edit_tool.edit_image_stream(
                 base_image=current_image_base64,
                 instruction=edit_description
-            )
+            ):
+                new_image = frame
+                on_frame(frame)
+            _image_edit_cache[cache_key] = new_image
+            if len(_image_edit_cache) > _IMAGE_EDIT_CACHE_MAX:
+                _image_edit_cache.popitem(last=False)
             return new_image, f"Applied: {edit_description}"
             
         except Exception as e:
             return current_image_base64, f"Edit failed: {str(e)}"
 
 
+@lru_cache(maxsize=1)
+def get_chat_editor() -> ChatEditor:
+    """Shared ChatEditor so the Gemini client's connection pool is reused."""
+    return ChatEditor()
+
+
 # LangGraph node functions
 
 @traceable(name="chat_editor_node", run_type="chain", tags=["langgraph", "node", "chat"])
@@ -561,7 +1093,9 @@ async def chat_editor_node(state: AgentState) -> Dict[str, Any]:
     LangGraph node for conversational editing.
     TRACED: Full trace with command processing.
     """
-    editor = ChatEditor()
+    editor = get_chat_editor()
+    # A re-render may follow the edit; open its connection in the meantime
+    gemini.prefetch_model(editor.render_image_model_name)
     
     edit_command = state.get("edit_command", "")
     if not edit_command:
@@ -600,13 +1134,4 @@ async def chat_editor_node(state: AgentState) -> Dict[str, Any]:
 
 def chat_editor_node_sync(state: AgentState) -> Dict[str, Any]:
     """Synchronous wrapper for LangGraph compatibility."""
-    import asyncio
-    try:
-        loop = asyncio.get_running_loop()
-    except RuntimeError:
-        return asyncio.run(chat_editor_node(state))
-    else:
-        import concurrent.futures
-        with concurrent.futures.ThreadPoolExecutor() as pool:
-            future = pool.submit(asyncio.run, chat_editor_node(state))
-            return future.result()
\ No newline at end of file
+    return run_sync(chat_editor_node(state))
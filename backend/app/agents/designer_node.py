@@ -14,32 +14,50 @@ ALL FIXES CONSOLIDATED:
 10. Debug logging for all inputs/outputs
 11. Diff-based image prompt (Option A) — only describe what CHANGED
 12. Null-safe response handling for image generation
+13. Plan self-validates against the room image (plan → image, no separate validator call)
 """
 
-import json
-import base64
+import orjson
 import asyncio
+import logging
 import os
+import hashlib
+import string
+import time
+from collections import Counter, OrderedDict
 from datetime import datetime
-from typing import List, Dict, Any, Optional, Set, Tuple
+from typing import AsyncIterator, List, Dict, Any, Optional, Set, Tuple
 from enum import Enum
-from google import genai
+from functools import lru_cache
 from google.genai import types
+from langgraph.config import get_stream_writer
 
 from app.config import get_settings
+from app.core import gemini, imaging
+from app.core.background_loop import run_sync
+from app.core.json_stream import JsonArrayStreamParser
 from app.models.state import AgentState
 from app.models.room import RoomObject, RoomDimensions, ObjectType
 
 try:
     from langsmith import traceable
-    LANGSMITH_ENABLED = True
+    # Installed but not configured: skip the per-call tracing wrapper too
+    LANGSMITH_ENABLED = bool(get_settings().langchain_api_key and get_settings().langchain_tracing_v2)
 except ImportError:
     LANGSMITH_ENABLED = False
+
+if not LANGSMITH_ENABLED:
     def traceable(*args, **kwargs):
         def decorator(func):
             return func
         return decorator
 
+logger = logging.getLogger(__name__)
+
+def _dumps_indent(data: Any) -> str:
+    """Indented JSON for prompt sections."""
+    return orjson.dumps(data, option=orjson.OPT_INDENT_2).decode()
+
 # ============================================================================
 # DEBUG
 # ============================================================================
@@ -52,21 +70,77 @@ def _save_debug_json(filename: str, data: Any):
     try:
         _ensure_debug_dir()
         filepath = os.path.join(DEBUG_DIR, filename)
-        with open(filepath, "w", encoding="utf-8") as f:
-            json.dump(data, f, indent=2, default=str)
-        print(f"[DEBUG] Saved: {filepath}")
+        with open(filepath, "wb") as f:
+            f.write(orjson.dumps(data, option=orjson.OPT_INDENT_2 | orjson.OPT_NON_STR_KEYS | orjson.OPT_SERIALIZE_NUMPY, default=str))
+        logger.debug("Saved: %s", filepath)
     except Exception as e:
-        print(f"[DEBUG] Failed to save {filename}: {e}")
+        logger.warning("Failed to save %s: %s", filename, e)
 
 def _save_debug_image(filename: str, image_base64: str):
     try:
         _ensure_debug_dir()
         filepath = os.path.join(DEBUG_DIR, filename)
         with open(filepath, "wb") as f:
-            f.write(base64.b64decode(image_base64))
-        print(f"[DEBUG] Saved image: {filepath}")
+            f.write(imaging.b64decode(image_base64))
+        logger.debug("Saved image: %s", filepath)
     except Exception as e:
-        print(f"[DEBUG] Failed to save image {filename}: {e}")
+        logger.warning("Failed to save image %s: %s", filename, e)
+
+# ============================================================================
+# LAYOUT IMAGE CACHE — keyed on hash(input image + prompt + model)
+# ============================================================================
+_LAYOUT_IMAGE_CACHE_MAX = 64
+_LAYOUT_IMAGE_CACHE_TTL_S = 3600.0
+_layout_image_cache: "OrderedDict[str, Tuple[float, str]]" = OrderedDict()
+_layout_image_locks: Dict[tuple, asyncio.Lock] = {}
+
+def _layout_image_cache_get(key: str) -> Optional[str]:
+    entry = _layout_image_cache.get(key)
+    if entry is None:
+        return None
+    if entry[0] <= time.monotonic():
+        del _layout_image_cache[key]
+        return None
+    _layout_image_cache.move_to_end(key)
+    return entry[1]
+
+def _layout_image_cache_put(key: str, image_base64: str):
+    _layout_image_cache[key] = (time.monotonic() + _LAYOUT_IMAGE_CACHE_TTL_S, image_base64)
+    if len(_layout_image_cache) > _LAYOUT_IMAGE_CACHE_MAX:
+        _layout_image_cache.popitem(last=False)
+
+# Request configs are the same on every call; build them once
+_PLAN_CONFIG = types.GenerateContentConfig(response_mime_type="application/json", temperature=0.3)
+_IMAGE_CONFIG = types.GenerateContentConfig(response_modalities=["IMAGE", "TEXT"], temperature=0.35)
+
+# Layout image edit prompt, filled per style in _generate_layout_image
+_IMAGE_PROMPT_TMPL = string.Template("""Edit this 2D top-down floor plan. Rearrange furniture for the "$style_name" style.
+
+MOVES TO MAKE:
+$moves_text
+
+$keep_text
+
+RULES:
+1. Output must be a 2D top-down floor plan (same style as input).
+2. MOVE means ERASE from old spot, PLACE in new spot. Do NOT duplicate.
+3. The room must have exactly $movable_count movable items: $count_str.
+4. Do NOT move structural elements (kitchen, bathroom, doors, windows).
+5. Do NOT add any new furniture that wasn't in the original.
+
+Edit the floor plan now.""")
+
+# Position vocabulary for _describe_current_position / _compute_move_instructions
+_THIRDS_X = ("left", "center", "right")
+_THIRDS_Y = ("top", "middle", "bottom")
+_CURRENT_WALL_KEYWORDS = ("west", "east", "north", "south", "left", "right", "top", "bottom")
+_TARGET_POSITION_KEYWORDS = _CURRENT_WALL_KEYWORDS + ("center", "foot of", "opposite", "between")
+
+
+@lru_cache(maxsize=16)
+def _area_name(row: int, col: int) -> str:
+    """Phrase for a cell of the 3x3 room grid, e.g. "in the top-left area"."""
+    return f"in the {_THIRDS_Y[row]}-{_THIRDS_X[col]} area"
 
 # ============================================================================
 # ZONES
@@ -87,6 +161,18 @@ FURNITURE_ZONE_MAP = {
     "lamp": ZoneType.LIVING,
 }
 
+
+@lru_cache(maxsize=512)
+def _zone_for_label(label: str) -> ZoneType:
+    """Zone for a furniture label: direct map hit first, substring scan only on a miss."""
+    zone = FURNITURE_ZONE_MAP.get(label) or FURNITURE_ZONE_MAP.get(label.replace(" ", "_"))
+    if zone:
+        return zone
+    for key, zone in FURNITURE_ZONE_MAP.items():
+        if key in label:
+            return zone
+    return ZoneType.WORK if "chair" in label else ZoneType.LIVING
+
 LAYOUT_SPECIFICATIONS = {
     "work_focused": {
         "name": "Productivity Focus",
@@ -131,12 +217,31 @@ LAYOUT_SPECIFICATIONS = {
 }
 
 
+# Prompt fragments derived from the constant specs, built once at import
+for _spec in LAYOUT_SPECIFICATIONS.values():
+    _tech = _spec.get("technical_spec", {})
+    _spec["_constraints_text"] = "\n".join([f"- {v}" for v in _tech.values()]) if _tech else "No specific constraints."
+
+_BATCH_STYLES_TEXT = "\n\n".join(
+    f"### style_key: {sk} — {sp['name']}\n{sp['description']}\n"
+    f"SPECIFIC CONSTRAINTS (MUST FOLLOW):\n{sp['_constraints_text']}"
+    for sk, sp in LAYOUT_SPECIFICATIONS.items()
+)
+
+_STYLE_ORDER = {sk: i for i, sk in enumerate(LAYOUT_SPECIFICATIONS)}
+
+
+def _in_style_order(variations: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """Variations sorted into LAYOUT_SPECIFICATIONS order (they finish in any order)."""
+    return sorted(variations, key=lambda v: _STYLE_ORDER[v["style_key"]])
+
+
 class InteriorDesignerAgent:
     def __init__(self):
         settings = get_settings()
         if not settings.google_api_key:
             raise ValueError("GOOGLE_API_KEY not set")
-        self.client = genai.Client(api_key=settings.google_api_key)
+        self.client = gemini.get_genai_client(settings.google_api_key)
         self.model = settings.planning_model_name
         self.image_model = settings.layout_image_model_name
 
@@ -148,7 +253,19 @@ class InteriorDesignerAgent:
         self, current_layout: List[RoomObject], room_dims: RoomDimensions,
         locked_ids: List[str], image_base64: Optional[str] = None
     ) -> List[Dict[str, Any]]:
+        """Collect every variation, in LAYOUT_SPECIFICATIONS order."""
+        variations = [v async for v in self.iter_layout_variations(
+            current_layout, room_dims, locked_ids, image_base64)]
+        return _in_style_order(variations)
 
+    async def iter_layout_variations(
+        self, current_layout: List[RoomObject], room_dims: RoomDimensions,
+        locked_ids: List[str], image_base64: Optional[str] = None
+    ) -> AsyncIterator[Dict[str, Any]]:
+        """
+        Yield each variation as soon as its image finishes, so a slow style
+        does not hold back the others. Raises ValueError if none succeed.
+        """
         self._debug_ts = datetime.now().strftime("%Y%m%d_%H%M%S")
 
         max_x = max((obj.bbox[0] + obj.bbox[2] for obj in current_layout), default=600)
@@ -166,11 +283,12 @@ class InteriorDesignerAgent:
         movable_count = len(movable_objects)
         furniture_labels = [obj["label"] for obj in movable_objects]
 
-        print(f"[Designer] Movable ({movable_count}): {furniture_labels}")
-        print(f"[Designer] Structural ({len(structural_objects)}): {[o['label'] for o in structural_objects]}")
-        print(f"[Designer] Door: {door_info}")
-        print(f"[Designer] Window: {window_info}")
-        print(f"[Designer] Pixel space: {self._pixel_width}x{self._pixel_height}")
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug("Movable (%d): %s", movable_count, furniture_labels)
+            logger.debug("Structural (%d): %s", len(structural_objects), [o["label"] for o in structural_objects])
+            logger.debug("Door: %s", door_info)
+            logger.debug("Window: %s", window_info)
+            logger.debug("Pixel space: %dx%d", self._pixel_width, self._pixel_height)
 
         valid_ids = {obj["id"] for obj in movable_objects}
         for zone in zone_assignments:
@@ -183,82 +301,96 @@ class InteriorDesignerAgent:
             "movable_objects": movable_objects, "structural_objects": structural_objects,
         })
 
+        # Decode the room image once; the same Part is shared by every call
+        image_part = None
         if image_base64:
-            clean_b64 = image_base64.split(",")[1] if "," in image_base64 else image_base64
+            clean_b64 = imaging.strip_data_url(image_base64)
             _save_debug_image(f"{self._debug_ts}_00_input_image.jpg", clean_b64)
-
-        # STEP 1: Generate plans in parallel (with image for visual context)
-        plan_tasks = [
-            self._generate_layout_plan(sk, sp, zone_assignments, movable_objects,
-                structural_objects, room_dims, door_info, window_info, image_base64)
-            for sk, sp in LAYOUT_SPECIFICATIONS.items()
-        ]
-        layout_plans = await asyncio.gather(*plan_tasks, return_exceptions=True)
-
-        # STEP 2: Validate and refine plans against actual room image
-        validation_tasks = []
-        plan_indices = []
-        for i, plan in enumerate(layout_plans):
-            if isinstance(plan, Exception):
-                continue
-            sk = list(LAYOUT_SPECIFICATIONS.keys())[i]
-            sp = LAYOUT_SPECIFICATIONS[sk]
-            validation_tasks.append(
-                self._validate_layout_compliance(image_base64, plan, sp, sk)
-            )
-            plan_indices.append(i)
-
-        validated_results = await asyncio.gather(*validation_tasks, return_exceptions=True)
-
-        # STEP 3: Generate images from validated plans
-        image_tasks, valid_plans = [], []
-        for vi, orig_i in enumerate(plan_indices):
-            sk = list(LAYOUT_SPECIFICATIONS.keys())[orig_i]
-            sp = LAYOUT_SPECIFICATIONS[sk]
-
-            validated_plan = validated_results[vi]
-            if isinstance(validated_plan, Exception):
-                print(f"[Designer] Validation failed for {sk}: {validated_plan}")
-                validated_plan = layout_plans[orig_i]  # Fallback to original plan
-
+            try:
+                image_part = types.Part.from_bytes(data=imaging.b64decode(clean_b64), mime_type="image/jpeg")
+            except Exception as e:
+                logger.warning("Failed to decode input image: %s", e)
+
+        # STEP 1: Generate plans (with image for visual context).
+        # The plan prompt includes the room-image self-check, so no separate
+        # validation round-trip is needed before image generation.
+        # All styles are planned in one batched call; any style it misses
+        # falls back to its own per-style request.
+        style_keys = list(LAYOUT_SPECIFICATIONS.keys())
+
+        # STEP 2: Generate images from plans. Each style's image task starts
+        # the moment its plan object closes in the stream, overlapping image
+        # generation with the remaining plan tokens.
+        image_tasks: Dict[str, asyncio.Task] = {}
+        plans_by_style: Dict[str, Dict[str, Any]] = {}
+
+        def start_image(sk: str, plan: Dict[str, Any]):
             # Filter hallucinated IDs
-            if validated_plan and "furniture_placement" in validated_plan:
-                validated_plan["furniture_placement"] = {
-                    k: v for k, v in validated_plan["furniture_placement"].items() if k in valid_ids
+            if plan and "furniture_placement" in plan:
+                plan["furniture_placement"] = {
+                    k: v for k, v in plan["furniture_placement"].items() if k in valid_ids
                 }
-
-            _save_debug_json(f"{self._debug_ts}_plan_{sk}_VALIDATED.json", {"plan": validated_plan})
-
-            if validated_plan and image_base64:
-                valid_plans.append((sk, sp, validated_plan))
-                image_tasks.append(self._generate_layout_image(
-                    validated_plan, sk, sp, movable_objects, structural_objects,
-                    door_info, window_info, image_base64, movable_count, furniture_labels
+            plans_by_style[sk] = plan
+            _save_debug_json(f"{self._debug_ts}_plan_{sk}_FINAL.json", {"plan": plan})
+            if plan and image_part:
+                image_tasks[sk] = asyncio.create_task(self._generate_layout_image(
+                    plan, sk, LAYOUT_SPECIFICATIONS[sk], movable_objects, structural_objects,
+                    door_info, window_info, image_part, movable_count, furniture_labels
                 ))
 
-        if not image_tasks:
-            raise ValueError("No valid layout plans generated")
-
-        images = await asyncio.gather(*image_tasks, return_exceptions=True)
-
-        variations = []
-        for i, (sk, sp, plan) in enumerate(valid_plans):
-            img = images[i] if i < len(images) else None
-            if isinstance(img, Exception):
-                print(f"[Designer] Image failed {sk}: {img}")
-                continue
-            if img:
-                _save_debug_image(f"{self._debug_ts}_image_{sk}_OUTPUT.png", img)
-            variations.append({
-                "name": sp["name"], "style_key": sk,
-                "description": plan.get("description", sp["description"]),
-                "layout": current_layout, "layout_plan": plan, "door_info": door_info, "window_info": window_info,
-                "thumbnail_base64": img,
-            })
-
-        if not variations:
+        try:
+            try:
+                async for sk, plan in self._stream_layout_plans(
+                    zone_assignments, movable_objects, structural_objects,
+                    room_dims, door_info, window_info, image_part
+                ):
+                    start_image(sk, plan)
+            except Exception as e:
+                logger.warning("Batched planning failed, planning per style: %s", e)
+
+            missing = [sk for sk in style_keys if sk not in plans_by_style]
+            if missing:
+                fallback = await asyncio.gather(*[
+                    self._generate_layout_plan(sk, LAYOUT_SPECIFICATIONS[sk], zone_assignments, movable_objects,
+                        structural_objects, room_dims, door_info, window_info, image_part)
+                    for sk in missing
+                ], return_exceptions=True)
+                for sk, plan in zip(missing, fallback):
+                    if isinstance(plan, Exception):
+                        logger.warning("Plan failed for %s: %s", sk, plan)
+                        continue
+                    start_image(sk, plan)
+
+            if not image_tasks:
+                raise ValueError("No valid layout plans generated")
+
+            style_by_task = {task: sk for sk, task in image_tasks.items()}
+            pending, produced = set(style_by_task), 0
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    sk = style_by_task[task]
+                    sp, plan = LAYOUT_SPECIFICATIONS[sk], plans_by_style[sk]
+                    if task.exception() is not None:
+                        logger.warning("Image failed %s: %s", sk, task.exception())
+                        continue
+                    img = task.result()
+                    if img:
+                        _save_debug_image(f"{self._debug_ts}_image_{sk}_OUTPUT.png", img)
+                    produced += 1
+                    yield {
+                        "name": sp["name"], "style_key": sk,
+                        "description": plan.get("description", sp["description"]),
+                        "layout": current_layout, "layout_plan": plan, "door_info": door_info, "window_info": window_info,
+                        "thumbnail_base64": img,
+                    }
+        finally:
+            # Also runs when the consumer stops iterating early
+            for task in image_tasks.values():
+                task.cancel()
+
+        if not produced:
             raise ValueError("Failed to generate any valid layouts")
-        return variations
 
     # ========================================================================
     # PREPARE OBJECTS
@@ -269,11 +401,11 @@ class InteriorDesignerAgent:
 
         complete_locked = set(locked_ids)
         for obj in current_layout:
-            if obj.type == ObjectType.STRUCTURAL or obj.is_locked:
+            if obj.type is ObjectType.STRUCTURAL or obj.is_locked:
                 complete_locked.add(obj.id)
 
         movable, structural = [], []
-        all_doors, all_windows = [], []
+        door_info, window_info = None, None
         pw, ph = self._pixel_width, self._pixel_height
 
         for obj in current_layout:
@@ -285,16 +417,14 @@ class InteriorDesignerAgent:
 
             if obj.id in complete_locked:
                 structural.append(obj_dict)
-                if "door" in obj.label.lower():
-                    all_doors.append(self._extract_element_info(obj, pw, ph, "door"))
-                if "window" in obj.label.lower():
-                    all_windows.append(self._extract_element_info(obj, pw, ph, "window"))
+                # Only the first door/window is used, so classify just those
+                if door_info is None and "door" in obj.label.lower():
+                    door_info = self._extract_element_info(obj, pw, ph, "door")
+                if window_info is None and "window" in obj.label.lower():
+                    window_info = self._extract_element_info(obj, pw, ph, "window")
             else:
                 movable.append(obj_dict)
 
-        door_info = all_doors[0] if all_doors else None
-        window_info = all_windows[0] if all_windows else None
-
         # Fallback: infer window opposite door
         if not window_info and door_info:
             opposite = {"north (top)": "south (bottom)", "south (bottom)": "north (top)",
@@ -305,13 +435,13 @@ class InteriorDesignerAgent:
                 "inferred": True, "x": 0, "y": 0, "width": 0, "height": 0,
                 "center_x": 0, "center_y": 0, "position_on_wall_percent": 50.0,
             }
-            print(f"[Designer] No window detected — inferred on {inferred_wall} (opposite door)")
+            logger.info("No window detected — inferred on %s (opposite door)", inferred_wall)
 
         # Filter walls from structural list (visible in image, just adds noise)
         structural_for_designer = [o for o in structural if o["label"] not in ("wall",)]
         filtered = len(structural) - len(structural_for_designer)
         if filtered > 0:
-            print(f"[Designer] Filtered {filtered} wall objects from structural list")
+            logger.debug("Filtered %d wall objects from structural list", filtered)
 
         return complete_locked, movable, structural_for_designer, door_info, window_info
 
@@ -347,18 +477,7 @@ class InteriorDesignerAgent:
     def _classify_furniture_to_zones(self, movable_objects: List[dict]) -> Dict[ZoneType, List[str]]:
         zones = {ZoneType.WORK: [], ZoneType.SLEEP: [], ZoneType.LIVING: []}
         for obj in movable_objects:
-            label = obj["label"].lower()
-            assigned = False
-            for key, zone in FURNITURE_ZONE_MAP.items():
-                if key in label:
-                    zones[zone].append(obj["id"])
-                    assigned = True
-                    break
-            if not assigned:
-                if "chair" in label:
-                    zones[ZoneType.WORK].append(obj["id"])
-                else:
-                    zones[ZoneType.LIVING].append(obj["id"])
+            zones[_zone_for_label(obj["label"].lower())].append(obj["id"])
         return zones
 
     def _build_exclusion_zones(self, structural_objects: List[dict]) -> str:
@@ -402,7 +521,7 @@ class InteriorDesignerAgent:
                 if info["label"] in desc_lower or struct_id in desc_lower:
                     warnings.append(f"[{style_key}] '{furn_id}' references '{info['label']}' ({struct_id}) — potential overlap")
         for w in warnings:
-            print(f"[Designer WARNING] {w}")
+            logger.warning("%s", w)
         return warnings
 
     def _build_reinforcement(self, style_key: str, spec: Dict, window_wall: str, door_wall: str) -> str:
@@ -437,10 +556,8 @@ class InteriorDesignerAgent:
         elif min_dist == dist_bot and dist_bot < margin_y:
             return "against the south (bottom) wall"
 
-        # Fallback: quadrant
-        x_pos = "left" if cx < pw * 0.33 else ("center" if cx < pw * 0.66 else "right")
-        y_pos = "top" if cy < ph * 0.33 else ("middle" if cy < ph * 0.66 else "bottom")
-        return f"in the {y_pos}-{x_pos} area"
+        # Fallback: quadrant (thirds of the room on each axis)
+        return _area_name((cy >= ph * 0.33) + (cy >= ph * 0.66), (cx >= pw * 0.33) + (cx >= pw * 0.66))
 
     def _compute_move_instructions(
         self, layout_plan: Dict, movable_objects: List[dict]
@@ -469,18 +586,8 @@ class InteriorDesignerAgent:
             target_lower = target_desc.lower()
 
             # Heuristic: did the wall change?
-            current_wall_kw = None
-            for kw in ["west", "east", "north", "south", "left", "right", "top", "bottom"]:
-                if kw in current_desc.lower():
-                    current_wall_kw = kw
-                    break
-
-            target_wall_kw = None
-            for kw in ["west", "east", "north", "south", "left", "right", "top", "bottom",
-                        "center", "foot of", "opposite", "between"]:
-                if kw in target_lower:
-                    target_wall_kw = kw
-                    break
+            current_wall_kw = next((kw for kw in _CURRENT_WALL_KEYWORDS if kw in current_desc), None)
+            target_wall_kw = next((kw for kw in _TARGET_POSITION_KEYWORDS if kw in target_lower), None)
 
             # If the target mentions a clearly different wall or position keyword, it moved
             same_wall = (current_wall_kw and target_wall_kw and current_wall_kw == target_wall_kw)
@@ -493,142 +600,159 @@ class InteriorDesignerAgent:
         return move_lines, keep_labels
 
     # ========================================================================
-    # VALIDATION — refine plan against actual room image
+    # PLAN GENERATION — receives image for visual context and self-validates
     # ========================================================================
-    @traceable(name="validate_layout_compliance", run_type="llm", tags=["gemini", "validation"])
-    async def _validate_layout_compliance(
-        self, image_base64: str, layout_plan: Dict, layout_spec: Dict, style_key: str
-    ) -> Dict:
-        """Validate and refine layout plan using the actual room image."""
-        if not image_base64:
-            return layout_plan
+    def _describe_room(
+        self, zone_assignments, movable_objects, door_info, window_info
+    ) -> Tuple[Dict[str, List[dict]], str, str]:
+        """Zone furniture listing plus door/window wording shared by plan prompts."""
+        obj_lookup = {o["id"]: o for o in movable_objects}
+        zone_furniture = {}
+        for zt, ids in zone_assignments.items():
+            zone_furniture[zt.value] = [{"id": i, "label": obj_lookup[i]["label"]} for i in ids if i in obj_lookup]
 
-        constraints = layout_spec.get("technical_spec", {})
-        constraints_text = "\n".join([f"- {v}" for v in constraints.values()]) if constraints else "No specific constraints."
+        door_desc = f"on the {door_info['wall']} wall at ~{door_info.get('position_on_wall_percent', 50):.0f}% along that wall" if door_info else "location unknown"
+        if window_info and window_info.get("inferred"):
+            window_desc = f"INFERRED on the {window_info['wall']} wall (assume this is where light comes from)"
+        elif window_info:
+            window_desc = f"on the {window_info['wall']} wall at ~{window_info.get('position_on_wall_percent', 50):.0f}% along that wall"
+        else:
+            window_desc = "not detected"
+        return zone_furniture, door_desc, window_desc
+
+    @traceable(name="stream_layout_plans", run_type="llm", tags=["gemini", "planning", "batch"])
+    async def _stream_layout_plans(
+        self, zone_assignments, movable_objects, structural_objects,
+        room_dims, door_info, window_info, image_part=None
+    ) -> AsyncIterator[Tuple[str, Dict[str, Any]]]:
+        """
+        Plan every style in ONE streamed Gemini call. The room context is sent
+        once and the model returns {"plans": [...]} with one entry per style_key.
+        Yields (style_key, plan) as each plan object completes; styles the
+        model skipped are never yielded.
+        """
+        zone_furniture, door_desc, window_desc = self._describe_room(
+            zone_assignments, movable_objects, door_info, window_info
+        )
+        exclusion_text = self._build_exclusion_zones(structural_objects)
 
-        prompt = f"""You are an Expert Interior Design Validator.
+        styles_text = _BATCH_STYLES_TEXT
+        style_keys = ", ".join(LAYOUT_SPECIFICATIONS.keys())
 
-## GOAL
-Verify if the proposed furniture layout matches the designated STYLE in this specific room.
-If the placement instructions are vague, generic, or violate the style, REWRITE them to be specific and correct.
+        prompt = f"""You are an expert interior designer creating {len(LAYOUT_SPECIFICATIONS)} alternative layouts for the SAME room, one per style below.
 
-## ROOM IMAGE
-(Attached)
+## ROOM INFO
+- Room dimensions: ~{room_dims.width_estimate:.0f} x {room_dims.height_estimate:.0f} feet
+- Door: {door_desc}
+- Window: {window_desc}
 
-## STYLE GOAL: "{layout_spec['name']}"
-{layout_spec['description']}
+## FURNITURE TO ARRANGE (by zone)
+{_dumps_indent(zone_furniture)}
 
-## STRICT CONSTRAINTS (MUST VERIFY):
-{constraints_text}
+## STRUCTURAL ELEMENTS (DO NOT MOVE)
+{_dumps_indent(structural_objects)}
+
+{exclusion_text}
 
-## PROPOSED PLAN
-{json.dumps(layout_plan.get('furniture_placement', {}), indent=2)}
+## STYLES
+{styles_text}
 
 ## YOUR TASK
-1. Look at the room image. Identify constraints (doors, windows, odd corners, kitchen, bathroom).
-2. Check if the "PROPOSED PLAN" actually achieves the "{layout_spec['name']}" goal in THIS specific room.
-3. If a furniture item's position is not ideal for this style, change it.
-4. If a furniture item would overlap a structural fixture (toilet, shower, sink, stove), move it.
-5. If a furniture item is blocking a door/path, move it.
-6. Return the REFINED placement dictionary.
+For EACH style, create an independent layout plan using RELATIVE/SEMANTIC positions only.
+Describe WHERE each piece goes relative to walls, other furniture, and structural elements.
+The plans must differ from each other according to their style constraints.
+
+## SELF-CHECK AGAINST THE ROOM IMAGE (if attached)
+Before answering, look at the image and verify each plan in THIS specific room:
+- Identify constraints (doors, windows, odd corners, kitchen, bathroom).
+- Every placement must actually achieve that style's goal here; be specific, not generic.
+- Nothing may overlap a structural fixture (toilet, shower, sink, stove) or block a door/path.
+Revise any placement that fails before returning the plans.
+
+## CRITICAL RULES (apply to every plan)
+1. DOOR CLEARANCE: Nothing may block the door.
+2. Include ALL furniture — do not skip any.
+3. Follow each style's SPECIFIC CONSTRAINTS exactly — they are non-negotiable.
+4. Do not add any new furniture.
+5. Use the ACTUAL furniture labels from the list above (e.g. "table_1" not "desk").
+6. Do NOT place any movable furniture where it would overlap a fixed fixture (toilet, shower, sink, stove, refrigerator).
 
 ## OUTPUT FORMAT (JSON)
 {{
-  "furniture_placement": {{
-    "furniture_id": "refined specific instruction...",
-    ...
-  }},
-  "changes_made": ["list of changes and reasoning..."]
+  "plans": [
+    {{
+      "style_key": "one of: {style_keys}",
+      "description": "2-3 sentences explaining the design rationale",
+      "furniture_placement": {{
+        "<furniture_id>": "<relative position description>",
+        ...
+      }},
+      "door_clearance": "how door area is kept clear",
+      "zone_arrangement": {{
+        "work_zone": "location description",
+        "sleep_zone": "location description",
+        "living_zone": "location description"
+      }}
+    }},
+    ...one entry per style...
+  ]
 }}"""
 
+        _save_debug_json(f"{self._debug_ts}_plans_BATCH_INPUT.json", {
+            "full_prompt": prompt, "door_info": door_info, "window_info": window_info,
+        })
+
         contents = [prompt]
-        clean_b64 = image_base64.split(",")[1] if "," in image_base64 else image_base64
-        try:
-            image_data = base64.b64decode(clean_b64)
-            contents.insert(0, types.Part.from_bytes(data=image_data, mime_type="image/jpeg"))
-        except Exception as e:
-            print(f"[Designer] Validation image decode failed: {e}")
-            return layout_plan
+        if image_part:
+            contents.insert(0, image_part)
 
-        try:
-            response = await asyncio.to_thread(
-                self.client.models.generate_content, model=self.model,
-                contents=contents,
-                config=types.GenerateContentConfig(response_mime_type="application/json", temperature=0.2)
-            )
-            data = json.loads(response.text)
-
-            # Merge refined placements — only update existing items, don't drop any
-            refined = data.get("furniture_placement", {})
-            original = layout_plan.get("furniture_placement", {})
-            for k, v in refined.items():
-                if k in original:
-                    original[k] = v
-            layout_plan["furniture_placement"] = original
-
-            if data.get("changes_made"):
-                print(f"[Designer VALIDATOR] Changes for {style_key}: {data['changes_made']}")
-                _save_debug_json(f"{self._debug_ts}_plan_{style_key}_VALIDATION_CHANGES.json", {
-                    "changes": data["changes_made"], "refined_placements": refined
-                })
-
-            return layout_plan
-        except Exception as e:
-            print(f"[Designer] Validation failed for {style_key}: {e}")
-            return layout_plan
+        parser = JsonArrayStreamParser("plans")
+        seen = set()
+        async for chunk in gemini.generate_content_stream(
+            self.client, model=self.model,
+            contents=contents,
+            config=_PLAN_CONFIG
+        ):
+            for plan in parser.feed(chunk.text or ""):
+                sk = plan.get("style_key") if isinstance(plan, dict) else None
+                if sk in LAYOUT_SPECIFICATIONS and sk not in seen:
+                    seen.add(sk)
+                    self._validate_plan_against_structures(plan, structural_objects, sk)
+                    _save_debug_json(f"{self._debug_ts}_plan_{sk}_OUTPUT.json", {"plan": plan})
+                    yield sk, plan
 
-    # ========================================================================
-    # PLAN GENERATION — now receives image for visual context
-    # ========================================================================
     @traceable(name="generate_layout_plan", run_type="llm", tags=["gemini", "planning"])
     async def _generate_layout_plan(
         self, style_key, spec, zone_assignments, movable_objects,
-        structural_objects, room_dims, door_info, window_info, image_base64=None
+        structural_objects, room_dims, door_info, window_info, image_part=None
     ) -> Dict[str, Any]:
 
-        obj_lookup = {o["id"]: o for o in movable_objects}
-        zone_furniture = {}
-        for zt, ids in zone_assignments.items():
-            zone_furniture[zt.value] = [{"id": i, "label": obj_lookup[i]["label"]} for i in ids if i in obj_lookup]
+        zone_furniture, door_desc, window_desc = self._describe_room(
+            zone_assignments, movable_objects, door_info, window_info
+        )
 
-        constraints = spec.get("technical_spec", {})
-        constraints_text = "\n".join([f"- {v}" for v in constraints.values()]) if constraints else "No specific constraints."
-
-        door_desc = f"on the {door_info['wall']} wall at ~{door_info.get('position_on_wall_percent', 50):.0f}% along that wall" if door_info else "location unknown"
-        if window_info and window_info.get("inferred"):
-            window_desc = f"INFERRED on the {window_info['wall']} wall (assume this is where light comes from)"
-        elif window_info:
-            window_desc = f"on the {window_info['wall']} wall at ~{window_info.get('position_on_wall_percent', 50):.0f}% along that wall"
-        else:
-            window_desc = "not detected"
+        constraints_text = spec["_constraints_text"]
 
         exclusion_text = self._build_exclusion_zones(structural_objects)
 
-        prompt = f"""You are an expert interior designer creating a "{spec['name']}" layout.
+        # Shared room context first, style-specific section last: the fallback
+        # calls for different styles then share an identical prompt prefix
+        # (image + room), which Gemini's implicit prefix caching can reuse.
+        prompt = f"""You are an expert interior designer creating a layout for the room below.
 
 ## ROOM INFO
 - Room dimensions: ~{room_dims.width_estimate:.0f} x {room_dims.height_estimate:.0f} feet
 - Door: {door_desc}
 - Window: {window_desc}
 
-## STYLE: {spec['name']}
-{spec['description']}
-
-## SPECIFIC CONSTRAINTS (MUST FOLLOW):
-{constraints_text}
-
 ## FURNITURE TO ARRANGE (by zone)
-{json.dumps(zone_furniture, indent=2)}
+{_dumps_indent(zone_furniture)}
 
 ## STRUCTURAL ELEMENTS (DO NOT MOVE)
-{json.dumps(structural_objects, indent=2)}
+{_dumps_indent(structural_objects)}
 
 {exclusion_text}
 
-## YOUR TASK
-Create a layout plan using RELATIVE/SEMANTIC positions only.
-Describe WHERE each piece goes relative to walls, other furniture, and structural elements.
-
 ## CRITICAL RULES
 1. DOOR CLEARANCE: Nothing may block the door.
 2. Include ALL furniture — do not skip any.
@@ -650,7 +774,24 @@ Describe WHERE each piece goes relative to walls, other furniture, and structura
     "sleep_zone": "location description",
     "living_zone": "location description"
   }}
-}}"""
+}}
+
+## STYLE: {spec['name']}
+{spec['description']}
+
+## SPECIFIC CONSTRAINTS (MUST FOLLOW):
+{constraints_text}
+
+## YOUR TASK
+Create a "{spec['name']}" layout plan using RELATIVE/SEMANTIC positions only.
+Describe WHERE each piece goes relative to walls, other furniture, and structural elements.
+
+## SELF-CHECK AGAINST THE ROOM IMAGE (if attached)
+Before answering, look at the image and verify your plan in THIS specific room:
+- Identify constraints (doors, windows, odd corners, kitchen, bathroom).
+- Every placement must actually achieve the "{spec['name']}" goal here; be specific, not generic.
+- Nothing may overlap a structural fixture (toilet, shower, sink, stove) or block a door/path.
+Revise any placement that fails before returning the plan."""
 
         _save_debug_json(f"{self._debug_ts}_plan_{style_key}_INPUT.json", {
             "style_key": style_key, "full_prompt": prompt,
@@ -659,20 +800,15 @@ Describe WHERE each piece goes relative to walls, other furniture, and structura
 
         # Build contents: image (if available) + text prompt
         contents = [prompt]
-        if image_base64:
-            clean_b64 = image_base64.split(",")[1] if "," in image_base64 else image_base64
-            try:
-                img_data = base64.b64decode(clean_b64)
-                contents.insert(0, types.Part.from_bytes(data=img_data, mime_type="image/jpeg"))
-            except Exception as e:
-                print(f"[Designer] Failed to decode image for plan {style_key}: {e}")
+        if image_part:
+            contents.insert(0, image_part)
 
-        response = await asyncio.to_thread(
-            self.client.models.generate_content, model=self.model,
+        response = await gemini.generate_content(
+            self.client, model=self.model,
             contents=contents,
-            config=types.GenerateContentConfig(response_mime_type="application/json", temperature=0.3)
+            config=_PLAN_CONFIG
         )
-        result = json.loads(response.text)
+        result = orjson.loads(response.text)
         self._validate_plan_against_structures(result, structural_objects, style_key)
         _save_debug_json(f"{self._debug_ts}_plan_{style_key}_OUTPUT.json", {"plan": result})
         return result
@@ -683,7 +819,7 @@ Describe WHERE each piece goes relative to walls, other furniture, and structura
     @traceable(name="generate_layout_image", run_type="llm", tags=["gemini", "image"])
     async def _generate_layout_image(
         self, layout_plan, style_key, spec, movable_objects, structural_objects,
-        door_info, window_info, image_base64, movable_count, furniture_labels
+        door_info, window_info, image_part, movable_count, furniture_labels
     ) -> Optional[str]:
         """
         Generate a layout preview by telling Gemini ONLY what changed.
@@ -705,25 +841,13 @@ Describe WHERE each piece goes relative to walls, other furniture, and structura
         moves_text = "\n".join(move_lines)
         keep_text = f"Keep these items in their current positions: {', '.join(keep_labels)}." if keep_labels else ""
 
-        from collections import Counter
         label_counts = Counter(furniture_labels)
         count_str = ", ".join([f"{count} {label}{'s' if count > 1 else ''}" for label, count in label_counts.items()])
 
-        prompt = f"""Edit this 2D top-down floor plan. Rearrange furniture for the "{spec['name']}" style.
-
-MOVES TO MAKE:
-{moves_text}
-
-{keep_text}
-
-RULES:
-1. Output must be a 2D top-down floor plan (same style as input).
-2. MOVE means ERASE from old spot, PLACE in new spot. Do NOT duplicate.
-3. The room must have exactly {movable_count} movable items: {count_str}.
-4. Do NOT move structural elements (kitchen, bathroom, doors, windows).
-5. Do NOT add any new furniture that wasn't in the original.
-
-Edit the floor plan now."""
+        prompt = _IMAGE_PROMPT_TMPL.substitute(
+            style_name=spec["name"], moves_text=moves_text, keep_text=keep_text,
+            movable_count=movable_count, count_str=count_str,
+        )
 
         _save_debug_json(f"{self._debug_ts}_image_{style_key}_INPUT.json", {
             "style_key": style_key,
@@ -734,15 +858,39 @@ Edit the floor plan now."""
             "full_prompt": prompt,
         })
 
-        if "," in image_base64:
-            image_base64 = image_base64.split(",")[1]
-
+        # Re-runs with the same image and plan produce the same prompt; serve
+        # those from cache, and let concurrent identical requests share one call.
+        cache_key = hashlib.blake2b(
+            image_part.inline_data.data + prompt.encode() + self.image_model.encode(),
+            digest_size=16,
+        ).hexdigest()
+        cached = _layout_image_cache_get(cache_key)
+        if cached is not None:
+            logger.info("Image cache hit for %s", style_key)
+            return cached
+
+        lock_key = (asyncio.get_running_loop(), cache_key)
+        lock = _layout_image_locks.setdefault(lock_key, asyncio.Lock())
+        try:
+            async with lock:
+                cached = _layout_image_cache_get(cache_key)
+                if cached is not None:
+                    return cached
+                image = await self._request_layout_image(image_part, prompt, style_key)
+                if image:
+                    _layout_image_cache_put(cache_key, image)
+                return image
+        finally:
+            if not lock.locked():
+                _layout_image_locks.pop(lock_key, None)
+
+    async def _request_layout_image(self, image_part, prompt: str, style_key: str) -> Optional[str]:
+        """Single Gemini image-edit call for a layout preview."""
         try:
-            image_data = base64.b64decode(image_base64)
-            response = await asyncio.to_thread(
-                self.client.models.generate_content, model=self.image_model,
-                contents=[types.Part.from_bytes(data=image_data, mime_type="image/jpeg"), prompt],
-                config=types.GenerateContentConfig(response_modalities=["IMAGE", "TEXT"], temperature=0.35)
+            response = await gemini.generate_content(
+                self.client, model=self.image_model,
+                contents=[image_part, prompt],
+                config=_IMAGE_CONFIG
             )
             # Null-safe response handling
             if (response.candidates
@@ -750,26 +898,40 @@ Edit the floor plan now."""
                     and response.candidates[0].content.parts):
                 for part in response.candidates[0].content.parts:
                     if hasattr(part, 'inline_data') and part.inline_data:
-                        return base64.b64encode(part.inline_data.data).decode('utf-8')
-            print(f"[Designer] No image content in response for {style_key}")
+                        return imaging.b64encode_str(part.inline_data.data)
+            logger.warning("No image content in response for %s", style_key)
             return None
         except Exception as e:
-            print(f"[Designer] Image error {style_key}: {e}")
-            import traceback; traceback.print_exc()
+            logger.exception("Image error %s: %s", style_key, e)
             return None
 
 
 # ============================================================================
 # LANGGRAPH NODES
 # ============================================================================
+def _emit_variation(variation: Dict[str, Any]) -> None:
+    """Forward a finished variation to LangGraph's custom stream, if inside a graph run."""
+    try:
+        writer = get_stream_writer()
+    except RuntimeError:
+        return
+    writer({"layout_variation": variation})
+
 @traceable(name="designer_node", run_type="chain", tags=["langgraph", "node"])
 async def designer_node(state: AgentState) -> Dict[str, Any]:
     designer = InteriorDesignerAgent()
+    # Render runs next; open its connection while the designer works
+    gemini.prefetch_model(get_settings().render_image_model_name)
     try:
-        variations = await designer.generate_layout_variations(
+        variations = []
+        async for variation in designer.iter_layout_variations(
             current_layout=state["current_layout"], room_dims=state["room_dimensions"],
             locked_ids=state.get("locked_object_ids", []), image_base64=state.get("image_base64")
-        )
+        ):
+            variations.append(variation)
+            _emit_variation(variation)
+        # Streamed as they finish; the collected list uses the fixed style order
+        variations = _in_style_order(variations)
         return {
             "layout_variations": variations,
             "proposed_layout": variations[0]["layout"] if variations else state["current_layout"],
@@ -778,8 +940,8 @@ async def designer_node(state: AgentState) -> Dict[str, Any]:
             "iteration_count": state.get("iteration_count", 0) + 1
         }
     except Exception as e:
-        import traceback; traceback.print_exc()
+        logger.exception("Designer failed")
         return {"error": f"Designer failed: {str(e)}", "should_continue": False}
 
 def designer_node_sync(state: AgentState) -> Dict[str, Any]:
-    return asyncio.run(designer_node(state))
\ No newline at end of file
+    return run_sync(designer_node(state))
\ No newline at end of file
@@ -1,7 +1,9 @@
 # app/agents/graph.py
 
 import os
+import sys
 import asyncio
+from functools import lru_cache
 from typing import Literal, Dict, Any
 from langgraph.graph import StateGraph, END
 from app.agents.vision_node import vision_node
@@ -53,6 +55,13 @@ def render_node(state: AgentState) -> dict:
 
 # ============ Router Functions ============
 
+# Route names shared by the routers and the conditional-edge maps
+_DESIGNER = sys.intern("designer")
+_RENDER = sys.intern("render")
+_END = sys.intern("end")
+_ERROR = sys.intern("error")
+
+
 def should_continue_optimization(state: AgentState) -> Literal["designer", "render"]:
     """
     Decide whether to generate new layouts or render results.
@@ -61,24 +70,18 @@ def should_continue_optimization(state: AgentState) -> Literal["designer", "rend
     unless we already have layout variations.
     """
     if state.get("layout_variations"):
-        return "render"
-    if state.get("should_continue", True):
-        return "designer"
-    return "render"
+        return _RENDER
+    return _DESIGNER if state.get("should_continue", True) else _RENDER
 
 
 def check_for_errors(state: AgentState) -> Literal["designer", "error"]:
     """Check if there's an error in the state."""
-    if state.get("error"):
-        return "error"
-    return "designer"
+    return _ERROR if state.get("error") else _DESIGNER
 
 
 def should_continue_editing(state: AgentState) -> Literal["render", "end"]:
     """Decide if we need to re-render after chat edits."""
-    if state.get("edit_command") and state.get("should_continue", False):
-        return "render"
-    return "end"
+    return _RENDER if state.get("edit_command") and state.get("should_continue", False) else _END
 
 
 # ============ Graph Definitions ============
@@ -128,7 +131,7 @@ def create_editing_graph() -> StateGraph:
     graph.add_conditional_edges(
         "chat_editor",
         should_continue_editing,
-        {"render": "render", "end": END}
+        {_RENDER: "render", _END: END}
     )
     
     graph.add_edge("render", END)
@@ -136,16 +139,21 @@ def create_editing_graph() -> StateGraph:
     return graph
 
 
+@lru_cache(maxsize=1)
 def compile_graph():
     """
     Compile the optimization graph for execution.
+    
+    Compiled once per process; the compiled graph holds no per-run state,
+    so every request reuses it.
     """
     graph = create_optimization_graph()
     return graph.compile()
 
 
+@lru_cache(maxsize=1)
 def compile_editing_graph():
-    """Compile the editing graph for chat-based modifications."""
+    """Compile the editing graph for chat-based modifications (once per process)."""
     graph = create_editing_graph()
     return graph.compile()
 
@@ -189,7 +197,7 @@ def run_optimization(
         max_iterations=max_iterations
     )
     
-    # Compile and run graph
+    # Run the shared compiled graph
     app = compile_graph()
     
     # Execute
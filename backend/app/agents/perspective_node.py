@@ -9,22 +9,33 @@ telling it to convert the top-down view into an eye-level photograph.
 No furniture position text — the image contains all the info needed.
 """
 
-import base64
 import asyncio
-from typing import List, Dict, Any, Optional
-from google import genai
+import hashlib
+import logging
+from collections import OrderedDict
+from dataclasses import dataclass
+from functools import lru_cache
+from typing import List, Dict, Any, Optional, Tuple
 from google.genai import types
 
 from app.config import get_settings
+from app.core import gemini, imaging
+from app.core.background_loop import run_sync
+from app.core.disk_cache import DiskCache
 from app.models.state import AgentState
 from app.models.room import RoomObject, RoomDimensions
 
+logger = logging.getLogger(__name__)
+
 # LangSmith tracing
 try:
     from langsmith import traceable
-    LANGSMITH_ENABLED = True
+    # Installed but not configured: skip the per-call tracing wrapper too
+    LANGSMITH_ENABLED = bool(get_settings().langchain_api_key and get_settings().langchain_tracing_v2)
 except ImportError:
     LANGSMITH_ENABLED = False
+
+if not LANGSMITH_ENABLED:
     def traceable(*args, **kwargs):
         def decorator(func):
             return func
@@ -35,23 +46,171 @@ except ImportError:
 # DEBUG HELPER
 # ============================================================================
 import os
-import json
-from datetime import datetime
+import queue
+import tempfile
+import threading
+import time
+import orjson
 
 DEBUG_DIR = os.path.join(os.path.dirname(__file__), "..", "..", "debug_logs")
 
+# Debug dumps are written by one daemon thread so disk I/O and JSON
+# serialization stay off the request path. When the queue is full the
+# dump is dropped rather than blocking a render.
+_DEBUG_QUEUE_MAX = 256
+_debug_queue: "queue.Queue[Tuple[str, Any]]" = queue.Queue(maxsize=_DEBUG_QUEUE_MAX)
+_debug_writer_lock = threading.Lock()
+_debug_writer_started = False
+
 def _ensure_debug_dir():
     os.makedirs(DEBUG_DIR, exist_ok=True)
 
+def _debug_writer():
+    _ensure_debug_dir()
+    while True:
+        filename, data = _debug_queue.get()
+        try:
+            filepath = os.path.join(DEBUG_DIR, filename)
+            with open(filepath, "wb") as f:
+                f.write(orjson.dumps(data, option=orjson.OPT_NON_STR_KEYS | orjson.OPT_SERIALIZE_NUMPY, default=str))
+            logger.debug("Saved debug: %s", filepath)
+        except Exception as e:
+            logger.warning("Failed to save debug %s: %s", filename, e)
+
 def _save_debug_json(filename: str, data: Any):
+    global _debug_writer_started
+    if not logger.isEnabledFor(logging.DEBUG):
+        return
+    if not _debug_writer_started:
+        with _debug_writer_lock:
+            if not _debug_writer_started:
+                threading.Thread(target=_debug_writer, name="perspective-debug-writer", daemon=True).start()
+                _debug_writer_started = True
     try:
-        _ensure_debug_dir()
-        filepath = os.path.join(DEBUG_DIR, filename)
-        with open(filepath, "w", encoding="utf-8") as f:
-            json.dump(data, f, indent=2, default=str)
-        print(f"[Perspective] Saved debug: {filepath}")
-    except Exception as e:
-        print(f"[Perspective] Failed to save debug {filename}: {e}")
+        _debug_queue.put_nowait((filename, data))
+    except queue.Full:
+        pass
+
+
+# ============================================================================
+# RENDER CACHE — keyed on hash(image + prompt + model)
+# ============================================================================
+_RENDER_CACHE_MAX = 32
+_RENDER_CACHE_TTL_S = 300.0
+_render_cache: "OrderedDict[bytes, Tuple[float, bytes]]" = OrderedDict()
+_inflight_renders: Dict[tuple, asyncio.Task] = {}
+
+def _render_cache_get(key: bytes) -> Optional[bytes]:
+    entry = _render_cache.get(key)
+    if entry is None:
+        return None
+    if entry[0] <= time.monotonic():
+        del _render_cache[key]
+        return None
+    _render_cache.move_to_end(key)
+    return entry[1]
+
+def _render_cache_put(key: bytes, image: bytes):
+    _render_cache[key] = (time.monotonic() + _RENDER_CACHE_TTL_S, image)
+    if len(_render_cache) > _RENDER_CACHE_MAX:
+        _render_cache.popitem(last=False)
+
+# Second tier on disk so an unchanged layout skips Gemini across restarts
+RENDER_DISK_CACHE_DIR = os.getenv(
+    "PERSPECTIVE_CACHE_DIR", os.path.join(tempfile.gettempdir(), "dwell_perspective_cache")
+)
+RENDER_DISK_CACHE_TTL_S = 86400.0
+RENDER_DISK_CACHE_MAX_BYTES = 512 * 1024 * 1024
+
+_render_disk = DiskCache(
+    RENDER_DISK_CACHE_DIR, RENDER_DISK_CACHE_TTL_S, suffix=".img",
+    max_bytes=RENDER_DISK_CACHE_MAX_BYTES,
+)
+
+
+@dataclass(frozen=True)
+class PerspectiveInput:
+    """Layout image as raw bytes; decoded once where base64 enters the node."""
+    image_bytes: bytes
+    mime: str = "image/png"
+
+    @classmethod
+    def from_base64(cls, image_base64: str) -> "PerspectiveInput":
+        """Decode a plain or data-URL base64 image (data URLs keep their MIME type)."""
+        mime, payload = imaging.split_data_url(image_base64)
+        return cls(image_bytes=imaging.b64decode(payload), mime=mime or "image/png")
+
+
+_RENDER_CONFIG = types.GenerateContentConfig(
+    response_modalities=["image", "text"],
+    temperature=0.4,
+)
+
+# Batch Mode polling: start fast, back off to once a minute
+BATCH_POLL_INITIAL_S = 5.0
+BATCH_POLL_MAX_S = 60.0
+_BATCH_DONE_STATES = {
+    types.JobState.JOB_STATE_SUCCEEDED,
+    types.JobState.JOB_STATE_PARTIALLY_SUCCEEDED,
+    types.JobState.JOB_STATE_FAILED,
+    types.JobState.JOB_STATE_CANCELLED,
+    types.JobState.JOB_STATE_EXPIRED,
+}
+
+
+@lru_cache(maxsize=256)
+def _build_prompt_cached(
+    width: float,
+    height: float,
+    style: str,
+    view_angle: str,
+    lighting: str,
+    door_wall: Optional[str],
+    window_wall: Optional[str],
+) -> str:
+    """
+    Perspective prompt from hashable primitives, memoized so retries of the
+    same layout reuse the identical string.
+    """
+    door_txt = f"The entry DOOR is on the {door_wall} wall." if door_wall else ""
+    window_txt = f"Windows are on the {window_wall} wall." if window_wall else ""
+
+    return f"""ROLE: You are an architectural photographer.
+TASK: Create a photorealistic EYE-LEVEL interior photograph based on this floor plan.
+
+CAMERA SETUP (NON-NEGOTIABLE):
+- Position: Standing on the floor inside the room at the {view_angle}.
+- Height: 5 feet (1.5 meters) exactly.
+- Angle: 0° tilt (Horizontal). Look straight ahead across the room.
+- Lens: 16-24mm Wide Angle.
+- Focus: The furniture and far wall.
+- SPECIAL CASE: If there are walls on either side of the entry doorway , place camera a few feet away from the doorway.
+
+
+CRITICAL RULES:
+1. VIEWPOINT: This MUST be an IMMERSIVE INTERIOR VIEW.
+   - NO top-down views.
+   - NO isometric views.
+   - NO birds-eye views.
+   - NO ceiling-down views.
+   - If the floor plan looks like a map, your output must look like a PHOTO taken FROM WITHIN that map.
+
+2. STRUCTURAL ACCURACY:
+   - Door can be found in the position: {door_txt}
+   - Ceiling and Floor must be visible and parallel (2-point perspective).
+   - CRITICAL: Do NOT Generate extra furnitures ,stairs or walls that are not present in the layout.
+   - CRITICAL: Any solid line must be treated as room dividing walls and must not be moved. The walls must be complete and connected to ceiling and floor.
+
+3. CONTENT FIDELITY:
+   - VISIBILITY: Include the whatever number of objects in the layout visible from the camera angle. Its fine to exclude items hidden by room-dividing walls.
+   - POSITION: Do NOT move any furniture from their original positions. Place and orient them EXACTLY as shown in the plan.
+   - CRITICAL: Do NOT move or reorient the kitchen area or bathroom area fixtures.
+   - Style: {style}.
+   - Lighting: {lighting}.
+
+Room Dimensions: ~{width:.0f} x {height:.0f} ft, 9ft ceiling.
+
+Generate the eye-level interior photograph now."""
 
 
 class PerspectiveGenerator:
@@ -64,7 +223,7 @@ class PerspectiveGenerator:
         settings = get_settings()
         if not settings.google_api_key:
             raise ValueError("GOOGLE_API_KEY not set")
-        self.client = genai.Client(api_key=settings.google_api_key)
+        self.client = gemini.get_genai_client(settings.google_api_key)
         self.image_model = settings.render_image_model_name
 
 
@@ -83,6 +242,7 @@ class PerspectiveGenerator:
         layout_plan: Optional[dict] = None,
         door_info: Optional[dict] = None,
         window_info: Optional[dict] = None,
+        image: Optional[PerspectiveInput] = None,
     ) -> str:
         """
         Generate a photorealistic perspective view from a layout image.
@@ -90,30 +250,37 @@ class PerspectiveGenerator:
         The layout image already contains all furniture positions visually.
         We pass ONLY the image + a short prompt to avoid confusing Gemini
         with text positions that might contradict what it sees.
+        
+        Pass `image` when the caller already holds raw bytes; otherwise
+        `image_base64` is decoded once here. Returns base64 for the API.
         """
         prompt = self._build_perspective_prompt(room_dims, style, view_angle, lighting, door_info, window_info)
         
-        # Debug logging
-        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-        _save_debug_json(f"{timestamp}_perspective_INPUT.json", {
-            "prompt": prompt,
-            "room_dims": room_dims.dict(),
-            "style": style,
-            "has_image": image_base64 is not None,
-            "door_info": door_info,
-            "window_info": window_info,
-        })
-
-        if not image_base64:
-            raise RuntimeError("No layout image provided for perspective generation.")
+        # Debug logging (payload only built when DEBUG is enabled)
+        timestamp = time.monotonic_ns()
+        if logger.isEnabledFor(logging.DEBUG):
+            _save_debug_json(f"{timestamp}_perspective_INPUT.json", {
+                "prompt": prompt,
+                "room_dims": room_dims.dict(),
+                "style": style,
+                "has_image": image is not None or image_base64 is not None,
+                "door_info": door_info,
+                "window_info": window_info,
+            })
+
+        if image is None:
+            if not image_base64:
+                raise RuntimeError("No layout image provided for perspective generation.")
+            image = PerspectiveInput.from_base64(image_base64)
 
         try:
-            result = await self._call_gemini_image_generation(prompt, image_base64)
-            print(f"[Perspective] Generation successful")
-            return result
+            result = await self._call_gemini_image_generation(prompt, image)
+            logger.debug("Generation successful")
+            return imaging.b64encode_str(result)
         except Exception as e:
-            _save_debug_json(f"{timestamp}_perspective_ERROR.json", {"error": str(e)})
-            print(f"[Perspective] Generation failed: {e}")
+            if logger.isEnabledFor(logging.DEBUG):
+                _save_debug_json(f"{timestamp}_perspective_ERROR.json", {"error": str(e)})
+            logger.error("Generation failed: %s", e)
             raise e
 
     @traceable(
@@ -122,39 +289,120 @@ class PerspectiveGenerator:
         tags=["gemini", "image", "perspective", "api-call"],
         metadata={"model_type": "gemini-image", "task": "perspective_generation"}
     )
-    async def _call_gemini_image_generation(self, prompt: str, image_base64: str) -> str:
+    async def _call_gemini_image_generation(self, prompt: str, image: PerspectiveInput) -> bytes:
         """
         Make the Gemini image generation API call.
         Image is always required for perspective generation.
+        Takes and returns raw image bytes; no base64 on this path.
+        
+        Identical (image, prompt) requests are coalesced: concurrent callers
+        share one in-flight call and repeats within the TTL hit the cache.
         """
-        if "," in image_base64:
-            image_base64 = image_base64.split(",")[1]
+        key = hashlib.blake2b(
+            image.image_bytes + prompt.encode() + self.image_model.encode(),
+            digest_size=16,
+        ).digest()
+        cached = _render_cache_get(key)
+        if cached is not None:
+            logger.debug("Render cache hit")
+            return cached
 
-        image_data = base64.b64decode(image_base64)
+        loop = asyncio.get_running_loop()
+        task = _inflight_renders.get((loop, key))
+        if task is None:
+            task = loop.create_task(self._request_render(prompt, image, key))
+            _inflight_renders[(loop, key)] = task
+            task.add_done_callback(lambda _t, k=(loop, key): _inflight_renders.pop(k, None))
+        # shield: one caller cancelling must not cancel the shared call
+        return await asyncio.shield(task)
+
+    async def _request_render(self, prompt: str, image: PerspectiveInput, key: bytes) -> bytes:
+        cached = await asyncio.to_thread(_render_disk.get, key.hex())
+        if cached is not None:
+            logger.debug("Render disk cache hit")
+            _render_cache_put(key, cached)
+            return cached
+
+        data, mime = await asyncio.to_thread(imaging.prepare_for_model, image.image_bytes, image.mime)
         contents = [
-            types.Part.from_bytes(data=image_data, mime_type="image/png"),
+            types.Part.from_bytes(data=data, mime_type=mime),
             prompt
         ]
 
-        response = await asyncio.to_thread(
-            self.client.models.generate_content,
+        # Native async call: concurrent renders share the event loop
+        # instead of each holding a worker thread for the whole request
+        response = await gemini.generate_content(
+            self.client,
             model=self.image_model,
             contents=contents,
-            config=types.GenerateContentConfig(
-                response_modalities=["image", "text"],
-                temperature=0.4,
-            )
+            config=_RENDER_CONFIG
         )
         
+        result = self._extract_image(response)
+        _render_cache_put(key, result)
+        await asyncio.to_thread(_render_disk.put, key.hex(), result)
+        return result
+
+    @staticmethod
+    def _extract_image(response) -> bytes:
+        """Return the first inline image in a generateContent response."""
         if (response.candidates
                 and response.candidates[0].content
                 and response.candidates[0].content.parts):
             for part in response.candidates[0].content.parts:
                 if hasattr(part, 'inline_data') and part.inline_data:
-                    return base64.b64encode(part.inline_data.data).decode('utf-8')
+                    return part.inline_data.data
         
         raise RuntimeError("No image generated in response")
 
+    @traceable(
+        name="perspective_generator.generate_side_view_batch",
+        run_type="chain",
+        tags=["perspective", "3d", "generation", "batch"]
+    )
+    async def generate_side_view_batch(self, items: List[Tuple[str, PerspectiveInput]]) -> List[Any]:
+        """
+        Render many (prompt, image) pairs through Gemini Batch Mode.
+        
+        For non-interactive renders only: batch jobs are billed at half
+        price but may sit in the queue for minutes. Returns one entry per
+        item, in order — a base64 image or the Exception for that item.
+        """
+        requests = []
+        for prompt, image in items:
+            data, mime = await asyncio.to_thread(imaging.prepare_for_model, image.image_bytes, image.mime)
+            requests.append(types.InlinedRequest(
+                contents=[types.Content(role="user", parts=[
+                    types.Part.from_bytes(data=data, mime_type=mime),
+                    types.Part.from_text(text=prompt),
+                ])],
+                config=_RENDER_CONFIG,
+            ))
+
+        job = await self.client.aio.batches.create(model=self.image_model, src=requests)
+        logger.info("Batch job %s submitted (%d renders)", job.name, len(requests))
+
+        delay = BATCH_POLL_INITIAL_S
+        while job.state not in _BATCH_DONE_STATES:
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, BATCH_POLL_MAX_S)
+            job = await self.client.aio.batches.get(name=job.name)
+
+        if job.state not in (types.JobState.JOB_STATE_SUCCEEDED, types.JobState.JOB_STATE_PARTIALLY_SUCCEEDED):
+            raise RuntimeError(f"Batch job {job.name} ended in {job.state}: {job.error}")
+
+        responses = (job.dest.inlined_responses if job.dest else None) or []
+        results: List[Any] = []
+        for i in range(len(items)):
+            inlined = responses[i] if i < len(responses) else None
+            try:
+                if inlined is None or inlined.error:
+                    raise RuntimeError(f"Batch render failed: {inlined.error if inlined else 'missing response'}")
+                results.append(imaging.b64encode_str(self._extract_image(inlined.response)))
+            except Exception as e:
+                results.append(e)
+        return results
+
     def _build_perspective_prompt(
         self,
         room_dims: RoomDimensions,
@@ -165,53 +413,18 @@ class PerspectiveGenerator:
         window_info: Optional[dict]
     ) -> str:
         """Build a short, focused prompt. The image does the heavy lifting."""
-        
-        door_txt = ""
-        if door_info:
-            d_wall = door_info.get("wall", "unknown")
-            door_txt = f"The entry DOOR is on the {d_wall} wall."
-            
-        window_txt = ""
-        if window_info:
-            w_wall = window_info.get("wall", "unknown")
-            window_txt = f"Windows are on the {w_wall} wall."
-            
-        return f"""ROLE: You are an architectural photographer.
-TASK: Create a photorealistic EYE-LEVEL interior photograph based on this floor plan.
-
-CAMERA SETUP (NON-NEGOTIABLE):
-- Position: Standing on the floor inside the room at the {view_angle}.
-- Height: 5 feet (1.5 meters) exactly.
-- Angle: 0° tilt (Horizontal). Look straight ahead across the room.
-- Lens: 16-24mm Wide Angle.
-- Focus: The furniture and far wall.
-- SPECIAL CASE: If there are walls on either side of the entry doorway , place camera a few feet away from the doorway.
-
-
-CRITICAL RULES:
-1. VIEWPOINT: This MUST be an IMMERSIVE INTERIOR VIEW.
-   - NO top-down views.
-   - NO isometric views.
-   - NO birds-eye views.
-   - NO ceiling-down views.
-   - If the floor plan looks like a map, your output must look like a PHOTO taken FROM WITHIN that map.
-
-2. STRUCTURAL ACCURACY:
-   - Door can be found in the position: {door_txt}
-   - Ceiling and Floor must be visible and parallel (2-point perspective).
-   - CRITICAL: Do NOT Generate extra furnitures ,stairs or walls that are not present in the layout.
-   - CRITICAL: Any solid line must be treated as room dividing walls and must not be moved. The walls must be complete and connected to ceiling and floor.
-
-3. CONTENT FIDELITY:
-   - VISIBILITY: Include the whatever number of objects in the layout visible from the camera angle. Its fine to exclude items hidden by room-dividing walls.
-   - POSITION: Do NOT move any furniture from their original positions. Place and orient them EXACTLY as shown in the plan.
-   - CRITICAL: Do NOT move or reorient the kitchen area or bathroom area fixtures.
-   - Style: {style}.
-   - Lighting: {lighting}.
+        return _build_prompt_cached(
+            room_dims.width_estimate, room_dims.height_estimate,
+            style, view_angle, lighting,
+            door_info.get("wall", "unknown") if door_info else None,
+            window_info.get("wall", "unknown") if window_info else None,
+        )
 
-Room Dimensions: ~{room_dims.width_estimate:.0f} x {room_dims.height_estimate:.0f} ft, 9ft ceiling.
 
-Generate the eye-level interior photograph now."""
+@lru_cache(maxsize=1)
+def get_perspective_generator() -> PerspectiveGenerator:
+    """Shared PerspectiveGenerator so renders reuse one client and its connections."""
+    return PerspectiveGenerator()
 
 
 # LangGraph node functions
@@ -221,11 +434,35 @@ async def perspective_node(state: AgentState) -> Dict[str, Any]:
     """
     LangGraph node that generates perspective renders.
     """
-    generator = PerspectiveGenerator()
+    generator = get_perspective_generator()
     
     try:
         layout = state.get("proposed_layout") or state.get("current_layout", [])
         room_dims = state["room_dimensions"]
+
+        # Offline/queued runs: render every variation in one Batch Mode job
+        variations = [v for v in state.get("layout_variations") or [] if v.get("thumbnail_base64")]
+        if state.get("batch_mode") and variations:
+            items = [
+                (generator._build_perspective_prompt(
+                    room_dims, "modern", "corner", "natural daylight",
+                    v.get("door_info"), v.get("window_info")),
+                 PerspectiveInput.from_base64(v["thumbnail_base64"]))
+                for v in variations
+            ]
+            renders = await generator.generate_side_view_batch(items)
+            for v, render in zip(variations, renders):
+                if isinstance(render, Exception):
+                    logger.warning("Batch render failed for %s: %s", v.get("style_key"), render)
+                    continue
+                v["perspective_base64"] = render
+            first = next((r for r in renders if isinstance(r, str)), None)
+            return {
+                "layout_variations": state["layout_variations"],
+                "output_image_url": None,
+                "output_image_base64": first,
+                "explanation": state.get("explanation", "") + f"\n\nGenerated {sum(isinstance(r, str) for r in renders)} perspective views (batch).",
+            }
         
         image_base64 = await generator.generate_side_view(
             room_dims=room_dims,
@@ -249,13 +486,4 @@ async def perspective_node(state: AgentState) -> Dict[str, Any]:
 
 def perspective_node_sync(state: AgentState) -> Dict[str, Any]:
     """Synchronous wrapper for LangGraph compatibility."""
-    import asyncio
-    try:
-        loop = asyncio.get_running_loop()
-    except RuntimeError:
-        return asyncio.run(perspective_node(state))
-    else:
-        import concurrent.futures
-        with concurrent.futures.ThreadPoolExecutor() as pool:
-            future = pool.submit(asyncio.run, perspective_node(state))
-            return future.result()
\ No newline at end of file
+    return run_sync(perspective_node(state))
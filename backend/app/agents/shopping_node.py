@@ -10,16 +10,17 @@ Agentic node that:
 FULLY TRACED with LangSmith.
 """
 
-import json
-import base64
+import orjson
 import asyncio
-import traceback
-from typing import List, Dict, Any, Optional
-from google import genai
+import logging
+import numpy as np
+from typing import List, Dict, Any, Optional, Tuple, Union
 from google.genai import types
+from pydantic import BaseModel, TypeAdapter, ValidationError
 
 from app.config import get_settings
-from app.models.room import RoomObject
+from app.core import gemini, imaging
+from app.models.room import RoomObject, ObjectType
 from app.tools.serp_search import SerpSearchTool
 
 try:
@@ -33,6 +34,81 @@ except ImportError:
         return decorator
 
 
+logger = logging.getLogger(__name__)
+
+# Searches whose budgets round to the same $50 bucket are treated as identical
+SEARCH_BUDGET_BUCKET = 50
+
+# Items likely to come back empty (long, very specific queries or tight
+# budgets) send their broader fallback in the first batch, alongside the
+# specific query; other items only pay for a fallback once they miss
+SPECULATIVE_FALLBACK_MIN_WORDS = 6
+SPECULATIVE_FALLBACK_MAX_BUDGET = 75
+
+
+def _likely_to_miss(query: str, budget: float) -> bool:
+    return len(query.split()) >= SPECULATIVE_FALLBACK_MIN_WORDS or budget <= SPECULATIVE_FALLBACK_MAX_BUDGET
+
+# Filled with str.format per call
+_DESCRIBE_PROMPT_TMPL = """You are a furniture shopping assistant. Convert generic furniture labels into specific Google Shopping search queries and allocate a budget.
+
+TOTAL BUDGET: ${total_budget:.2f}
+
+FURNITURE ITEMS (from plan):
+{item_list_str}
+
+TASK 1 — Analyze the attached perspective image:
+Detect ANY additional furniture or decor items visible in the image that are NOT in the "FURNITURE ITEMS" list above (e.g., rugs, plants, lamps, artwork, pillows).
+For each new item found, create a new entry with a unique ID (e.g., "detected_plant_1").
+
+TASK 2 — Write a Google Shopping search query for each item (original + detected):
+Generate a Google Shopping search query. The specificity depends on the item category, but MUST always be specific enough to find a real product (never generic).
+
+1. KEY FURNITURE (Bed, Sofa, Desk, Wardrobe, Dining Table):
+   - HIGH SPECIFICITY. Include precise style, material, color, size, and defining features.
+   - Example: "Bed" → "Queen size walnut platform bed frame" : maximum 6 words
+
+2. SECONDARY FURNITURE (Nightstand, Chair, Coffee Table, Dresser):
+   - MODERATE SPECIFICITY. Include style, material, color, and main dimension.
+   - Example: "Nightstand" → "White oak bedside table with drawers" : maximum 5 words
+
+3. DECOR / ACCESSORIES (Rug, Lamp, Plant, Artwork):
+   - LOW SPECIFICITY. Focus on style, color, type, and size.
+   - Example: "Plant" → "Artificial fiddle leaf fig tree" :maximum 4 words
+
+Examples of POOR/GENERIC queries (AVOID THESE): "bed", "blue sofa", "wooden table", "plant".
+
+TASK 3 — Allocate ${total_budget:.2f} across ALL items (original + detected) proportionally:
+- Prioritize key furniture (Bed, Sofa, Desk) (~70% of budget divided equally)
+- Secondary furniture (Tables, Chairs, Dressers) (~60% of budget )
+- Decor/Accessories (Plants, Rugs, Lamps) (~30% of budget)
+
+RULES:
+- Return one entry per item: original items plus detected items (is_new = true).
+- Every original item from the input list MUST appear exactly once.
+- "id" and "label" of original items must match EXACTLY.
+- For new detected items, use IDs starting with "detected_".
+- Total estimated cost MUST sum to exactly plus or minus 10% of ${total_budget:.2f}."""
+
+
+class ShoppingItem(BaseModel):
+    """One item in Gemini's describe-and-allocate reply."""
+    id: str
+    label: str
+    search_query: str
+    budget: float
+    is_new: bool = False
+
+
+# The response schema makes Gemini return exactly a list of ShoppingItem
+_DESCRIBE_CONFIG = types.GenerateContentConfig(
+    response_mime_type="application/json",
+    response_schema=list[ShoppingItem],
+    temperature=0.4,
+)
+_SHOPPING_ITEMS = TypeAdapter(List[ShoppingItem])
+
+
 class ShoppingAgent:
     """
     AI agent that finds real products matching the furniture in a room render.
@@ -42,10 +118,10 @@ class ShoppingAgent:
         settings = get_settings()
         if not settings.google_api_key:
             raise ValueError("GOOGLE_API_KEY not set")
-        self.client = genai.Client(api_key=settings.google_api_key)
+        self.client = gemini.get_genai_client(settings.google_api_key)
         self.model = settings.planning_model_name
         self.search_tool = SerpSearchTool()
-        print(f"[ShoppingAgent] Initialized with model: {self.model}")
+        logger.info("Initialized with model: %s", self.model)
 
     @traceable(
         name="shopping_agent.find_products",
@@ -56,21 +132,22 @@ class ShoppingAgent:
         self,
         current_layout: List[RoomObject],
         total_budget: float,
-        perspective_image_base64: Optional[str] = None,
+        perspective_image_base64: Optional[Union[str, bytes]] = None,
     ) -> Dict[str, Any]:
         """
         Main entry point. Analyzes room, allocates budget, searches products.
+        The perspective image may be base64 (plain or data URL) or raw bytes.
         """
         # Step 1: Get only movable furniture
         movable_items = [
             {"id": obj.id, "label": obj.label}
             for obj in current_layout
-            if obj.type.value == "movable"
+            if obj.type is ObjectType.MOVABLE
         ]
 
-        print(f"[ShoppingAgent] Movable items: {movable_items}")
-        print(f"[ShoppingAgent] Total budget: ${total_budget}")
-        print(f"[ShoppingAgent] Has perspective image: {perspective_image_base64 is not None}")
+        logger.info("Movable items: %d, total budget: $%s, perspective image: %s",
+                    len(movable_items), total_budget, perspective_image_base64 is not None)
+        logger.debug("Movable items: %s", movable_items)
 
         if not movable_items:
             return {"items": [], "total_estimated": 0, "message": "No movable furniture found."}
@@ -80,39 +157,28 @@ class ShoppingAgent:
             movable_items, total_budget, perspective_image_base64
         )
 
-        print(f"[ShoppingAgent] Gemini returned {len(item_descriptions)} item descriptions:")
-        for desc in item_descriptions:
-            print(f"  - {desc.get('id')}: query=\"{desc.get('search_query')}\" budget=${desc.get('budget')}")
+        logger.info("Gemini returned %d item descriptions", len(item_descriptions))
+        if logger.isEnabledFor(logging.DEBUG):
+            for desc in item_descriptions:
+                logger.debug("  - %s: query=%r budget=$%s", desc["id"], desc["search_query"], desc["budget"])
 
-        # Step 3: Search for each item in parallel
-        search_tasks = [self._search_for_item(item) for item in item_descriptions]
-        search_results = await asyncio.gather(*search_tasks, return_exceptions=True)
+        # Step 3: Search for all items in one batch
+        search_results = await self._search_items(item_descriptions)
 
         # Step 4: Assemble results
         items = []
         total_estimated = 0.0
-        for i, result in enumerate(search_results):
-            desc = item_descriptions[i]
-            if isinstance(result, Exception):
-                print(f"[ShoppingAgent] Search FAILED for {desc['id']}: {result}")
-                items.append({
-                    "furniture_id": desc["id"],
-                    "furniture_label": desc["label"],
-                    "search_query": desc.get("search_query", ""),
-                    "budget_allocated": desc.get("budget", 0),
-                    "products": [],
-                    "error": str(result),
-                })
-            else:
-                best_price = result[0]["price"] if result and result[0].get("price") else 0
-                total_estimated += best_price
-                items.append({
-                    "furniture_id": desc["id"],
-                    "furniture_label": desc["label"],
-                    "search_query": desc.get("search_query", ""),
-                    "budget_allocated": desc.get("budget", 0),
-                    "products": result,
-                })
+        # (search failures come back as empty product lists)
+        for desc, result in zip(item_descriptions, search_results):
+            best_price = result[0]["price"] if result and result[0].get("price") else 0
+            total_estimated += best_price
+            items.append({
+                "furniture_id": desc["id"],
+                "furniture_label": desc["label"],
+                "search_query": desc.get("search_query", ""),
+                "budget_allocated": desc.get("budget", 0),
+                "products": result,
+            })
 
         return {
             "items": items,
@@ -130,7 +196,7 @@ class ShoppingAgent:
         self,
         movable_items: List[Dict[str, str]],
         total_budget: float,
-        image_base64: Optional[str] = None,
+        image: Optional[Union[str, bytes]] = None,
     ) -> List[Dict[str, Any]]:
         """
         Use Gemini to convert generic labels to specific product queries
@@ -138,71 +204,30 @@ class ShoppingAgent:
 
         No fallback — raises on failure so we can debug properly.
         """
-        item_list_str = json.dumps(movable_items, indent=2)
-        num_items = len(movable_items)
-
-        prompt = f"""You are a furniture shopping assistant. Convert generic furniture labels into specific Google Shopping search queries and allocate a budget.
-
-TOTAL BUDGET: ${total_budget:.2f}
-
-FURNITURE ITEMS (from plan):
-{item_list_str}
-
-TASK 1 — Analyze the attached perspective image:
-Detect ANY additional furniture or decor items visible in the image that are NOT in the "FURNITURE ITEMS" list above (e.g., rugs, plants, lamps, artwork, pillows).
-For each new item found, create a new entry with a unique ID (e.g., "detected_plant_1").
-
-TASK 2 — Write a Google Shopping search query for each item (original + detected):
-Generate a Google Shopping search query. The specificity depends on the item category, but MUST always be specific enough to find a real product (never generic).
-
-1. KEY FURNITURE (Bed, Sofa, Desk, Wardrobe, Dining Table):
-   - HIGH SPECIFICITY. Include precise style, material, color, size, and defining features.
-   - Example: "Bed" → "Queen size walnut platform bed frame" : maximum 6 words
-
-2. SECONDARY FURNITURE (Nightstand, Chair, Coffee Table, Dresser):
-   - MODERATE SPECIFICITY. Include style, material, color, and main dimension.
-   - Example: "Nightstand" → "White oak bedside table with drawers" : maximum 5 words
-
-3. DECOR / ACCESSORIES (Rug, Lamp, Plant, Artwork):
-   - LOW SPECIFICITY. Focus on style, color, type, and size.
-   - Example: "Plant" → "Artificial fiddle leaf fig tree" :maximum 4 words
-
-Examples of POOR/GENERIC queries (AVOID THESE): "bed", "blue sofa", "wooden table", "plant".
-
-TASK 3 — Allocate ${total_budget:.2f} across ALL items (original + detected) proportionally:
-- Prioritize key furniture (Bed, Sofa, Desk) (~70% of budget divided equally)
-- Secondary furniture (Tables, Chairs, Dressers) (~60% of budget )
-- Decor/Accessories (Plants, Rugs, Lamps) (~30% of budget)
-
-Total estimated cost MUST sum to exactly plus or minus 10% of ${total_budget:.2f}.
-
-Return ONLY a JSON array with ALL objects (original items + detected items):
-[
-  {{"id": "bed_1", "label": "bed", "search_query": "queen size walnut platform bed frame", "budget": 500.00}},
-  {{"id": "detected_plant_1", "label": "plant", "search_query": "artificial fiddle leaf fig tree 6ft", "budget": 80.00, "is_new": true}}
-]
-
-RULES:
-- Every original item from the input list MUST appear exactly once.
-- "id" and "label" of original items must match EXACTLY.
-- For new detected items, use IDs starting with "detected_".
-- Total estimated cost MUST sum to exactly plus or minus 10% of ${total_budget:.2f}.
-- Return ONLY the JSON array, nothing else."""
+        prompt = _DESCRIBE_PROMPT_TMPL.format(
+            total_budget=total_budget,
+            # Compact JSON; indentation only adds input tokens
+            item_list_str=orjson.dumps(movable_items).decode(),
+        )
 
         # Build contents
         contents = []
-        if image_base64:
-            clean_b64 = image_base64.split(",")[1] if "," in image_base64 else image_base64 
+        img_data = None
+        if isinstance(image, bytes):
+            # Raw bytes from an in-process render; nothing to decode
+            img_data = image
+        elif image:
             try:
-                img_data = base64.b64decode(clean_b64)
-                contents.append(types.Part.from_bytes(data=img_data, mime_type="image/png"))
-                print(f"[ShoppingAgent] Attached perspective image ({len(img_data)} bytes)")
+                img_data = imaging.b64decode(imaging.strip_data_url(image))
             except Exception as e:
-                print(f"[ShoppingAgent] WARNING: Failed to decode image: {e}")
+                logger.warning("Failed to decode image: %s", e)
+        if img_data:
+            contents.append(types.Part.from_bytes(data=img_data, mime_type="image/png"))
+            logger.debug("Attached perspective image (%d bytes)", len(img_data))
         contents.append(prompt)
 
-        print(f"[ShoppingAgent] Calling Gemini model={self.model} with {len(contents)} content parts")
-        print(f"[ShoppingAgent] Prompt length: {len(prompt)} chars")
+        logger.debug("Calling Gemini model=%s with %d content parts, prompt %d chars",
+                     self.model, len(contents), len(prompt))
 
         # Call Gemini
         try:
@@ -210,131 +235,110 @@ RULES:
                 self.client.models.generate_content,
                 model=self.model,
                 contents=contents,
-                config=types.GenerateContentConfig(
-                    response_mime_type="application/json",
-                    temperature=0.4,
-                )
+                config=_DESCRIBE_CONFIG
             )
         except Exception as e:
-            print(f"[ShoppingAgent] ERROR: Gemini API call failed!")
-            print(f"[ShoppingAgent] Exception type: {type(e).__name__}")
-            print(f"[ShoppingAgent] Exception: {e}")
-            print(f"[ShoppingAgent] Traceback:\n{traceback.format_exc()}")
+            logger.exception("Gemini API call failed: %s: %s", type(e).__name__, e)
             raise RuntimeError(f"Gemini API call failed: {e}") from e
 
         # Parse response
         raw_text = response.text
-        print(f"[ShoppingAgent] Gemini raw response ({len(raw_text)} chars): {raw_text[:1000]}")
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug("Gemini raw response (%d chars): %s", len(raw_text), raw_text[:1000])
 
         try:
-            result = json.loads(raw_text)
-        except json.JSONDecodeError as e:
-            print(f"[ShoppingAgent] ERROR: Failed to parse Gemini response as JSON!")
-            print(f"[ShoppingAgent] JSONDecodeError: {e}")
-            print(f"[ShoppingAgent] Full raw response:\n{raw_text}")
-            raise RuntimeError(f"Gemini returned invalid JSON: {e}\nRaw: {raw_text[:500]}") from e
-
-        # Handle Gemini wrapping the array in a dict
-        if isinstance(result, dict):
-            print(f"[ShoppingAgent] WARNING: Gemini returned dict with keys: {list(result.keys())}")
-            # Try to extract the array from common wrapper keys
-            extracted = None
-            for key in ("items", "furniture", "results", "data", "furniture_items"):
-                if key in result and isinstance(result[key], list):
-                    extracted = result[key]
-                    print(f"[ShoppingAgent] Extracted array from key '{key}' ({len(extracted)} items)")
-                    break
-            if extracted is None:
-                # If dict has the expected item fields, it might be a single item — wrap it
-                if "id" in result and "search_query" in result:
-                    extracted = [result]
-                    print(f"[ShoppingAgent] Wrapped single dict item into list")
-                else:
-                    raise RuntimeError(f"Gemini returned dict but no extractable array. Keys: {list(result.keys())}. Full response: {raw_text[:500]}")
-            result = extracted
-
-        if not isinstance(result, list):
-            raise RuntimeError(f"Expected list from Gemini, got {type(result).__name__}: {raw_text[:500]}")
-
-        if len(result) == 0:
+            items = _SHOPPING_ITEMS.validate_json(raw_text)
+        except ValidationError as e:
+            logger.error("Gemini response does not match the item schema. Full raw response:\n%s", raw_text)
+            raise RuntimeError(f"Gemini returned invalid items: {e}\nRaw: {raw_text[:500]}") from e
+
+        if not items:
             raise RuntimeError(f"Gemini returned empty list. Raw: {raw_text[:500]}")
 
-        print(f"[ShoppingAgent] Parsed {len(result)} items from Gemini")
-
-        # Validate each item has required fields
-        for i, item in enumerate(result):
-            if not isinstance(item, dict):
-                raise RuntimeError(f"Item {i} is not a dict: {item}")
-            missing = [k for k in ("id", "label", "search_query", "budget") if k not in item]
-            if missing:
-                print(f"[ShoppingAgent] WARNING: Item {i} missing fields {missing}: {item}")
-                # Try to fill in missing fields from movable_items
-                if "id" not in item and i < len(movable_items):
-                    item["id"] = movable_items[i]["id"]
-                if "label" not in item and i < len(movable_items):
-                    item["label"] = movable_items[i]["label"]
-                if "search_query" not in item:
-                    item["search_query"] = f"{item.get('label', 'furniture')} for home"
-                if "budget" not in item:
-                    item["budget"] = round(total_budget / num_items, 2)
+        logger.debug("Parsed %d items from Gemini", len(items))
+        result = [item.model_dump() for item in items]
 
         # Validate + fix budget sum
-        budget_sum = sum(item.get("budget", 0) for item in result)
-        print(f"[ShoppingAgent] Budget sum: ${budget_sum:.2f} (expected: ${total_budget:.2f})")
+        budgets = np.array([item["budget"] for item in result], dtype=np.float64)
+        budget_sum = float(budgets.sum())
+        logger.debug("Budget sum: $%.2f (expected: $%.2f)", budget_sum, total_budget)
 
         if abs(budget_sum - total_budget) > 1.0:
-            print(f"[ShoppingAgent] WARNING: Budget sum off by ${abs(budget_sum - total_budget):.2f}, rescaling")
+            logger.warning("Budget sum off by $%.2f, rescaling", abs(budget_sum - total_budget))
             if budget_sum > 0:
-                ratio = total_budget / budget_sum
-                for item in result:
-                    item["budget"] = round(item.get("budget", 0) * ratio, 2)
-            # Fix rounding on last item
-            new_sum = sum(item["budget"] for item in result)
-            diff = round(total_budget - new_sum, 2)
-            if result and diff != 0:
-                result[0]["budget"] = round(result[0]["budget"] + diff, 2)
+                budgets = np.round(budgets * (total_budget / budget_sum), 2)
+            # Fix rounding on first item
+            diff = round(total_budget - float(budgets.sum()), 2)
+            if diff != 0:
+                budgets[0] = round(budgets[0] + diff, 2)
+            for item, budget in zip(result, budgets.tolist()):
+                item["budget"] = budget
 
         return result
 
     @traceable(
-        name="search_for_item",
+        name="search_items",
         run_type="tool",
         tags=["serpapi", "shopping", "search"],
     )
-    async def _search_for_item(
+    async def _search_items(
         self,
-        item: Dict[str, Any],
-    ) -> List[Dict[str, Any]]:
+        items: List[Dict[str, Any]],
+    ) -> List[List[Dict[str, Any]]]:
         """
-        Search Google Shopping for a single item within its allocated budget.
-        Retries with a broader query if first attempt returns no results.
+        Search Google Shopping for every item within its allocated budget.
+        All specific queries go out in one concurrent batch, together with
+        the broader retry query (label only, budget +50%) of items likely to
+        miss. Any other item that comes back empty gets its broader query in
+        a second batch, so most fallbacks are paid for only when needed.
         """
-        query = item.get("search_query", "")
-        budget = item.get("budget", 500)
-        label = item.get("label", "furniture")
-
-        if not query:
-            print(f"[ShoppingAgent] WARNING: Empty search query for {item.get('id')}, using label")
-            query = f"{label} furniture"
-
-        print(f"[ShoppingAgent] Searching: \"{query}\" (budget: ${budget})")
-
-        # First attempt with Gemini's specific query
-        products = await self.search_tool.search_shopping(
-            query=query,
-            max_price=budget,
-            num_results=3,
-        )
-
-        # Agentic retry: if no results, broaden the query
-        if not products:
-            broader_query = f"{label}"
-            print(f"[ShoppingAgent] No results for \"{query}\", retrying with \"{broader_query}\" (budget +50%)")
-            products = await self.search_tool.search_shopping(
-                query=broader_query,
-                max_price=budget * 1.5,
-                num_results=3,
-            )
-
-        print(f"[ShoppingAgent] Found {len(products)} products for {item.get('id')}")
-        return products
\ No newline at end of file
+        def dedupe(requests: List[Tuple[str, float]]) -> Tuple[List[Tuple[str, float]], List[int]]:
+            # Identical items (e.g. a pair of nightstands) share one SerpAPI call
+            # per (query, budget bucket) instead of paying for duplicates
+            queries: List[Tuple[str, float]] = []
+            query_index: Dict[Tuple[str, int], int] = {}
+            slots = []
+            for query, max_price in requests:
+                key = (query, round(max_price / SEARCH_BUDGET_BUCKET) * SEARCH_BUDGET_BUCKET)
+                if key not in query_index:
+                    query_index[key] = len(queries)
+                    queries.append((query, max_price))
+                slots.append(query_index[key])
+            return queries, slots
+
+        primary_requests = []
+        for item in items:
+            query = item.get("search_query", "")
+            budget = item.get("budget", 500)
+
+            if not query:
+                logger.warning("Empty search query for %s, using label", item.get("id"))
+                query = f"{item.get('label', 'furniture')} furniture"
+
+            logger.debug("Searching: %r (budget: $%s)", query, budget)
+            primary_requests.append((query, budget))
+
+        def broader(i: int) -> Tuple[str, float]:
+            return items[i].get("label", "furniture"), items[i].get("budget", 500) * 1.5
+
+        speculative = [i for i, (query, budget) in enumerate(primary_requests) if _likely_to_miss(query, budget)]
+        queries, slots = dedupe(primary_requests + [broader(i) for i in speculative])
+        results = await self.search_tool.search_shopping_batch(queries, num_results=3)
+        found = [results[slot] for slot in slots[:len(items)]]
+        fallbacks = {i: results[slot] for i, slot in zip(speculative, slots[len(items):])}
+
+        # Agentic retry: broader query for the items with no results
+        empty = [i for i, products in enumerate(found) if not products]
+        for i in empty:
+            logger.info("No results for %r, using %r (budget +50%%)", primary_requests[i][0], broader(i)[0])
+        retry = [i for i in empty if i not in fallbacks]
+        if retry:
+            queries, slots = dedupe([broader(i) for i in retry])
+            results = await self.search_tool.search_shopping_batch(queries, num_results=3)
+            fallbacks.update((i, results[slot]) for i, slot in zip(retry, slots))
+        for i in empty:
+            found[i] = fallbacks[i]
+
+        for item, products in zip(items, found):
+            logger.debug("Found %d products for %s", len(products), item.get("id"))
+        return found
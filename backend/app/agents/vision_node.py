@@ -1,13 +1,119 @@
 # app/agents/vision_node.py
 from __future__ import annotations
 
-from typing import Dict, Any
+import asyncio
+import hashlib
+import logging
+import os
+import tempfile
+import time
+from collections import OrderedDict
+from functools import lru_cache
+from typing import Dict, Any, List, Optional, Tuple
 
+from app.core import gemini, imaging
+from app.core.disk_cache import DiskCache
 from app.models.state import AgentState
 from app.models.room import RoomObject, VisionOutput
 from app.vision.config import VisionConfig
 from app.vision.router import get_provider
-from app.vision.normalize import normalize_objects
+from app.vision.normalize import normalize_objects, rescale_output
+from app.vision.providers.base import ImageInput
+from app.vision.providers.gemini_provider import PROMPT_VERSION
+
+logger = logging.getLogger(__name__)
+
+# Images packed into one multi-image vision request
+VISION_BATCH_MAX_IMAGES = 8
+
+# ============================================================================
+# ANALYSIS CACHE — keyed on hash(image) + provider + model + prompt version
+# ============================================================================
+# Users iterate on layouts against the same upload; repeat analyses of an
+# identical image skip the vision call. Values are VisionOutput JSON so each
+# hit returns a fresh model. In-process L1 in front of an on-disk L2.
+_VISION_CACHE_MAX = 64
+_VISION_CACHE_TTL_S = 3600.0
+_vision_cache: "OrderedDict[str, Tuple[float, str]]" = OrderedDict()
+
+VISION_DISK_CACHE_DIR = os.getenv(
+    "VISION_CACHE_DIR", os.path.join(tempfile.gettempdir(), "dwell_vision_cache")
+)
+VISION_DISK_CACHE_TTL_S = 86400.0
+VISION_DISK_CACHE_MAX_ENTRIES = 2000
+_vision_disk = DiskCache(
+    VISION_DISK_CACHE_DIR, VISION_DISK_CACHE_TTL_S, suffix=".json",
+    max_entries=VISION_DISK_CACHE_MAX_ENTRIES,
+)
+
+def _vision_cache_get(key: str) -> Optional[str]:
+    entry = _vision_cache.get(key)
+    if entry is None:
+        return None
+    if entry[0] <= time.monotonic():
+        del _vision_cache[key]
+        return None
+    _vision_cache.move_to_end(key)
+    return entry[1]
+
+def _vision_cache_put(key: str, output_json: str):
+    _vision_cache[key] = (time.monotonic() + _VISION_CACHE_TTL_S, output_json)
+    _vision_cache.move_to_end(key)
+    if len(_vision_cache) > _VISION_CACHE_MAX:
+        _vision_cache.popitem(last=False)
+
+
+# Near-duplicate tier: re-uploads that were rescaled or recompressed miss the
+# exact hash, so also match on a 64-bit dHash within a small Hamming distance
+# and rescale the cached pixel coordinates to the new image size. The hash
+# alone can't tell a rearranged plan from the original, so a candidate must
+# also keep the aspect ratio and pass a per-pixel thumbnail comparison.
+_NEAR_DUP_MAX = 200
+_NEAR_DUP_TTL_S = 86400.0
+_NEAR_DUP_MAX_DISTANCE = 6
+_NEAR_DUP_ASPECT_TOLERANCE = 0.01
+# namespace -> [(expires, dhash, (width, height), thumbnail, output_json)], oldest first
+_near_dup_entries: Dict[str, list] = {}
+_vision_cache_stats = {"exact": 0, "near": 0, "miss": 0}
+
+def _same_aspect(a: Tuple[int, int], b: Tuple[int, int]) -> bool:
+    return abs(a[0] * b[1] - b[0] * a[1]) <= _NEAR_DUP_ASPECT_TOLERANCE * a[0] * b[1]
+
+def _near_dup_get(
+    namespace: str, phash: int, size: Tuple[int, int], thumb: bytes
+) -> Optional[Tuple[Tuple[int, int], str]]:
+    entries = _near_dup_entries.get(namespace)
+    if not entries:
+        return None
+    # Entries share one TTL and are appended in time order, so the expired
+    # ones are always a prefix: drop just those instead of rebuilding the list
+    now = time.monotonic()
+    expired = 0
+    while expired < len(entries) and entries[expired][0] <= now:
+        expired += 1
+    del entries[:expired]
+    if not entries:
+        return None
+    # Hash candidates nearest first; the thumbnail check has the final say
+    candidates = sorted(
+        (distance, i) for i, e in enumerate(entries)
+        if (distance := (e[1] ^ phash).bit_count()) <= _NEAR_DUP_MAX_DISTANCE
+    )
+    for _, i in candidates:
+        _, _, src_size, src_thumb, output_json = entries[i]
+        if _same_aspect(src_size, size) and imaging.thumbnails_match(src_thumb, thumb):
+            return src_size, output_json
+    return None
+
+def _near_dup_put(namespace: str, phash: int, size: Tuple[int, int], thumb: bytes, output_json: str):
+    entries = _near_dup_entries.setdefault(namespace, [])
+    entries.append((time.monotonic() + _NEAR_DUP_TTL_S, phash, size, thumb, output_json))
+    if len(entries) > _NEAR_DUP_MAX:
+        del entries[0]
+
+def vision_cache_stats() -> Dict[str, int]:
+    """Hit/miss counters for the analysis cache (exact, near-duplicate, miss)."""
+    return dict(_vision_cache_stats)
 
 
 class VisionAgent:
@@ -17,13 +123,102 @@ class VisionAgent:
         self._cfg = VisionConfig()
         self._provider = get_provider(self._cfg)
 
-    async def analyze_room(self, image_base64: str) -> VisionOutput:
-        """Analyze a room image and return structured VisionOutput."""
-        return self._provider.analyze(image_base64)
+    async def analyze_room(self, image_base64: ImageInput, no_cache: bool = False) -> VisionOutput:
+        """
+        Analyze a room image (base64 or raw bytes) and return structured
+        VisionOutput. Identical images are served from the analysis cache unless no_cache.
+        Raises InvalidImageError for uploads over the size limits.
+        """
+        imaging.check_upload_input(image_base64)
+        if no_cache:
+            return await self._analyze(image_base64)
+
+        # Decoding and hashing a multi-MB upload would stall the loop
+        image_bytes, key = await asyncio.to_thread(self._decode_and_key, image_base64)
+        cached = _vision_cache_get(key)
+        if cached is None:
+            blob = await asyncio.to_thread(_vision_disk.get, key)
+            if blob is not None:
+                cached = blob.decode()
+                _vision_cache_put(key, cached)
+        if cached is not None:
+            _vision_cache_stats["exact"] += 1
+            logger.debug("Analysis cache hit")
+            return VisionOutput.model_validate_json(cached)
+
+        namespace = self._cache_namespace()
+        fingerprint = await asyncio.to_thread(imaging.dhash_with_thumbnail, image_bytes)
+        if fingerprint is not None:
+            near = _near_dup_get(namespace, *fingerprint)
+            if near is not None:
+                _vision_cache_stats["near"] += 1
+                logger.debug("Near-duplicate analysis cache hit")
+                src_size, near_json = near
+                return rescale_output(VisionOutput.model_validate_json(near_json), src_size, fingerprint[1])
+
+        _vision_cache_stats["miss"] += 1
+        # Already decoded for the cache key; the provider takes the raw bytes as-is
+        output = await self._analyze(image_bytes)
+        output_json = output.model_dump_json()
+        _vision_cache_put(key, output_json)
+        if fingerprint is not None:
+            _near_dup_put(namespace, *fingerprint, output_json)
+        await asyncio.to_thread(_vision_disk.put, key, output_json.encode())
+        return output
+
+    async def analyze_rooms_batch(
+        self, images_base64: List[ImageInput], max_per_request: int = VISION_BATCH_MAX_IMAGES
+    ) -> List[VisionOutput]:
+        """
+        Analyze several room images, packing up to max_per_request images into
+        each provider call and running the chunks concurrently. Results are in
+        input order. Bypasses the analysis cache; use analyze_room for one image.
+        """
+        for image_base64 in images_base64:
+            imaging.check_upload_input(image_base64)
+        # Repeated uploads in one batch are analyzed once
+        unique = list(dict.fromkeys(images_base64))
+        chunks = [
+            unique[i:i + max_per_request]
+            for i in range(0, len(unique), max_per_request)
+        ]
+        results = await asyncio.gather(*(
+            self._provider.analyze_many_async(chunk) for chunk in chunks
+        ))
+        outputs = dict(zip(unique, (output for chunk_outputs in results for output in chunk_outputs)))
+        if len(unique) == len(images_base64):
+            return [outputs[image_base64] for image_base64 in images_base64]
+        # Repeats get their own copy so callers can edit results independently
+        seen = set()
+        batch = []
+        for image_base64 in images_base64:
+            output = outputs[image_base64]
+            batch.append(output.model_copy(deep=True) if image_base64 in seen else output)
+            seen.add(image_base64)
+        return batch
+
+    async def _analyze(self, image_base64: ImageInput) -> VisionOutput:
+        return await self._provider.analyze_async(image_base64)
+
+    def warm_up(self) -> None:
+        """Open the provider's Gemini connection ahead of the first request."""
+        client = getattr(self._provider, "client", None)
+        if client is not None:
+            gemini.prefetch_model(self._cfg.gemini_model, client=client)
+
+    def _cache_namespace(self) -> str:
+        return f"{self._cfg.provider}|{self._cfg.gemini_model}|{self._cfg.image_max_side}|{PROMPT_VERSION}"
+
+    def _decode_and_key(self, image_base64: ImageInput) -> Tuple[bytes, str]:
+        image_bytes = imaging.decode_upload(image_base64)
+        h = hashlib.sha256(image_bytes)
+        h.update(f"|{self._cache_namespace()}".encode())
+        return image_bytes, h.hexdigest()
 
 
+@lru_cache(maxsize=1)
 def get_vision_agent() -> VisionAgent:
-    """Factory function to create a VisionAgent instance."""
+    """Process-wide VisionAgent (and its Gemini client), created on first use."""
     return VisionAgent()
 
 
@@ -35,8 +230,9 @@ def vision_node(state: AgentState) -> Dict[str, Any]:
     - Normalizes objects for downstream constraint/solver
     """
     try:
-        cfg = VisionConfig()
-        provider = get_provider(cfg)
+        # Reuse the process-wide agent's config and provider (and its Gemini
+        # client) instead of rebuilding them on every graph step
+        provider = get_vision_agent()._provider
 
         image_base64 = state.get("image_base64", "")
         if not image_base64:
@@ -57,7 +253,7 @@ def vision_node(state: AgentState) -> Dict[str, Any]:
 
         return {
             "room_dimensions": room_dims,
-            "original_layout": objects,
+            "original_layout": tuple(objects),
             "current_layout": objects,
             "explanation": "Vision analysis complete (Gemini).",
             "error": None,
@@ -5,7 +5,11 @@ Environment variables and application configuration.
 Includes LangSmith tracing setup for agent observability.
 """
 
+import atexit
+import logging
+import logging.handlers
 import os
+import queue
 from pydantic_settings import BaseSettings
 from functools import lru_cache
 
@@ -80,6 +84,10 @@ def setup_langsmith() -> bool:
         os.environ["LANGCHAIN_API_KEY"] = settings.langchain_api_key
         os.environ["LANGCHAIN_PROJECT"] = settings.langchain_project
         os.environ["LANGCHAIN_ENDPOINT"] = settings.langchain_endpoint
+        # Upload traces from LangSmith's background thread instead of the
+        # request path; flush whatever is still queued on shutdown.
+        os.environ.setdefault("LANGCHAIN_CALLBACKS_BACKGROUND", "true")
+        atexit.register(_flush_langsmith)
         
         print(f"✅ LangSmith tracing enabled!")
         print(f"   Project: {settings.langchain_project}")
@@ -92,6 +100,39 @@ def setup_langsmith() -> bool:
         return False
 
 
+def setup_logging() -> None:
+    """
+    Route the `app.*` loggers through a QueueHandler so formatting and
+    stream I/O happen on a QueueListener thread, not the event loop.
+    Safe to call more than once.
+    """
+    app_logger = logging.getLogger("app")
+    if any(isinstance(h, logging.handlers.QueueHandler) for h in app_logger.handlers):
+        return
+
+    log_queue: queue.SimpleQueue = queue.SimpleQueue()
+    stream = logging.StreamHandler()
+    stream.setFormatter(logging.Formatter("%(asctime)s %(levelname)s [%(name)s] %(message)s"))
+    listener = logging.handlers.QueueListener(log_queue, stream, respect_handler_level=True)
+    listener.start()
+    atexit.register(listener.stop)
+
+    app_logger.addHandler(logging.handlers.QueueHandler(log_queue))
+    # LOG_LEVEL (e.g. WARNING) overrides the debug-based default
+    level = os.getenv("LOG_LEVEL") or ("DEBUG" if get_settings().debug else "INFO")
+    app_logger.setLevel(level.upper())
+    app_logger.propagate = False
+
+
+def _flush_langsmith() -> None:
+    """Send any traces still queued in the shared LangSmith client."""
+    try:
+        from langsmith.run_trees import get_cached_client
+        get_cached_client().flush()
+    except Exception as e:
+        print(f"⚠️  LangSmith flush failed: {e}")
+
+
 def get_langsmith_client():
     """
     Get a LangSmith client for manual tracing.
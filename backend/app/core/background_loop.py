@@ -0,0 +1,35 @@
+"""
+Background Event Loop
+
+A single long-lived asyncio loop running in a daemon thread. Sync LangGraph
+node wrappers submit their coroutines here instead of creating (and tearing
+down) a fresh loop or worker thread on every call.
+"""
+
+import asyncio
+import threading
+from typing import Any, Coroutine, Optional, TypeVar
+
+T = TypeVar("T")
+
+_loop: Optional[asyncio.AbstractEventLoop] = None
+_lock = threading.Lock()
+
+
+def get_background_loop() -> asyncio.AbstractEventLoop:
+    """Return the shared loop, starting its thread on first use."""
+    global _loop
+    with _lock:
+        if _loop is None:
+            _loop = asyncio.new_event_loop()
+            threading.Thread(
+                target=_loop.run_forever,
+                name="background-loop",
+                daemon=True,
+            ).start()
+        return _loop
+
+
+def run_sync(coro: Coroutine[Any, Any, T]) -> T:
+    """Run a coroutine on the background loop and block until it finishes."""
+    return asyncio.run_coroutine_threadsafe(coro, get_background_loop()).result()
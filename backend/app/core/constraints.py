@@ -6,17 +6,21 @@ Defines and checks hard/soft constraints for room layouts.
 - Soft constraints are preferences (e.g., desk near window)
 """
 
+from collections import defaultdict
 from dataclasses import dataclass
-from typing import List, Tuple, Optional
+from typing import Dict, List, Tuple, Optional
 from enum import Enum
 
+import numpy as np
+from shapely.geometry import Polygon
+from shapely.strtree import STRtree
+
 from app.models.room import RoomObject, ObjectType, ConstraintViolation
 from app.core.geometry import (
-    check_overlap,
-    calculate_clearance,
-    is_path_blocked,
     get_buffered_polygon,
-    object_to_polygon
+    object_to_polygon,
+    pairwise_clearance,
+    path_corridors
 )
 
 
@@ -93,9 +97,51 @@ SOFT_CONSTRAINTS = [
 
 # ============ Hard Constraint Checkers ============
 
+@dataclass
+class _LayoutIndex:
+    """
+    Everything the hard-constraint checkers share about one layout: the
+    door/bed/movable partition, one polygon per object and one STRtree
+    over all of them. Built once per check_all_hard_constraints call.
+    """
+    objects: List[RoomObject]
+    doors: List[RoomObject]
+    beds: List[RoomObject]
+    movable: np.ndarray  # bool mask aligned with objects
+    polygons: List[Polygon]
+    tree: STRtree
+
+    @classmethod
+    def build(cls, objects: List[RoomObject]) -> "_LayoutIndex":
+        doors, beds, movable = [], [], []
+        for obj in objects:
+            if obj.label == "door":
+                doors.append(obj)
+            elif obj.label == "bed":
+                beds.append(obj)
+            movable.append(obj.type is ObjectType.MOVABLE)
+        polygons = [object_to_polygon(obj) for obj in objects]
+        return cls(
+            objects=objects,
+            doors=doors,
+            beds=beds,
+            movable=np.array(movable, dtype=bool),
+            polygons=polygons,
+            tree=STRtree(polygons),
+        )
+
+    def hits(self, geometry, movable_only: bool = False) -> List[int]:
+        """Indices (in object order) of polygons intersecting geometry."""
+        idx = np.sort(self.tree.query(geometry, predicate="intersects"))
+        if movable_only:
+            idx = idx[self.movable[idx]]
+        return idx.tolist()
+
+
 def check_door_clearance(
     objects: List[RoomObject],
-    min_clearance: float = DOOR_CLEARANCE
+    min_clearance: float = DOOR_CLEARANCE,
+    index: Optional[_LayoutIndex] = None
 ) -> List[ConstraintViolation]:
     """
     Check that all doors have sufficient clearance for opening.
@@ -103,44 +149,54 @@ def check_door_clearance(
     Returns list of violations if any furniture blocks door swing area.
     """
     violations = []
+    index = index or _LayoutIndex.build(objects)
     
-    doors = [obj for obj in objects if obj.label == "door"]
-    movable_objects = [obj for obj in objects if obj.type == ObjectType.MOVABLE]
-    
-    for door in doors:
+    for door in index.doors:
         # Create buffer zone around door for swing clearance
         door_zone = get_buffered_polygon(door, min_clearance)
         
-        for obj in movable_objects:
-            obj_poly = object_to_polygon(obj)
-            if door_zone.intersects(obj_poly):
-                violations.append(ConstraintViolation(
-                    constraint_name="door_clearance",
-                    description=f"{obj.label} ({obj.id}) is blocking {door.id}. "
-                               f"Minimum clearance: {min_clearance} units",
-                    severity="error",
-                    objects_involved=[door.id, obj.id]
-                ))
+        for k in index.hits(door_zone, movable_only=True):
+            obj = objects[k]
+            violations.append(ConstraintViolation(
+                constraint_name="door_clearance",
+                description=f"{obj.label} ({obj.id}) is blocking {door.id}. "
+                           f"Minimum clearance: {min_clearance} units",
+                severity="error",
+                objects_involved=[door.id, obj.id]
+            ))
     
     return violations
 
 
-def check_no_overlap(objects: List[RoomObject]) -> List[ConstraintViolation]:
+def check_no_overlap(
+    objects: List[RoomObject],
+    index: Optional[_LayoutIndex] = None
+) -> List[ConstraintViolation]:
     """
     Check that no movable objects overlap each other.
+    
+    Candidate pairs come from an STRtree bulk query, so only objects whose
+    envelopes are near each other are tested instead of every pair.
     """
     violations = []
+    if len(objects) < 2:
+        return violations
+    index = index or _LayoutIndex.build(objects)
+    
+    pairs = index.tree.query(index.polygons, predicate="intersects")
+    pairs = pairs[:, pairs[0] < pairs[1]]
+    # Report in the same (i, j) order as a pairwise scan
+    order = np.lexsort((pairs[1], pairs[0]))
     
-    for i, obj_a in enumerate(objects):
-        for obj_b in objects[i + 1:]:
-            if check_overlap(obj_a, obj_b):
-                violations.append(ConstraintViolation(
-                    constraint_name="no_overlap",
-                    description=f"{obj_a.label} ({obj_a.id}) overlaps with "
-                               f"{obj_b.label} ({obj_b.id})",
-                    severity="error",
-                    objects_involved=[obj_a.id, obj_b.id]
-                ))
+    for i, j in pairs[:, order].T.tolist():
+        obj_a, obj_b = objects[i], objects[j]
+        violations.append(ConstraintViolation(
+            constraint_name="no_overlap",
+            description=f"{obj_a.label} ({obj_a.id}) overlaps with "
+                       f"{obj_b.label} ({obj_b.id})",
+            severity="error",
+            objects_involved=[obj_a.id, obj_b.id]
+        ))
     
     return violations
 
@@ -149,35 +205,42 @@ def check_walking_paths(
     objects: List[RoomObject],
     room_width: int,
     room_height: int,
-    min_path_width: float = WALKING_PATH_WIDTH
+    min_path_width: float = WALKING_PATH_WIDTH,
+    index: Optional[_LayoutIndex] = None
 ) -> List[ConstraintViolation]:
     """
     Check that there's a walkable path from door to key furniture.
     """
     violations = []
+    index = index or _LayoutIndex.build(objects)
+    pairs = [(door, bed) for door in index.doors for bed in index.beds]
+    if not pairs:
+        return violations
     
-    doors = [obj for obj in objects if obj.label == "door"]
-    beds = [obj for obj in objects if obj.label == "bed"]
-    movable_obstacles = [obj for obj in objects if obj.type == ObjectType.MOVABLE]
+    # All door->bed corridors are built and queried against the tree in one
+    # vectorized shapely call each, rather than per pair
+    corridors = path_corridors(
+        [door.center for door, _ in pairs],
+        [bed.center for _, bed in pairs],
+        min_path_width
+    )
+    pair_idx, obj_idx = index.tree.query(corridors, predicate="intersects")
+    keep = index.movable[obj_idx]
+    # First movable object (in layout order) inside each corridor, matching
+    # is_path_blocked's scan
+    first = np.full(len(pairs), len(objects))
+    np.minimum.at(first, pair_idx[keep], obj_idx[keep])
     
-    for door in doors:
-        for bed in beds:
-            blocked, blocker_id = is_path_blocked(
-                door.center, 
-                bed.center, 
-                movable_obstacles,
-                path_width=min_path_width
-            )
-            if blocked:
-                blocker = next((o for o in objects if o.id == blocker_id), None)
-                blocker_label = blocker.label if blocker else "unknown"
-                violations.append(ConstraintViolation(
-                    constraint_name="walking_path",
-                    description=f"Path from {door.id} to {bed.id} is blocked by "
-                               f"{blocker_label} ({blocker_id})",
-                    severity="error",
-                    objects_involved=[door.id, bed.id, blocker_id]
-                ))
+    for (door, bed), k in zip(pairs, first.tolist()):
+        if k < len(objects):
+            blocker = objects[k]
+            violations.append(ConstraintViolation(
+                constraint_name="walking_path",
+                description=f"Path from {door.id} to {bed.id} is blocked by "
+                           f"{blocker.label} ({blocker.id})",
+                severity="error",
+                objects_involved=[door.id, bed.id, blocker.id]
+            ))
     
     return violations
 
@@ -189,21 +252,34 @@ def check_all_hard_constraints(
 ) -> List[ConstraintViolation]:
     """
     Run all hard constraint checks and return combined violations.
+    
+    The layout is partitioned and indexed once, and all three checkers
+    query the same polygons and STRtree.
     """
     violations = []
+    index = _LayoutIndex.build(objects)
     
-    violations.extend(check_door_clearance(objects))
-    violations.extend(check_no_overlap(objects))
-    violations.extend(check_walking_paths(objects, room_width, room_height))
+    violations.extend(check_door_clearance(objects, index=index))
+    violations.extend(check_no_overlap(objects, index=index))
+    violations.extend(check_walking_paths(objects, room_width, room_height, index=index))
     
     return violations
 
 
 # ============ Soft Constraint Checkers ============
 
+def _group_by_label(objects: List[RoomObject]) -> Dict[str, List[RoomObject]]:
+    """Objects bucketed by label in one pass, shared by the soft checks."""
+    by_label: Dict[str, List[RoomObject]] = defaultdict(list)
+    for obj in objects:
+        by_label[obj.label].append(obj)
+    return by_label
+
+
 def check_desk_near_window(
     objects: List[RoomObject],
-    max_distance: float = WINDOW_PROXIMITY
+    max_distance: float = WINDOW_PROXIMITY,
+    by_label: Optional[Dict[str, List[RoomObject]]] = None
 ) -> Tuple[bool, float]:
     """
     Check if desk is positioned near a window.
@@ -211,18 +287,16 @@ def check_desk_near_window(
     Returns:
         (is_satisfied, score) where score is 0.0-1.0
     """
-    desks = [obj for obj in objects if obj.label == "desk"]
-    windows = [obj for obj in objects if obj.label == "window"]
+    if by_label is None:
+        by_label = _group_by_label(objects)
+    desks = by_label.get("desk")
+    windows = by_label.get("window")
     
     if not desks or not windows:
         return (True, 1.0)  # N/A, consider satisfied
     
     # Find minimum distance from any desk to any window
-    min_distance = float('inf')
-    for desk in desks:
-        for window in windows:
-            dist = calculate_clearance(desk, window)
-            min_distance = min(min_distance, dist)
+    min_distance = float(pairwise_clearance(desks, windows).min())
     
     if min_distance <= max_distance:
         # Score based on proximity (closer = better)
@@ -234,7 +308,8 @@ def check_desk_near_window(
 
 def check_bed_away_from_door(
     objects: List[RoomObject],
-    min_distance: float = 50.0
+    min_distance: float = 50.0,
+    by_label: Optional[Dict[str, List[RoomObject]]] = None
 ) -> Tuple[bool, float]:
     """
     Check if bed is positioned away from the door.
@@ -242,18 +317,17 @@ def check_bed_away_from_door(
     Returns:
         (is_satisfied, score) where score is 0.0-1.0
     """
-    beds = [obj for obj in objects if obj.label == "bed"]
-    doors = [obj for obj in objects if obj.label == "door"]
+    if by_label is None:
+        by_label = _group_by_label(objects)
+    beds = by_label.get("bed")
+    doors = by_label.get("door")
     
     if not beds or not doors:
         return (True, 1.0)
     
     # Check distance from each bed to nearest door
-    for bed in beds:
-        for door in doors:
-            dist = calculate_clearance(bed, door)
-            if dist < min_distance:
-                return (False, 0.4)
+    if (pairwise_clearance(beds, doors) < min_distance).any():
+        return (False, 0.4)
     
     return (True, 1.0)
 
@@ -270,9 +344,10 @@ def evaluate_soft_constraints(
     total_weight = 0.0
     weighted_score = 0.0
     suggestions = []
+    by_label = _group_by_label(objects)
     
     # Desk near window
-    satisfied, score = check_desk_near_window(objects)
+    satisfied, score = check_desk_near_window(objects, by_label=by_label)
     weight = 0.3
     weighted_score += score * weight
     total_weight += weight
@@ -280,7 +355,7 @@ def evaluate_soft_constraints(
         suggestions.append("Consider moving desk closer to the window for better lighting")
     
     # Bed away from door
-    satisfied, score = check_bed_away_from_door(objects)
+    satisfied, score = check_bed_away_from_door(objects, by_label=by_label)
     weight = 0.2
     weighted_score += score * weight
     total_weight += weight
@@ -0,0 +1,100 @@
+"""
+Disk Cache
+
+Small file-per-key cache for expensive Gemini results that should survive
+restarts. Entries expire by file mtime; writes go through a temp file and
+an atomic rename so readers never see a partial entry. Each put sweeps the
+directory: expired entries are deleted, then the oldest (by mtime) until
+the cache is back under its size and entry caps. Blocking I/O: call via
+asyncio.to_thread from async code.
+"""
+
+import logging
+import os
+import time
+from typing import Optional
+
+logger = logging.getLogger(__name__)
+
+
+class DiskCache:
+    """Bytes-valued cache stored as <directory>/<key><suffix>."""
+
+    def __init__(
+        self,
+        directory: str,
+        ttl_s: float,
+        suffix: str = ".bin",
+        max_bytes: Optional[int] = None,
+        max_entries: Optional[int] = None,
+    ):
+        self.directory = directory
+        self.ttl_s = ttl_s
+        self.suffix = suffix
+        self.max_bytes = max_bytes
+        self.max_entries = max_entries
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.directory, key + self.suffix)
+
+    def get(self, key: str) -> Optional[bytes]:
+        path = self._path(key)
+        try:
+            if time.time() - os.path.getmtime(path) > self.ttl_s:
+                os.remove(path)
+                return None
+            with open(path, "rb") as f:
+                return f.read()
+        except OSError:
+            return None
+
+    def put(self, key: str, data: bytes) -> None:
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+            tmp = self._path(key) + f".{os.getpid()}.tmp"
+            with open(tmp, "wb") as f:
+                f.write(data)
+            os.replace(tmp, self._path(key))
+        except OSError as e:
+            logger.warning("Failed to write %s: %s", key, e)
+            return
+        self._sweep()
+
+    def _sweep(self) -> None:
+        """Drop expired entries, then the oldest until under the caps."""
+        entries = []
+        now = time.time()
+        try:
+            with os.scandir(self.directory) as it:
+                for entry in it:
+                    if not entry.name.endswith(self.suffix):
+                        continue
+                    try:
+                        st = entry.stat()
+                    except OSError:
+                        continue
+                    if now - st.st_mtime > self.ttl_s:
+                        self._remove(entry.path)
+                    else:
+                        entries.append((st.st_mtime, st.st_size, entry.path))
+        except OSError as e:
+            logger.warning("Failed to sweep %s: %s", self.directory, e)
+            return
+
+        total = sum(size for _, size, _ in entries)
+        entries.sort()
+        evict = 0
+        while evict < len(entries) and (
+            (self.max_entries is not None and len(entries) - evict > self.max_entries)
+            or (self.max_bytes is not None and total > self.max_bytes)
+        ):
+            total -= entries[evict][1]
+            self._remove(entries[evict][2])
+            evict += 1
+
+    @staticmethod
+    def _remove(path: str) -> None:
+        try:
+            os.remove(path)
+        except OSError:
+            pass
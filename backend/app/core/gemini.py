@@ -0,0 +1,185 @@
+"""
+Gemini Call Helpers
+
+Shared wrapper around the async Gemini client:
+- One cached genai.Client per API key (keep-alive pool, HTTP/2 when h2 is installed)
+- Bounds concurrent requests with a semaphore (GEMINI_MAX_CONCURRENCY)
+- Retries rate-limit (429), timeout and server errors with capped exponential backoff
+- Streams responses for callers that want partial output early
+- Prefetches the next stage's model connection in the background
+"""
+
+import asyncio
+import atexit
+import logging
+import os
+import random
+import weakref
+from functools import lru_cache
+from typing import Any, Optional
+
+import httpx
+from google import genai
+from google.genai import errors, types
+
+from app.config import get_settings
+
+logger = logging.getLogger(__name__)
+
+GEMINI_MAX_CONCURRENCY = int(os.getenv("GEMINI_MAX_CONCURRENCY", "32"))
+GEMINI_MAX_RETRIES = 3
+GEMINI_BACKOFF_BASE_S = 1.0
+GEMINI_BACKOFF_MAX_S = 8.0
+GEMINI_KEEPALIVE_S = 60.0
+
+# HTTP/2 needs the optional h2 package (httpx[http2]); fall back to HTTP/1.1
+try:
+    import h2  # noqa: F401
+    HTTP2_ENABLED = True
+except ImportError:
+    HTTP2_ENABLED = False
+
+# asyncio primitives are bound to the loop they are first used on, so keep
+# one semaphore per running loop (the app loop and sync-wrapper loops).
+_semaphores: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, asyncio.Semaphore]" = (
+    weakref.WeakKeyDictionary()
+)
+
+
+@lru_cache(maxsize=4)
+def get_genai_client(api_key: Optional[str] = None) -> genai.Client:
+    """
+    Process-wide Gemini client per API key, so agents share one HTTP
+    connection pool instead of each opening their own. Closed at exit.
+    """
+    # One keep-alive pool sized to the concurrency limit; with HTTP/2 the
+    # concurrent requests multiplex over a single TLS connection.
+    pool = {
+        "http2": HTTP2_ENABLED,
+        "limits": httpx.Limits(
+            max_connections=GEMINI_MAX_CONCURRENCY,
+            max_keepalive_connections=GEMINI_MAX_CONCURRENCY,
+            keepalive_expiry=GEMINI_KEEPALIVE_S,
+        ),
+    }
+    client = genai.Client(
+        api_key=api_key or get_settings().google_api_key,
+        http_options=types.HttpOptions(client_args=pool, async_client_args=pool),
+    )
+    atexit.register(client.close)
+    return client
+
+
+def _get_semaphore() -> asyncio.Semaphore:
+    loop = asyncio.get_running_loop()
+    sem = _semaphores.get(loop)
+    if sem is None:
+        sem = _semaphores[loop] = asyncio.Semaphore(GEMINI_MAX_CONCURRENCY)
+    return sem
+
+
+# Network-level failures (timeouts, dropped connections) are as transient as 5xx
+_TRANSIENT_ERRORS = (errors.APIError, httpx.TransportError)
+
+
+def _is_retryable(exc: Exception) -> bool:
+    if isinstance(exc, (errors.ServerError, httpx.TransportError)):
+        return True
+    return isinstance(exc, errors.APIError) and exc.code in (408, 429)
+
+
+def _backoff_delay(attempt: int) -> float:
+    return min(GEMINI_BACKOFF_BASE_S * (2 ** attempt), GEMINI_BACKOFF_MAX_S) * (0.5 + random.random())
+
+
+def _describe(exc: Exception) -> str:
+    return str(exc.code) if isinstance(exc, errors.APIError) else type(exc).__name__
+
+
+async def generate_content(client, *, model: str, contents: Any, config: Any = None):
+    """
+    Call client.aio.models.generate_content under the shared concurrency
+    limit, retrying 429/5xx responses with jittered exponential backoff.
+    """
+    for attempt in range(GEMINI_MAX_RETRIES + 1):
+        try:
+            async with _get_semaphore():
+                return await client.aio.models.generate_content(
+                    model=model,
+                    contents=contents,
+                    config=config,
+                )
+        except _TRANSIENT_ERRORS as e:
+            if attempt == GEMINI_MAX_RETRIES or not _is_retryable(e):
+                raise
+            delay = _backoff_delay(attempt)
+            logger.warning("%s from %s, retrying in %.1fs", _describe(e), model, delay)
+            await asyncio.sleep(delay)
+
+
+async def generate_content_stream(client, *, model: str, contents: Any, config: Any = None):
+    """
+    Streaming counterpart of generate_content. Yields response chunks while
+    holding a concurrency slot; only opening the stream is retried, and the
+    slot is given back while backing off.
+    """
+    sem = _get_semaphore()
+    for attempt in range(GEMINI_MAX_RETRIES + 1):
+        await sem.acquire()
+        try:
+            stream = await client.aio.models.generate_content_stream(
+                model=model,
+                contents=contents,
+                config=config,
+            )
+            break
+        except _TRANSIENT_ERRORS as e:
+            sem.release()
+            if attempt == GEMINI_MAX_RETRIES or not _is_retryable(e):
+                raise
+            delay = _backoff_delay(attempt)
+            logger.warning("%s from %s, retrying in %.1fs", _describe(e), model, delay)
+            await asyncio.sleep(delay)
+        except BaseException:
+            sem.release()
+            raise
+    try:
+        async for chunk in stream:
+            yield chunk
+    finally:
+        sem.release()
+
+
+# ============================================================================
+# PREFETCH — warm the next stage's model while the current stage runs
+# ============================================================================
+_WARM_INTERVAL_S = 60.0
+_last_warmed: dict = {}
+_warm_tasks: set = set()
+
+
+async def _warm_model(model: str, client) -> None:
+    try:
+        await (client or get_genai_client()).aio.models.get(model=model)
+    except Exception as e:
+        logger.warning("Warm-up for %s failed: %s", model, e)
+
+
+def prefetch_model(model: str, client=None) -> None:
+    """
+    Fire-and-forget metadata lookup for `model` on the shared client (or
+    the given one), so the TLS connection is open before the next graph
+    node needs it. No-op outside an event loop or if warmed within the
+    last minute.
+    """
+    try:
+        loop = asyncio.get_running_loop()
+    except RuntimeError:
+        return
+    now = loop.time()
+    if now - _last_warmed.get(model, float("-inf")) < _WARM_INTERVAL_S:
+        return
+    _last_warmed[model] = now
+    task = loop.create_task(_warm_model(model, client))
+    _warm_tasks.add(task)
+    task.add_done_callback(_warm_tasks.discard)
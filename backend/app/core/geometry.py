@@ -8,11 +8,15 @@ Shapely-based functions for spatial operations:
 - Path blocking detection
 """
 
-from typing import List, Tuple, Optional
+from functools import lru_cache
+from typing import List, Sequence, Tuple, Optional
+
+import numpy as np
+import shapely
 from shapely.geometry import Polygon, box, LineString, Point
 from shapely.ops import nearest_points
 
-from app.models.room import RoomObject
+from app.models.room import RoomObject, ObjectType
 
 
 def bbox_to_polygon(bbox: List[int]) -> Polygon:
@@ -34,9 +38,25 @@ def bbox_to_polygon(bbox: List[int]) -> Polygon:
     return box(x, y, x + w, y + h)
 
 
+# Shapely geometries are immutable, so polygons can be shared between calls.
+# Keyed on the bbox alone: objects that did not move between solver
+# iterations or constraint passes reuse the same polygon.
+POLYGON_CACHE_SIZE = 4096
+
+
+@lru_cache(maxsize=POLYGON_CACHE_SIZE)
+def _box_polygon(bbox: Tuple[int, int, int, int]) -> Polygon:
+    return bbox_to_polygon(bbox)
+
+
+@lru_cache(maxsize=POLYGON_CACHE_SIZE)
+def _buffered_box_polygon(bbox: Tuple[int, int, int, int], buffer_distance: float) -> Polygon:
+    return _box_polygon(bbox).buffer(buffer_distance)
+
+
 def object_to_polygon(obj: RoomObject) -> Polygon:
-    """Convert a RoomObject to a Shapely Polygon."""
-    return bbox_to_polygon(obj.bbox)
+    """Convert a RoomObject to a Shapely Polygon (memoized on its bbox)."""
+    return _box_polygon(tuple(obj.bbox))
 
 
 def check_overlap(obj_a: RoomObject, obj_b: RoomObject) -> bool:
@@ -96,6 +116,44 @@ def calculate_clearance(obj_a: RoomObject, obj_b: RoomObject) -> float:
     return poly_a.distance(poly_b)
 
 
+def pairwise_clearance(
+    objects_a: List[RoomObject],
+    objects_b: List[RoomObject]
+) -> np.ndarray:
+    """
+    Matrix of calculate_clearance(a, b) for every pair, computed with NumPy
+    broadcasting. Objects are axis-aligned boxes, so the polygon distance
+    is the hypotenuse of the horizontal and vertical gaps (0 if they touch
+    or overlap).
+    
+    Returns:
+        Array of shape (len(objects_a), len(objects_b))
+    """
+    a = np.asarray([o.bbox for o in objects_a], dtype=np.float64).reshape(-1, 4)
+    b = np.asarray([o.bbox for o in objects_b], dtype=np.float64).reshape(-1, 4)
+    ax1, ay1 = a[:, 0:1], a[:, 1:2]
+    ax2, ay2 = ax1 + a[:, 2:3], ay1 + a[:, 3:4]
+    bx1, by1 = b[:, 0], b[:, 1]
+    bx2, by2 = bx1 + b[:, 2], by1 + b[:, 3]
+    dx = np.maximum(0.0, np.maximum(ax1 - bx2, bx1 - ax2))
+    dy = np.maximum(0.0, np.maximum(ay1 - by2, by1 - ay2))
+    return np.hypot(dx, dy)
+
+
+def pairwise_overlap_area(objects: List[RoomObject]) -> np.ndarray:
+    """
+    Symmetric (N, N) matrix of calculate_overlap_area for every pair of
+    objects (axis-aligned boxes), via NumPy broadcasting. The diagonal is
+    each object's own area.
+    """
+    b = np.asarray([o.bbox for o in objects], dtype=np.float64).reshape(-1, 4)
+    x1, y1 = b[:, 0], b[:, 1]
+    x2, y2 = x1 + b[:, 2], y1 + b[:, 3]
+    ix = np.minimum(x2[:, None], x2[None, :]) - np.maximum(x1[:, None], x1[None, :])
+    iy = np.minimum(y2[:, None], y2[None, :]) - np.maximum(y1[:, None], y1[None, :])
+    return np.clip(ix, 0.0, None) * np.clip(iy, 0.0, None)
+
+
 def get_buffered_polygon(obj: RoomObject, buffer_distance: float) -> Polygon:
     """
     Create a polygon with a buffer zone around the object.
@@ -109,8 +167,28 @@ def get_buffered_polygon(obj: RoomObject, buffer_distance: float) -> Polygon:
     Returns:
         Buffered Shapely Polygon
     """
-    poly = object_to_polygon(obj)
-    return poly.buffer(buffer_distance)
+    return _buffered_box_polygon(tuple(obj.bbox), buffer_distance)
+
+
+def path_corridor(
+    start: Tuple[int, int],
+    end: Tuple[int, int],
+    path_width: float = 45.0
+) -> Polygon:
+    """Walking corridor of the given width along the straight line start -> end."""
+    # Create a line representing the walking path, buffered to the walking width
+    return LineString([start, end]).buffer(path_width / 2)
+
+
+def path_corridors(
+    starts: Sequence[Tuple[int, int]],
+    ends: Sequence[Tuple[int, int]],
+    path_width: float = 45.0
+) -> np.ndarray:
+    """Array of path_corridor polygons for paired starts/ends, built in one call."""
+    lines = shapely.linestrings(np.stack([starts, ends], axis=1).astype(float))
+    # quad_segs=16 matches the BaseGeometry.buffer default used by path_corridor
+    return shapely.buffer(lines, path_width / 2, quad_segs=16)
 
 
 def is_path_blocked(
@@ -137,19 +215,15 @@ def is_path_blocked(
         >>> obstacles = [desk_obj, chair_obj]
         >>> blocked, blocker = is_path_blocked(door_center, bed_center, obstacles)
     """
-    # Create a line representing the walking path
-    path_line = LineString([start, end])
-    
-    # Buffer the path to account for required walking width
-    path_corridor = path_line.buffer(path_width / 2)
+    corridor = path_corridor(start, end, path_width)
     
     for obj in obstacles:
         # Skip structural elements that are doorways
-        if obj.type.value == "structural" and obj.label == "door":
+        if obj.type is ObjectType.STRUCTURAL and obj.label == "door":
             continue
             
         poly = object_to_polygon(obj)
-        if path_corridor.intersects(poly):
+        if corridor.intersects(poly):
             return (True, obj.id)
     
     return (False, None)
@@ -165,13 +239,13 @@ def find_collisions(objects: List[RoomObject]) -> List[Tuple[str, str, float]]:
     Returns:
         List of tuples: (obj_a_id, obj_b_id, overlap_area)
     """
-    collisions = []
-    for i, obj_a in enumerate(objects):
-        for obj_b in objects[i + 1:]:
-            overlap = calculate_overlap_area(obj_a, obj_b)
-            if overlap > 0:
-                collisions.append((obj_a.id, obj_b.id, overlap))
-    return collisions
+    overlap = pairwise_overlap_area(objects)
+    # Upper triangle, row-major: same (i, j) order as a pairwise scan
+    ii, jj = np.nonzero(np.triu(overlap, k=1) > 0)
+    return [
+        (objects[i].id, objects[j].id, float(overlap[i, j]))
+        for i, j in zip(ii.tolist(), jj.tolist())
+    ]
 
 
 def check_room_bounds(
@@ -205,12 +279,12 @@ def get_free_space(
         Polygon representing available floor space
     """
     room = box(0, 0, room_width, room_height)
+    if not objects:
+        return room
     
-    for obj in objects:
-        poly = object_to_polygon(obj)
-        room = room.difference(poly)
-    
-    return room
+    # One difference against the union instead of one per object
+    occupied = shapely.union_all([object_to_polygon(obj) for obj in objects])
+    return room.difference(occupied)
 
 
 def calculate_furniture_density(
@@ -0,0 +1,257 @@
+"""
+Image Helpers
+
+Shared helpers for image payloads on the Gemini paths:
+- Base64 encode/decode via pybase64 (SIMD) when installed, binascii otherwise
+- Data-URL prefix stripping that only scans the header
+- MIME sniffing from magic bytes
+- Downscale + WebP re-encode before inline upload to Gemini
+- Perceptual (difference) hash + thumbnail check for near-duplicate image lookups
+- Upload size limits checked before any full decode
+"""
+
+import binascii
+import io
+import logging
+import os
+import re
+from typing import Optional, Tuple, Union
+
+import numpy as np
+from PIL import Image
+
+from app.core.exceptions import InvalidImageError
+
+try:
+    import pybase64 as _b64
+    PYBASE64_ENABLED = True
+except ImportError:
+    import base64 as _b64
+    PYBASE64_ENABLED = False
+
+logger = logging.getLogger(__name__)
+
+
+def b64decode(data: str) -> bytes:
+    """Decode base64 without strict validation (input comes from our own API)."""
+    if PYBASE64_ENABLED:
+        return _b64.b64decode(data, validate=False)
+    # binascii reads an ASCII str in place; base64.b64decode would first
+    # copy the whole string into a bytes object
+    return binascii.a2b_base64(data)
+
+
+def b64encode_str(data: bytes) -> str:
+    """Encode bytes to a base64 str for JSON responses."""
+    if PYBASE64_ENABLED:
+        return _b64.b64encode_as_string(data)
+    # Base64 output is pure ASCII; skip base64.b64encode's wrapper and the utf-8 codec
+    return binascii.b2a_base64(data, newline=False).decode("ascii")
+
+
+# A data URL header ("data:image/png;base64,") is short; never scan the payload
+_DATA_URL_HEADER_MAX = 128
+
+
+def split_data_url(data: str) -> Tuple[Optional[str], str]:
+    """
+    Split "data:<mime>;base64,<payload>" into (mime, payload). Plain base64
+    returns (None, data). Only the header region is searched for the comma.
+    """
+    idx = data.find(",", 0, _DATA_URL_HEADER_MAX)
+    if idx < 0:
+        return None, data
+    mime = data[5:idx].split(";", 1)[0] if data.startswith("data:") else None
+    return mime or None, data[idx + 1:]
+
+
+def strip_data_url(data: str) -> str:
+    """Return just the base64 payload of a plain or data-URL string."""
+    return split_data_url(data)[1]
+
+
+# Leading magic bytes of the formats we accept
+_MAGIC_MIME = (
+    (b"\xff\xd8\xff", "image/jpeg"),
+    (b"\x89PNG\r\n\x1a\n", "image/png"),
+    (b"GIF8", "image/gif"),
+)
+
+
+def sniff_mime(data: bytes, default: str = "image/jpeg") -> str:
+    """Image MIME type from the first bytes of `data`, or `default` if unknown."""
+    for magic, mime in _MAGIC_MIME:
+        if data.startswith(magic):
+            return mime
+    if data[:4] == b"RIFF" and data[8:12] == b"WEBP":
+        return "image/webp"
+    return default
+
+
+MODEL_IMAGE_MAX_SIDE = 1024
+MODEL_IMAGE_WEBP_QUALITY = 90
+
+
+def prepare_for_model(data: bytes, mime: str, max_side: int = MODEL_IMAGE_MAX_SIDE) -> Tuple[bytes, str]:
+    """
+    Shrink an inline image before sending it to Gemini: fit within
+    max_side x max_side and re-encode as WebP. Returns the original
+    bytes/mime if decoding fails or the result would not be smaller.
+    CPU-bound; call via asyncio.to_thread from async code.
+    """
+    try:
+        with Image.open(io.BytesIO(data)) as img:
+            # JPEG: let libjpeg scale down while decoding instead of
+            # rasterizing the full-resolution image first
+            img.draft("RGB", (max_side, max_side))
+            if max(img.size) > max_side:
+                img.thumbnail((max_side, max_side), Image.LANCZOS)
+            if img.mode not in ("RGB", "RGBA"):
+                img = img.convert("RGBA" if "A" in img.getbands() else "RGB")
+            buf = io.BytesIO()
+            img.save(buf, "WEBP", quality=MODEL_IMAGE_WEBP_QUALITY, method=4)
+    except Exception as e:
+        logger.warning("Could not re-encode image, sending original: %s", e)
+        return data, mime
+
+    out = buf.getvalue()
+    if len(out) >= len(data):
+        return data, mime
+    return out, "image/webp"
+
+
+def dhash(data: bytes, hash_size: int = 8) -> Optional[Tuple[int, Tuple[int, int]]]:
+    """
+    Difference hash of an encoded image: a 64-bit int (for hash_size=8)
+    whose Hamming distance to another image's hash is small when the two
+    look alike (rescales, recompression, light crops). Returns
+    (hash, (width, height)) or None if the image cannot be decoded.
+    CPU-bound; call via asyncio.to_thread from async code.
+    """
+    result = dhash_with_thumbnail(data, hash_size)
+    return result[:2] if result else None
+
+
+def dhash_with_thumbnail(
+    data: bytes, hash_size: int = 8, thumb_side: int = 32
+) -> Optional[Tuple[int, Tuple[int, int], bytes]]:
+    """
+    dhash plus a thumb_side x thumb_side grayscale thumbnail from the same
+    decode. The hash is too coarse to tell small edits apart (a moved desk
+    can flip only a couple of bits), so near-duplicate matches confirm with
+    thumbnails_match. Returns (hash, (width, height), thumbnail) or None.
+    CPU-bound; call via asyncio.to_thread from async code.
+    """
+    try:
+        with Image.open(io.BytesIO(data)) as img:
+            size = img.size
+            # JPEG can decode straight to a small grayscale draft
+            side = max(hash_size, thumb_side) * 4
+            img.draft("L", (side, side))
+            gray = img.convert("L")
+            small = gray.resize((hash_size + 1, hash_size), Image.BILINEAR)
+            thumb = gray.resize((thumb_side, thumb_side), Image.BILINEAR).tobytes()
+    except Exception:
+        return None
+
+    px = small.tobytes()
+    bits = 0
+    for row in range(hash_size):
+        base = row * (hash_size + 1)
+        for col in range(hash_size):
+            bits = (bits << 1) | (px[base + col] > px[base + col + 1])
+    return bits, size, thumb
+
+
+# Rescaling/recompression moves thumbnail pixels by a few levels; an object
+# that moved or changed flips some of them by far more
+THUMBNAIL_MAX_PIXEL_DIFF = 24
+
+
+def thumbnails_match(a: bytes, b: bytes, max_diff: int = THUMBNAIL_MAX_PIXEL_DIFF) -> bool:
+    """True if two equal-size grayscale thumbnails differ by at most max_diff at every pixel."""
+    if len(a) != len(b):
+        return False
+    diff = np.abs(np.frombuffer(a, dtype=np.uint8).astype(np.int16) - np.frombuffer(b, dtype=np.uint8))
+    return int(diff.max(initial=0)) <= max_diff
+
+
+def image_size(data: bytes) -> Optional[Tuple[int, int]]:
+    """(width, height) from the image header without decoding pixels."""
+    try:
+        with Image.open(io.BytesIO(data)) as img:
+            return img.size
+    except Exception:
+        return None
+
+
+# Uploads are user-supplied: bound them before decoding to keep memory flat
+MAX_UPLOAD_BYTES = int(os.getenv("MAX_UPLOAD_MB", "15")) * 1024 * 1024
+MAX_UPLOAD_PIXELS = 50_000_000
+
+
+def check_upload_size(size: int) -> None:
+    """Raise InvalidImageError if an upload of `size` bytes is over the limit."""
+    if size > MAX_UPLOAD_BYTES:
+        raise InvalidImageError(
+            f"Image is {size / 1048576:.1f} MB; the limit is {MAX_UPLOAD_BYTES // 1048576} MB"
+        )
+
+
+def check_upload_base64(image_base64: str) -> None:
+    """check_upload_size from the base64 length alone, without decoding it."""
+    check_upload_size(len(strip_data_url(image_base64)) // 4 * 3)
+
+
+def check_upload_pixels(data: bytes) -> None:
+    """
+    Raise InvalidImageError if the image header declares more than
+    MAX_UPLOAD_PIXELS; a small compressed file can still decode huge.
+    """
+    size = image_size(data)
+    if size and size[0] * size[1] > MAX_UPLOAD_PIXELS:
+        raise InvalidImageError(f"Image is {size[0]}x{size[1]} pixels; too large to process")
+
+
+def check_upload_input(image: Union[str, bytes]) -> None:
+    """check_upload_size for an upload given as base64/data-URL str or raw bytes."""
+    if isinstance(image, str):
+        check_upload_base64(image)
+    else:
+        check_upload_size(len(image))
+
+
+# Base64 alphabet (standard and URL-safe) plus padding and line breaks
+_B64_EDGE_RE = re.compile(r"[A-Za-z0-9+/=_\-\r\n]*")
+_B64_EDGE_CHARS = 16
+
+
+def looks_like_base64(data: str) -> bool:
+    """
+    Cheap sanity check before a full decode: non-empty and only base64
+    characters at both ends. Catches JSON, text or URLs sent as the image
+    without scanning the payload; the decode itself stays lenient.
+    """
+    return bool(data) and bool(
+        _B64_EDGE_RE.fullmatch(data, 0, _B64_EDGE_CHARS)
+        and _B64_EDGE_RE.fullmatch(data, max(0, len(data) - _B64_EDGE_CHARS))
+    )
+
+
+def decode_upload(image: Union[str, bytes]) -> bytes:
+    """
+    Raw bytes of an upload given as base64/data-URL str or as raw bytes
+    (passed through without a base64 round trip), with the size and pixel
+    limits enforced. CPU-bound for large str inputs.
+    """
+    if isinstance(image, str):
+        b64 = strip_data_url(image)
+        check_upload_base64(b64)
+        if not looks_like_base64(b64):
+            raise InvalidImageError("Image data is not valid base64")
+        data = b64decode(b64)
+    else:
+        data = bytes(image)
+        check_upload_size(len(data))
+    check_upload_pixels(data)
+    return data
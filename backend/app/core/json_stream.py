@@ -0,0 +1,79 @@
+"""
+Streaming JSON Helpers
+
+Incremental scanner for streamed Gemini JSON responses of the form
+{..., "<key>": [{...}, {...}], ...}: each array element is returned as
+soon as its closing brace arrives, so callers can start work on early
+items while the rest of the response is still streaming.
+"""
+
+import re
+from typing import Any, Dict, List
+
+import orjson
+
+
+class JsonArrayStreamParser:
+    """
+    Incremental scanner over a streamed {"<key>": [...]} response. feed()
+    returns every object in the array that completed in the new text;
+    text holds everything fed so far.
+    """
+
+    def __init__(self, key: str):
+        # The key only counts when its value is the array; a bare find() for
+        # "[" after the key could land on some other array further along
+        self._key_re = re.compile(re.escape(f'"{key}"') + r"\s*:\s*\[")
+        self._buf = ""
+        self._pos = 0
+        self._in_array = False
+        self._depth = 0
+        self._in_string = False
+        self._escape = False
+        self._start = -1
+        self._closed = False
+
+    @property
+    def text(self) -> str:
+        return self._buf
+
+    def feed(self, text: str) -> List[Dict[str, Any]]:
+        self._buf += text
+        if self._closed:
+            return []
+        if not self._in_array:
+            match = self._key_re.search(self._buf)
+            if match is None:
+                return []
+            self._in_array = True
+            self._pos = match.end()
+
+        done = []
+        buf = self._buf
+        for i in range(self._pos, len(buf)):
+            ch = buf[i]
+            if self._in_string:
+                if self._escape:
+                    self._escape = False
+                elif ch == "\\":
+                    self._escape = True
+                elif ch == '"':
+                    self._in_string = False
+            elif ch == '"':
+                self._in_string = True
+            elif ch == "]" and self._depth == 0:
+                self._closed = True
+                break
+            elif ch == "{":
+                if self._depth == 0:
+                    self._start = i
+                self._depth += 1
+            elif ch == "}":
+                self._depth -= 1
+                if self._depth == 0:
+                    try:
+                        done.append(orjson.loads(buf[self._start:i + 1]))
+                    except orjson.JSONDecodeError:
+                        pass
+        self._pos = len(buf)
+        return done
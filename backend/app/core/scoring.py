@@ -8,14 +8,17 @@ Calculates a 0-100 score for room layouts based on:
 - Space efficiency
 """
 
-from typing import List, Tuple
+from typing import List, Optional, Tuple
 from dataclasses import dataclass
+from functools import lru_cache
 
-from app.models.room import RoomObject, LayoutScore
+import numpy as np
+
+from app.models.room import RoomObject, ObjectType, LayoutScore
 from app.core.geometry import (
     calculate_furniture_density,
     get_free_space,
-    find_collisions
+    pairwise_overlap_area
 )
 from app.core.constraints import (
     check_all_hard_constraints,
@@ -42,6 +45,33 @@ class ScoreBreakdown:
     suggestions: List[str]
 
 
+@dataclass
+class LayoutFeatures:
+    """
+    Geometry shared by the score components, derived once per layout so
+    score_layout doesn't re-walk boxes and object pairs for each one.
+    """
+    room_area: float
+    furniture_area: float   # Sum of object footprints (overlaps counted twice)
+    free_area: float        # Room area not covered by any object
+    collision_count: int    # Object pairs with positive overlap area
+
+    @classmethod
+    def build(
+        cls,
+        objects: List[RoomObject],
+        room_width: int,
+        room_height: int
+    ) -> "LayoutFeatures":
+        overlap = pairwise_overlap_area(objects)
+        return cls(
+            room_area=float(room_width * room_height),
+            furniture_area=float(np.trace(overlap)),
+            free_area=get_free_space(room_width, room_height, objects).area,
+            collision_count=int(np.count_nonzero(np.triu(overlap, k=1) > 0)),
+        )
+
+
 def calculate_constraint_score(
     objects: List[RoomObject],
     room_width: int,
@@ -69,7 +99,8 @@ def calculate_constraint_score(
 def calculate_walkability_score(
     objects: List[RoomObject],
     room_width: int,
-    room_height: int
+    room_height: int,
+    features: Optional[LayoutFeatures] = None
 ) -> float:
     """
     Calculate score based on available walking space.
@@ -78,14 +109,13 @@ def calculate_walkability_score(
     - At least 30% of room as free space
     - Clear paths between door and key furniture
     """
-    # Get free space ratio
-    free_space = get_free_space(room_width, room_height, objects)
-    room_area = room_width * room_height
+    features = features or LayoutFeatures.build(objects, room_width, room_height)
     
-    if room_area == 0:
+    # Get free space ratio
+    if features.room_area == 0:
         return 0.0
     
-    free_ratio = free_space.area / room_area
+    free_ratio = features.free_area / features.room_area
     
     # Ideal: 30-50% free space
     if free_ratio >= 0.30:
@@ -98,9 +128,8 @@ def calculate_walkability_score(
         space_score = 20.0
     
     # Check for collisions (reduces walkability)
-    collisions = find_collisions(objects)
-    if collisions:
-        space_score -= len(collisions) * 15.0
+    if features.collision_count:
+        space_score -= features.collision_count * 15.0
     
     return max(0.0, space_score)
 
@@ -108,7 +137,8 @@ def calculate_walkability_score(
 def calculate_efficiency_score(
     objects: List[RoomObject],
     room_width: int,
-    room_height: int
+    room_height: int,
+    features: Optional[LayoutFeatures] = None
 ) -> float:
     """
     Calculate score based on space usage efficiency.
@@ -117,7 +147,12 @@ def calculate_efficiency_score(
     - Too much empty space (underutilized)
     - Too cluttered (overutilized)
     """
-    density = calculate_furniture_density(room_width, room_height, objects)
+    if features is None:
+        density = calculate_furniture_density(room_width, room_height, objects)
+    elif features.room_area == 0:
+        density = 0.0
+    else:
+        density = features.furniture_area / features.room_area * 100
     
     # Ideal density: 40-60%
     if 40 <= density <= 60:
@@ -130,6 +165,16 @@ def calculate_efficiency_score(
         return 40.0
 
 
+# Everything score_layout reads from an object
+_Fingerprint = Tuple[Tuple[str, str, ObjectType, Tuple[int, ...]], ...]
+
+SCORE_CACHE_SIZE = 1024
+
+
+def _layout_fingerprint(objects: List[RoomObject]) -> _Fingerprint:
+    return tuple((obj.id, obj.label, obj.type, tuple(obj.bbox)) for obj in objects)
+
+
 def score_layout(
     objects: List[RoomObject],
     room_width: int,
@@ -138,6 +183,9 @@ def score_layout(
     """
     Calculate overall layout score with breakdown.
     
+    Results are memoized on the layout's (id, label, type, bbox) tuple and
+    the room size, so re-scoring an unchanged layout is a dict lookup.
+    
     Args:
         objects: All room objects
         room_width: Room width in units
@@ -146,19 +194,45 @@ def score_layout(
     Returns:
         LayoutScore with total and component scores
     """
+    fingerprint = _layout_fingerprint(objects)
+    # Copy so callers can't mutate the cached result
+    return _score_layout_cached(fingerprint, room_width, room_height).model_copy()
+
+
+@lru_cache(maxsize=SCORE_CACHE_SIZE)
+def _score_layout_cached(
+    fingerprint: _Fingerprint,
+    room_width: int,
+    room_height: int
+) -> LayoutScore:
+    objects = [
+        RoomObject(id=obj_id, label=label, type=obj_type, bbox=list(bbox))
+        for obj_id, label, obj_type, bbox in fingerprint
+    ]
+    return _score_layout(objects, room_width, room_height)
+
+
+def _score_layout(
+    objects: List[RoomObject],
+    room_width: int,
+    room_height: int
+) -> LayoutScore:
+    # Shared geometry for the walkability and efficiency components
+    features = LayoutFeatures.build(objects, room_width, room_height)
+    
     # Calculate individual scores
     constraint_score, violations = calculate_constraint_score(
         objects, room_width, room_height
     )
     
     walkability_score = calculate_walkability_score(
-        objects, room_width, room_height
+        objects, room_width, room_height, features=features
     )
     
     preference_score, suggestions = evaluate_soft_constraints(objects)
     
     efficiency_score = calculate_efficiency_score(
-        objects, room_width, room_height
+        objects, room_width, room_height, features=features
     )
     
     # Calculate weighted total
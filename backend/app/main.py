@@ -10,13 +10,17 @@ Features:
 - LangSmith tracing for observability
 """
 
+from contextlib import asynccontextmanager
+
 from fastapi import FastAPI, Request
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.responses import JSONResponse
 
-from app.config import get_settings, setup_langsmith
+from app.config import get_settings, setup_langsmith, setup_logging
 from app.models.api import HealthResponse, ErrorResponse
 from app.routes import analyze, optimize, chat, render, shop
+from app.agents.vision_node import get_vision_agent
+from app.tools.serp_search import close_http_client
 from app.core.exceptions import (
     PocketPlannerError,
     VisionExtractionError,
@@ -29,11 +33,29 @@ from app.core.exceptions import (
 # Get settings
 settings = get_settings()
 
+# Setup logging (queued, off the event loop)
+setup_logging()
+
 # Setup LangSmith tracing
 langsmith_enabled = setup_langsmith()
 
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Create the vision agent and open its Gemini connection at startup, so
+    # the first /analyze request doesn't pay client setup and TLS handshake
+    try:
+        get_vision_agent().warm_up()
+    except Exception as e:
+        print(f"[Startup] Vision warm-up skipped: {e}")
+    yield
+    # Release pooled outbound HTTP connections
+    await close_http_client()
+
+
 # Create FastAPI app
 app = FastAPI(
+    lifespan=lifespan,
     title=settings.app_name,
     version=settings.app_version,
     description="""
@@ -128,6 +150,34 @@ async def pocket_planner_error_handler(request: Request, exc: PocketPlannerError
     )
 
 
+def _cors_headers(request: Request) -> dict:
+    """
+    CORS headers CORSMiddleware would have added for this request's origin.
+    The Exception handler runs in ServerErrorMiddleware, outside CORSMiddleware,
+    so without these a cross-origin caller sees an opaque failure.
+    """
+    origin = request.headers.get("origin")
+    allowed = settings.cors_origins_list
+    if origin is None or ("*" not in allowed and origin not in allowed):
+        return {}
+    if "*" in allowed and "cookie" not in request.headers:
+        headers = {"Access-Control-Allow-Origin": "*"}
+    else:
+        headers = {"Access-Control-Allow-Origin": origin, "Vary": "Origin"}
+    headers["Access-Control-Allow-Credentials"] = "true"
+    return headers
+
+
+@app.exception_handler(Exception)
+async def unhandled_error_handler(request: Request, exc: Exception):
+    """Handle anything the routes let through, so they need no try/except of their own."""
+    return JSONResponse(
+        status_code=500,
+        content={"detail": f"{request.url.path} failed: {exc}"},
+        headers=_cors_headers(request),
+    )
+
+
 # ============ Health Check ============
 
 @app.get("/", response_model=HealthResponse, tags=["Health"])
@@ -10,7 +10,7 @@ UPGRADED for generative design workflow:
 - edit_command: Chat-based editing commands
 """
 
-from typing import TypedDict, List, Optional, Annotated, Dict, Any
+from typing import TypedDict, List, Optional, Annotated, Dict, Any, Sequence
 import operator
 
 from app.models.room import RoomObject, RoomDimensions, ConstraintViolation, LayoutScore
@@ -29,7 +29,7 @@ class AgentState(TypedDict):
     room_dimensions: RoomDimensions             # Room size
     
     # === Layout State ===
-    original_layout: List[RoomObject]           # Initial detected layout
+    original_layout: Sequence[RoomObject]       # Initial detected layout (read-only tuple)
     current_layout: List[RoomObject]            # Layout being optimized/edited
     locked_object_ids: List[str]                # User-locked objects
     
@@ -60,13 +60,14 @@ class AgentState(TypedDict):
     
     # === Control ===
     should_continue: bool                       # Whether to keep iterating
+    batch_mode: Optional[bool]                  # Render via Gemini Batch Mode (offline runs)
     error: Optional[str]                        # Error message if failed
 
 
 def create_initial_state(
     image_base64: str,
     room_dimensions: RoomDimensions,
-    objects: List[RoomObject],
+    objects: Sequence[RoomObject],
     locked_ids: List[str] = None,
     max_iterations: int = 5
 ) -> AgentState:
@@ -86,8 +87,10 @@ def create_initial_state(
     return AgentState(
         image_base64=image_base64,
         room_dimensions=room_dimensions,
-        original_layout=objects.copy(),
-        current_layout=objects.copy(),
+        # The original is never edited: keep it as an immutable tuple and
+        # give nodes a separate list to modify
+        original_layout=tuple(objects),
+        current_layout=list(objects),
         locked_object_ids=locked_ids or [],
         layout_variations=None,
         selected_variation_index=None,
@@ -103,6 +106,7 @@ def create_initial_state(
         edit_command=None,
         edit_history=None,
         should_continue=True,
+        batch_mode=False,
         error=None
     )
 
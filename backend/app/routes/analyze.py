@@ -8,11 +8,13 @@ FULLY TRACED with LangSmith.
 """
 
 from fastapi import APIRouter, HTTPException, UploadFile, File
-import base64
 import logging
+from typing import Union
 
 from app.models.api import AnalyzeRequest, AnalyzeResponse
 from app.agents.vision_node import VisionAgent, get_vision_agent
+from app.core import imaging
+from app.core.exceptions import InvalidImageError
 
 # LangSmith tracing
 try:
@@ -44,10 +46,15 @@ async def analyze_room(request: AnalyzeRequest) -> AnalyzeResponse:
     
     TRACED: Full trace with Gemini call details.
     """
+    return await _analyze_image(request.image_base64)
+
+
+async def _analyze_image(image: Union[str, bytes]) -> AnalyzeResponse:
+    """Shared body of both endpoints; `image` is base64 or the raw upload bytes."""
     try:
         # Call Gemini Vision (via VisionAgent - also traced)
         agent = get_vision_agent()
-        vision_output = await agent.analyze_room(request.image_base64)
+        vision_output = await agent.analyze_room(image)
         
         # Check for initial issues
         return AnalyzeResponse(
@@ -59,6 +66,10 @@ async def analyze_room(request: AnalyzeRequest) -> AnalyzeResponse:
             image_height=vision_output.image_height,
         )
         
+    except InvalidImageError:
+        # Handled by the app-level handler (400)
+        raise
+        
     except ValueError as e:
         logger.error(f"Configuration error: {e}")
         raise HTTPException(status_code=500, detail=str(e))
@@ -88,10 +99,11 @@ async def analyze_room_upload(file: UploadFile = File(...)) -> AnalyzeResponse:
             detail=f"Invalid file type. Allowed: {allowed_types}"
         )
     
-    # Read and convert to base64
-    contents = await file.read()
-    image_base64 = base64.b64encode(contents).decode("utf-8")
+    # Reject oversized files from the declared size before reading them
+    if file.size is not None:
+        imaging.check_upload_size(file.size)
     
-    # Call the main analyze function
-    request = AnalyzeRequest(image_base64=image_base64)
-    return await analyze_room(request)
\ No newline at end of file
+    # The raw bytes go straight to the vision agent, no base64 round trip
+    contents = await file.read()
+    imaging.check_upload_size(len(contents))
+    return await _analyze_image(contents)
\ No newline at end of file
@@ -6,12 +6,12 @@ POST /chat/edit - Process conversational edit commands for room layouts and imag
 FULLY TRACED with LangSmith.
 """
 
-from fastapi import APIRouter, HTTPException
+from fastapi import APIRouter
 from pydantic import BaseModel
 from typing import List, Optional
 
 from app.models.room import RoomObject, RoomDimensions
-from app.agents.chat_editor_node import ChatEditor
+from app.agents.chat_editor_node import get_chat_editor
 
 # LangSmith tracing
 try:
@@ -66,27 +66,20 @@ async def chat_edit(request: ChatEditRequest) -> ChatEditResponse:
     
     TRACED: Full trace with command parsing and edit application.
     """
-    try:
-        editor = ChatEditor()
-        
-        result = await editor.process_edit_command(
-            command=request.command,
-            current_layout=request.current_layout,
-            room_dims=request.room_dimensions,
-            current_image_base64=request.current_image_base64,
-            layout_plan=request.layout_plan
-        )
-        
-        return ChatEditResponse(
-            edit_type=result.get("edit_type", "error"),
-            updated_layout=result.get("updated_layout", request.current_layout),
-            updated_image_base64=result.get("updated_image_base64"),
-            explanation=result.get("explanation", "Edit processed"),
-            needs_rerender=result.get("needs_rerender", False)
-        )
-        
-    except Exception as e:
-        raise HTTPException(
-            status_code=500,
-            detail=f"Chat edit failed: {str(e)}"
-        )
\ No newline at end of file
+    editor = get_chat_editor()
+    
+    result = await editor.process_edit_command(
+        command=request.command,
+        current_layout=request.current_layout,
+        room_dims=request.room_dimensions,
+        current_image_base64=request.current_image_base64,
+        layout_plan=request.layout_plan
+    )
+    
+    return ChatEditResponse(
+        edit_type=result.get("edit_type", "error"),
+        updated_layout=result.get("updated_layout", request.current_layout),
+        updated_image_base64=result.get("updated_image_base64"),
+        explanation=result.get("explanation", "Edit processed"),
+        needs_rerender=result.get("needs_rerender", False)
+    )
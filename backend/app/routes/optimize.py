@@ -10,11 +10,18 @@ FIXES APPLIED:
 2. Better error handling and validation
 3. "Creative" renamed to "Space Optimized" throughout
 
+POST /optimize/stream - Same, as Server-Sent Events: one event per
+variation as soon as its preview image is ready.
+
 Layout styles: Work Focused, Cozy, Space Optimized
 """
 
 import asyncio
+import logging
+
+import orjson
 from fastapi import APIRouter, HTTPException
+from fastapi.responses import StreamingResponse
 
 from app.models.api import OptimizeRequest, OptimizeResponse, LayoutVariation
 from app.models.room import ObjectType
@@ -34,6 +41,23 @@ except ImportError:
 
 
 router = APIRouter(prefix="/optimize", tags=["Optimization"])
+logger = logging.getLogger(__name__)
+
+
+def _lock_layout(request: OptimizeRequest) -> set:
+    """
+    Mark structural, already-locked and user-locked objects as locked in
+    one pass and return their ids. User locks are checked against a set,
+    not the request list.
+    """
+    user_locked = set(request.locked_ids)
+    complete_locked_ids = set(user_locked)
+    for obj in request.current_layout:
+        if obj.type is ObjectType.STRUCTURAL or obj.id in user_locked:
+            obj.is_locked = True
+        if obj.is_locked:
+            complete_locked_ids.add(obj.id)
+    return complete_locked_ids
 
 
 @router.post("", response_model=OptimizeResponse)
@@ -55,21 +79,7 @@ async def optimize_layout(request: OptimizeRequest) -> OptimizeResponse:
         # STEP 1: Build complete locked_ids including ALL structural objects
         # AND any objects with is_locked=True
         # This ensures structural objects are NEVER moved
-        complete_locked_ids = set(request.locked_ids)
-        
-        for obj in request.current_layout:
-            # Add structural objects to locked list
-            if obj.type == ObjectType.STRUCTURAL:
-                complete_locked_ids.add(obj.id)
-                obj.is_locked = True  # Also mark as locked
-            
-            # Add any objects already marked as locked
-            if obj.is_locked:
-                complete_locked_ids.add(obj.id)
-            
-            # Mark user-locked objects
-            if obj.id in request.locked_ids:
-                obj.is_locked = True
+        complete_locked_ids = _lock_layout(request)
         
         locked_ids_list = list(complete_locked_ids)
         
@@ -148,4 +158,49 @@ async def optimize_layout(request: OptimizeRequest) -> OptimizeResponse:
         raise HTTPException(
             status_code=500,
             detail=f"Layout optimization failed: {str(e)}"
-        )
\ No newline at end of file
+        )
+
+@router.post("/stream")
+@traceable(name="optimize_layout_stream_endpoint", run_type="chain", tags=["api", "optimization", "designer", "stream"])
+async def optimize_layout_stream(request: OptimizeRequest) -> StreamingResponse:
+    """
+    Stream layout variations as Server-Sent Events.
+    
+    Each `variation` event carries one LayoutVariation as soon as its
+    preview image finishes; a final `done` (or `error`) event closes
+    the stream.
+    """
+    complete_locked_ids = _lock_layout(request)
+
+    if not any(o.id not in complete_locked_ids for o in request.current_layout):
+        raise HTTPException(
+            status_code=400,
+            detail="No movable objects found. All objects are either structural or locked."
+        )
+
+    designer = InteriorDesignerAgent()
+
+    async def events():
+        try:
+            async for var in designer.iter_layout_variations(
+                current_layout=request.current_layout,
+                room_dims=request.room_dimensions,
+                locked_ids=list(complete_locked_ids),
+                image_base64=request.image_base64
+            ):
+                variation = LayoutVariation(
+                    name=var["name"],
+                    description=var["description"],
+                    layout=var["layout"],
+                    layout_plan=var.get("layout_plan"),
+                    thumbnail_base64=var.get("thumbnail_base64"),
+                    door_info=var.get("door_info"),
+                    window_info=var.get("window_info"),
+                )
+                yield f"event: variation\ndata: {variation.model_dump_json()}\n\n"
+            yield "event: done\ndata: {}\n\n"
+        except Exception as e:
+            logger.exception("Stream error")
+            yield f"event: error\ndata: {orjson.dumps({'detail': str(e)}).decode()}\n\n"
+
+    return StreamingResponse(events(), media_type="text/event-stream")
@@ -7,15 +7,15 @@ POST /render/perspective - Generate a photorealistic perspective view.
 FULLY TRACED with LangSmith.
 """
 
-from fastapi import APIRouter, HTTPException
+from fastapi import APIRouter
 from pydantic import BaseModel
 from typing import List, Optional
 import asyncio
 
 from app.models.room import RoomObject, RoomDimensions
 from app.models.api import RenderRequest, RenderResponse, PerspectiveRequest, PerspectiveResponse
-from app.tools.edit_image import EditImageTool
-from app.agents.perspective_node import PerspectiveGenerator
+from app.tools.edit_image import get_edit_image_tool
+from app.agents.perspective_node import get_perspective_generator
 
 # LangSmith tracing
 try:
@@ -32,6 +32,24 @@ except ImportError:
 router = APIRouter(prefix="/render", tags=["Rendering"])
 
 
+def _describe_move(change: dict) -> str:
+    """One instruction line: where the object is, where it goes, and which way."""
+    fx, fy, fw, fh = change["from"]
+    tx, ty, tw, th = change["to"]
+    dx = (tx + tw / 2) - (fx + fw / 2)
+    dy = (ty + th / 2) - (fy + fh / 2)
+    directions = []
+    if dx:
+        directions.append("right" if dx > 0 else "left")
+    if dy:
+        directions.append("down" if dy > 0 else "up")
+    way = f"move it {' and '.join(directions)}" if directions else "keep it in place, resized"
+    return (
+        f"- the {change['label']}: from [{fx}, {fy}, {fw}, {fh}] "
+        f"to [{tx}, {ty}, {tw}, {th}] ({way})"
+    )
+
+
 
 
 
@@ -48,30 +66,23 @@ async def generate_perspective(request: PerspectiveRequest) -> PerspectiveRespon
     
     TRACED: Full trace with Gemini image generation details.
     """
-    try:
-        generator = PerspectiveGenerator()
-        
-        image_base64 = await generator.generate_side_view(
-            room_dims=request.room_dimensions,
-            style=request.style,
-            view_angle=request.view_angle,
-            lighting="natural daylight",
-            image_base64=request.image_base64,
-            layout_plan=request.layout_plan,
-            door_info=request.door_info,
-            window_info=request.window_info,
-        )
-        
-        return PerspectiveResponse(
-            image_base64=image_base64,
-            message="Perspective view generated successfully"
-        )
-        
-    except Exception as e:
-        raise HTTPException(
-            status_code=500,
-            detail=f"Perspective generation failed: {str(e)}"
-        )
+    generator = get_perspective_generator()
+    
+    image_base64 = await generator.generate_side_view(
+        room_dims=request.room_dimensions,
+        style=request.style,
+        view_angle=request.view_angle,
+        lighting="natural daylight",
+        image_base64=request.image_base64,
+        layout_plan=request.layout_plan,
+        door_info=request.door_info,
+        window_info=request.window_info,
+    )
+    
+    return PerspectiveResponse(
+        image_base64=image_base64,
+        message="Perspective view generated successfully"
+    )
 
 
 @router.post("", response_model=RenderResponse)
@@ -88,19 +99,19 @@ async def render_layout(request: RenderRequest) -> RenderResponse:
     
     TRACED: Full trace with image edit details.
     """
-    # Calculate what changed
-    changes = []
-    original_positions = {obj.id: obj.bbox for obj in request.original_layout}
-    
-    for obj in request.final_layout:
-        original_bbox = original_positions.get(obj.id)
-        if original_bbox and original_bbox != obj.bbox:
-            changes.append({
-                "object_id": obj.id,
-                "label": obj.label,
-                "from": original_bbox,
-                "to": obj.bbox
-            })
+    # Calculate what changed: bboxes as tuples so each check is one
+    # tuple compare, and objects not in the original are skipped
+    original_bboxes = {obj.id: tuple(obj.bbox) for obj in request.original_layout}
+    changes = [
+        {
+            "object_id": obj.id,
+            "label": obj.label,
+            "from": original_bboxes[obj.id],
+            "to": obj.bbox
+        }
+        for obj in request.final_layout
+        if obj.id in original_bboxes and original_bboxes[obj.id] != tuple(obj.bbox)
+    ]
     
     if not changes:
         return RenderResponse(
@@ -111,26 +122,29 @@ async def render_layout(request: RenderRequest) -> RenderResponse:
     
     # Try to apply edits using Gemini
     try:
-        editor = EditImageTool()
-        current_image = request.original_image_base64
+        editor = get_edit_image_tool()
         
-        change_descriptions = []
+        # Edits to one image don't commute (parallel per-object edits would
+        # give separate images that can't be merged), so rather than chaining
+        # one Gemini round trip per object, all moves go out in a single edit
+        # that spells out each object's old and new position
+        instruction = (
+            "Move the following furniture to its new position. Positions are "
+            "[x, y, width, height] in floor-plan coordinates, measured from the top-left corner.\n"
+            + "\n".join(_describe_move(change) for change in changes)
+            + "\nLeave everything else where it is. Keep the same furniture style and lighting."
+        )
         
-        for change in changes:
-            instruction = (
-                f"Move the {change['label']} from its current position "
-                f"to the new location. Keep the same furniture style and lighting."
-            )
-            
-            current_image = await editor.edit_image(
-                base_image=current_image,
-                instruction=instruction
-            )
-            
-            change_descriptions.append(
-                f"Moved {change['label']} from ({change['from'][0]}, {change['from'][1]}) "
-                f"to ({change['to'][0]}, {change['to'][1]})"
-            )
+        current_image = await editor.edit_image(
+            base_image=request.original_image_base64,
+            instruction=instruction
+        )
+        
+        change_descriptions = [
+            f"Moved {change['label']} from ({change['from'][0]}, {change['from'][1]}) "
+            f"to ({change['to'][0]}, {change['to'][1]})"
+            for change in changes
+        ]
         
         return RenderResponse(
             image_url=None,
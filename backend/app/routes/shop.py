@@ -12,6 +12,7 @@ from pydantic import BaseModel, Field
 from typing import List, Optional, Dict, Any
 
 from app.models.room import RoomObject
+from app.agents.shopping_node import ShoppingAgent
 
 try:
     from langsmith import traceable
@@ -88,8 +89,6 @@ async def shop_products(request: ShopRequest) -> ShopResponse:
     TRACED: Full trace including Gemini + SerpAPI calls.
     """
     try:
-        from app.agents.shopping_node import ShoppingAgent
-
         agent = ShoppingAgent()
 
         result = await agent.find_products(
@@ -7,15 +7,14 @@ Used by Designer Agent for layout previews and Chat Editor for surgical edits.
 FULLY TRACED with LangSmith - all Gemini image editing calls are tracked.
 """
 
-import base64
 import io
-import asyncio
-from typing import Optional, List, Dict
-from google import genai
+from functools import lru_cache
+from typing import AsyncIterator, Optional, List, Dict, Tuple
 from google.genai import types
 from PIL import Image
 
 from app.config import get_settings
+from app.core import gemini, imaging
 
 # LangSmith tracing
 try:
@@ -29,6 +28,10 @@ except ImportError:
         return decorator
 
 
+# Request config is the same on every call; build it once
+_EDIT_CONFIG = types.GenerateContentConfig(response_modalities=["IMAGE", "TEXT"], temperature=0.5)
+
+
 class EditImageTool:
     """
     Tool for applying edits to floor plan and room images using Gemini.
@@ -39,7 +42,7 @@ class EditImageTool:
         settings = get_settings()
         if not settings.google_api_key:
             raise ValueError("GOOGLE_API_KEY environment variable is not set")
-        self.client = genai.Client(api_key=settings.google_api_key)
+        self.client = gemini.get_genai_client(settings.google_api_key)
         self.model = settings.render_image_model_name
 
     @traceable(
@@ -67,10 +70,9 @@ class EditImageTool:
             
         TRACED: Full tool execution with movement details.
         """
-        if "," in base_image:
-            base_image = base_image.split(",")[1]
+        base_image = imaging.strip_data_url(base_image)
         
-        image_data = base64.b64decode(base_image)
+        image_data = imaging.b64decode(base_image)
         
         # Build movement instructions
         movement_lines = []
@@ -131,11 +133,16 @@ Generate the modified floor plan with furniture repositioned."""
             
         TRACED: Full tool execution with instruction details.
         """
-        if "," in base_image:
-            base_image = base_image.split(",")[1]
+        base_image = imaging.strip_data_url(base_image)
             
-        image_data = base64.b64decode(base_image)
+        image_data = imaging.b64decode(base_image)
         
+        prompt, edit_type = self._build_edit_prompt(instruction)
+        return await self._call_gemini_edit(image_data, prompt, edit_type)
+
+    @staticmethod
+    def _build_edit_prompt(instruction: str) -> Tuple[str, str]:
+        """Pick the floor-plan or perspective prompt for a general edit."""
         # Detect if this is likely a floor plan or a perspective render
         is_floor_plan = any(kw in instruction.lower() for kw in [
             "floor plan", "top-down", "move the", "reposition", "layout"
@@ -168,7 +175,52 @@ REQUIREMENTS:
 Generate the edited image."""
 
         edit_type = "floor_plan_edit" if is_floor_plan else "perspective_edit"
-        return await self._call_gemini_edit(image_data, prompt, edit_type)
+        return prompt, edit_type
+
+    @traceable(
+        name="edit_image_tool.edit_image_stream",
+        run_type="tool",
+        tags=["tool", "image", "edit", "general", "stream"],
+        metadata={"description": "Stream general edit results as they arrive"}
+    )
+    async def edit_image_stream(
+        self,
+        base_image: str,
+        instruction: str
+    ) -> AsyncIterator[str]:
+        """
+        Streaming variant of edit_image. Yields base64 image frames as the
+        model returns them; the last frame is the final edit.
+        
+        TRACED: Full tool execution with instruction details.
+        """
+        base_image = imaging.strip_data_url(base_image)
+            
+        image_data = imaging.b64decode(base_image)
+        prompt, edit_type = self._build_edit_prompt(instruction)
+        
+        got_image = False
+        try:
+            async for chunk in gemini.generate_content_stream(
+                self.client,
+                model=self.model,
+                contents=[
+                    types.Part.from_bytes(data=image_data, mime_type="image/jpeg"),
+                    prompt
+                ],
+                config=_EDIT_CONFIG
+            ):
+                if not chunk.candidates or not chunk.candidates[0].content:
+                    continue
+                for part in chunk.candidates[0].content.parts or []:
+                    if hasattr(part, 'inline_data') and part.inline_data:
+                        got_image = True
+                        yield imaging.b64encode_str(part.inline_data.data)
+        except Exception as e:
+            raise RuntimeError(f"Image editing failed ({edit_type}): {str(e)}")
+        
+        if not got_image:
+            raise RuntimeError(f"Image editing failed ({edit_type}): No image generated in response")
 
     @traceable(
         name="edit_image_tool.edit_perspective_view",
@@ -193,10 +245,9 @@ Generate the edited image."""
             
         TRACED: Full tool execution for perspective edits.
         """
-        if "," in base_image:
-            base_image = base_image.split(",")[1]
+        base_image = imaging.strip_data_url(base_image)
         
-        image_data = base64.b64decode(base_image)
+        image_data = imaging.b64decode(base_image)
         
         prompt = f"""Edit this interior design photograph.
 
@@ -231,24 +282,31 @@ Generate the edited room photograph."""
         TRACED as an LLM call for proper visualization in LangSmith.
         Shows input prompt, edit type, and tracks success/failure.
         """
+        edited = await self._request_edit(image_data, prompt, edit_type)
+        return imaging.b64encode_str(edited)
+
+    async def _request_edit(
+        self,
+        image_data: bytes,
+        prompt: str,
+        edit_type: str = "general"
+    ) -> bytes:
+        """Run one Gemini image edit and return the raw edited image bytes."""
         try:
-            response = await asyncio.to_thread(
-                self.client.models.generate_content,
+            response = await gemini.generate_content(
+                self.client,
                 model=self.model,
                 contents=[
                     types.Part.from_bytes(data=image_data, mime_type="image/jpeg"),
                     prompt
                 ],
-                config=types.GenerateContentConfig(
-                    response_modalities=["IMAGE", "TEXT"],
-                    temperature=0.5
-                )
+                config=_EDIT_CONFIG
             )
             
             if response.candidates:
                 for part in response.candidates[0].content.parts:
                     if hasattr(part, 'inline_data') and part.inline_data:
-                        return base64.b64encode(part.inline_data.data).decode('utf-8')
+                        return part.inline_data.data
             
             raise RuntimeError("No image generated in response")
             
@@ -278,12 +336,20 @@ Generate the edited room photograph."""
             
         TRACED: Full batch operation with all intermediate steps.
         """
-        current_image = base_image
+        if not instructions:
+            return base_image
         
-        for i, instruction in enumerate(instructions):
-            current_image = await self.edit_image(
-                base_image=current_image,
-                instruction=instruction
-            )
+        # Chain the edits on raw bytes; encode to base64 once at the end
+        current_image = imaging.b64decode(imaging.strip_data_url(base_image))
+        
+        for instruction in instructions:
+            prompt, edit_type = self._build_edit_prompt(instruction)
+            current_image = await self._request_edit(current_image, prompt, edit_type)
         
-        return current_image
\ No newline at end of file
+        return imaging.b64encode_str(current_image)
+
+
+@lru_cache(maxsize=1)
+def get_edit_image_tool() -> EditImageTool:
+    """Shared EditImageTool so routes don't rebuild it per request."""
+    return EditImageTool()
@@ -7,10 +7,10 @@ Used by Designer Agent and Perspective Generator.
 
 import base64
 from typing import Optional
-from google import genai
 from google.genai import types
 
 from app.config import get_settings
+from app.core import gemini
 
 
 class RenderImageTool:
@@ -22,7 +22,7 @@ class RenderImageTool:
         settings = get_settings()
         if not settings.google_api_key:
             raise ValueError("GOOGLE_API_KEY environment variable is not set")
-        self.client = genai.Client(api_key=settings.google_api_key)
+        self.client = gemini.get_genai_client(settings.google_api_key)
         self.model = "gemini-2.5-flash-image"  # Image generation model
     
     def generate_image(self, prompt: str) -> str:
@@ -6,8 +6,12 @@ Used by the Shopping Agent to find real products for the user's room.
 """
 
 import asyncio
+import logging
+import time
+import weakref
+from collections import OrderedDict
 import httpx
-from typing import List, Dict, Any, Optional
+from typing import List, Dict, Any, Optional, Tuple
 
 from app.config import get_settings
 
@@ -22,7 +26,64 @@ except ImportError:
         return decorator
 
 
+logger = logging.getLogger(__name__)
+
 SERPAPI_BASE_URL = "https://serpapi.com/search.json"
+SERPAPI_MAX_CONNECTIONS = 20
+SERPAPI_KEEPALIVE_S = 30.0
+
+# One pooled client per running loop (httpx clients are loop-bound), reused
+# by every search so warm requests skip the TCP/TLS handshake.
+_http_clients: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, httpx.AsyncClient]" = (
+    weakref.WeakKeyDictionary()
+)
+
+
+def _get_http_client() -> httpx.AsyncClient:
+    loop = asyncio.get_running_loop()
+    client = _http_clients.get(loop)
+    if client is None or client.is_closed:
+        client = _http_clients[loop] = httpx.AsyncClient(
+            timeout=30,
+            limits=httpx.Limits(
+                max_connections=SERPAPI_MAX_CONNECTIONS,
+                max_keepalive_connections=10,
+                keepalive_expiry=SERPAPI_KEEPALIVE_S,
+            ),
+        )
+    return client
+
+
+# ============================================================================
+# RESULTS CACHE — raw shopping_results keyed on (query, num)
+# ============================================================================
+# Price filtering runs per call, so different budgets share one entry
+_RESULTS_CACHE_MAX = 512
+_RESULTS_CACHE_TTL_S = 3600.0
+_results_cache: "OrderedDict[Tuple[str, int], Tuple[float, List[Dict[str, Any]]]]" = OrderedDict()
+
+def _results_cache_get(key: Tuple[str, int]) -> Optional[List[Dict[str, Any]]]:
+    entry = _results_cache.get(key)
+    if entry is None:
+        return None
+    if entry[0] <= time.monotonic():
+        del _results_cache[key]
+        return None
+    _results_cache.move_to_end(key)
+    return entry[1]
+
+def _results_cache_put(key: Tuple[str, int], results: List[Dict[str, Any]]):
+    _results_cache[key] = (time.monotonic() + _RESULTS_CACHE_TTL_S, results)
+    _results_cache.move_to_end(key)
+    if len(_results_cache) > _RESULTS_CACHE_MAX:
+        _results_cache.popitem(last=False)
+
+
+async def close_http_client() -> None:
+    """Close the running loop's pooled SerpAPI client (app shutdown)."""
+    client = _http_clients.pop(asyncio.get_running_loop(), None)
+    if client is not None:
+        await client.aclose()
 
 
 class SerpSearchTool:
@@ -59,31 +120,71 @@ class SerpSearchTool:
         Returns:
             List of product dicts with title, price, link, thumbnail, source, rating.
         """
-        params = {
-            "engine": "google_shopping",
-            "q": query,
-            "api_key": self.api_key,
-            "num": min(num_results * 3, 30),  # fetch extra to allow price filtering
-            "hl": "en",
-            "gl": "us",
-        }
+        return await self._search(_get_http_client(), query, max_price, num_results)
+
+    @traceable(
+        name="serp_search_tool.search_shopping_batch",
+        run_type="tool",
+        tags=["tool", "serpapi", "shopping", "batch"],
+        metadata={"description": "Search Google Shopping for several products at once"}
+    )
+    async def search_shopping_batch(
+        self,
+        queries: List[Tuple[str, Optional[float]]],
+        num_results: int = 5,
+    ) -> List[List[Dict[str, Any]]]:
+        """
+        Run several (query, max_price) searches concurrently over the shared
+        keep-alive connection pool. SerpAPI has no multi-query endpoint, so
+        this saves the per-query TCP/TLS setup rather than the requests.
+
+        Returns:
+            One product list per query, in input order.
+        """
+        client = _get_http_client()
+        return list(await asyncio.gather(*(
+            self._search(client, query, max_price, num_results)
+            for query, max_price in queries
+        )))
+
+    async def _search(
+        self,
+        client: httpx.AsyncClient,
+        query: str,
+        max_price: Optional[float],
+        num_results: int,
+    ) -> List[Dict[str, Any]]:
+        num = min(num_results * 3, 30)  # fetch extra to allow price filtering
 
         try:
-            async with httpx.AsyncClient(timeout=30) as client:
+            shopping_results = _results_cache_get((query, num))
+            if shopping_results is None:
+                params = {
+                    "engine": "google_shopping",
+                    "q": query,
+                    "api_key": self.api_key,
+                    "num": num,
+                    "hl": "en",
+                    "gl": "us",
+                }
                 response = await client.get(SERPAPI_BASE_URL, params=params)
                 response.raise_for_status()
                 data = response.json()
 
-            shopping_results = data.get("shopping_results", [])
+                shopping_results = data.get("shopping_results", [])
+                _results_cache_put((query, num), shopping_results)
+            else:
+                logger.debug("Results cache hit: %r", query)
             
             # DEBUG: Inspect first item fields to find direct links
-            if shopping_results:
-                print(f"[SerpAPI Debug] First item keys: {list(shopping_results[0].keys())}")
-                print(f"[SerpAPI Debug] First item link: {shopping_results[0].get('link')}")
+            if shopping_results and logger.isEnabledFor(logging.DEBUG):
+                first = shopping_results[0]
+                logger.debug("First item keys: %s", list(first.keys()))
+                logger.debug("First item link: %s", first.get("link"))
                 # Check for other potential link fields people might use
                 for k in ['product_link', 'offer_link', 'merchant_link', 'display_link', 'dest_url']:
-                    if k in shopping_results[0]:
-                        print(f"[SerpAPI Debug]   {k}: {shopping_results[0][k]}")
+                    if k in first:
+                        logger.debug("  %s: %s", k, first[k])
 
             products = []
             for item in shopping_results:
@@ -138,8 +239,8 @@ class SerpSearchTool:
             return products
 
         except httpx.HTTPStatusError as e:
-            print(f"[SerpAPI] HTTP error: {e.response.status_code} — {e.response.text[:200]}")
+            logger.warning("HTTP error: %s — %s", e.response.status_code, e.response.text[:200])
             return []
         except Exception as e:
-            print(f"[SerpAPI] Search failed: {e}")
+            logger.warning("Search failed: %s", e)
             return []
\ No newline at end of file
@@ -19,3 +19,7 @@ class VisionConfig(BaseModel):
 
     # Safety / robustness
     max_objects: int = int(os.getenv("VISION_MAX_OBJECTS", "25"))
+
+    # Long edge uploads are shrunk to before sending (0 sends them as is);
+    # room detection needs far fewer pixels than a phone photo carries
+    image_max_side: int = int(os.getenv("VISION_IMAGE_MAX_SIDE", "1536"))
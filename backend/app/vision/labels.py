@@ -6,7 +6,10 @@ Gemini might say "table" and later YOLO might say "dining table".
 We normalize both into the same canonical labels so downstream stays stable.
 """
 
-CANONICAL_LABELS = {
+import re
+from functools import lru_cache
+
+CANONICAL_LABELS = frozenset({
     "bed",
     "desk",
     "chair",
@@ -16,7 +19,7 @@ CANONICAL_LABELS = {
     "lamp",
     "door",
     "window",
-}
+})
 
 # Common synonyms -> canonical labels
 LABEL_ALIASES = {
@@ -30,11 +33,15 @@ LABEL_ALIASES = {
 }
 
 
-STRUCTURAL_LABELS = {"door", "window"}
+STRUCTURAL_LABELS = frozenset({"door", "window"})
+
+
+# Runs of whitespace, underscores and hyphens collapse to a single space
+_SEPARATORS_RE = re.compile(r"[\s_-]+")
 
 
+@lru_cache(maxsize=1024)
 def normalize_label(label: str) -> str:
-    key = (label or "").strip().lower()
-    key = key.replace("_", " ").replace("-", " ")
-    key = " ".join(key.split())
+    # Vision output repeats a handful of labels, so results are memoized
+    key = _SEPARATORS_RE.sub(" ", (label or "").lower()).strip()
     return LABEL_ALIASES.get(key, key)
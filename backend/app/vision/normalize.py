@@ -1,41 +1,68 @@
 # app/vision/normalize.py
 from __future__ import annotations
 
-from typing import List, Dict
+from typing import List, Dict, Tuple
 from collections import defaultdict
 
-from app.models.room import RoomObject, ObjectType
-from app.vision.labels import normalize_label, STRUCTURAL_LABELS, CANONICAL_LABELS
-
+import numpy as np
 
-def _clamp_int(v: int, lo: int, hi: int) -> int:
-    return max(lo, min(hi, int(v)))
+from app.models.room import RoomObject, ObjectType, VisionOutput
+from app.vision.labels import normalize_label, STRUCTURAL_LABELS, CANONICAL_LABELS
 
 
-def assign_ids(objects: List[RoomObject]) -> List[RoomObject]:
+def clamp_bboxes(bboxes: np.ndarray, room_width: int, room_height: int) -> np.ndarray:
     """
-    Ensure stable IDs like bed_1, bed_2...
-    If Gemini already returns good IDs, we keep them unless duplicates exist.
+    Clamp an (N, 4) array of [x, y, w, h] boxes to the image bounds in one
+    pass: origin inside the image, size at least 1 and not past the edge.
     """
+    out = np.asarray(bboxes, dtype=np.int64).reshape(-1, 4).copy()
+    np.clip(out[:, 0], 0, room_width - 1, out=out[:, 0])
+    np.clip(out[:, 1], 0, room_height - 1, out=out[:, 1])
+    out[:, 2] = np.clip(out[:, 2], 1, room_width - out[:, 0])
+    out[:, 3] = np.clip(out[:, 3], 1, room_height - out[:, 1])
+    return out
+
+
+def _stable_ids(ids: List[str], labels: List[str]) -> List[str]:
+    """Keep proposed ids unless missing or duplicated; otherwise <label>_<n>."""
     seen = set()
     counts: Dict[str, int] = defaultdict(int)
 
-    out: List[RoomObject] = []
-    for obj in objects:
-        label = normalize_label(obj.label)
+    out: List[str] = []
+    for obj_id, label in zip(ids, labels):
         counts[label] += 1
-        proposed = obj.id.strip() if obj.id else ""
+        proposed = obj_id.strip() if obj_id else ""
 
         if not proposed or proposed in seen:
             proposed = f"{label}_{counts[label]}"
 
         seen.add(proposed)
-        out.append(obj.model_copy(update={"id": proposed, "label": label}))
+        out.append(proposed)
     return out
 
 
+def assign_ids(objects: List[RoomObject]) -> List[RoomObject]:
+    """
+    Ensure stable IDs like bed_1, bed_2...
+    If Gemini already returns good IDs, we keep them unless duplicates exist.
+    """
+    labels = [normalize_label(obj.label) for obj in objects]
+    ids = _stable_ids([obj.id for obj in objects], labels)
+    return [
+        obj.model_copy(update={"id": obj_id, "label": label})
+        for obj, obj_id, label in zip(objects, ids, labels)
+    ]
+
+
+# Known labels -> type, built once; anything else is movable
+_TYPE_TABLE: Dict[str, ObjectType] = {
+    label: ObjectType.STRUCTURAL if label in STRUCTURAL_LABELS else ObjectType.MOVABLE
+    for label in CANONICAL_LABELS | STRUCTURAL_LABELS
+}
+
+
 def infer_object_type(label: str) -> ObjectType:
-    return ObjectType.STRUCTURAL if label in STRUCTURAL_LABELS else ObjectType.MOVABLE
+    return _TYPE_TABLE.get(label, ObjectType.MOVABLE)
 
 
 def normalize_objects(
@@ -50,41 +77,45 @@ def normalize_objects(
     """
     locked = set(locked_ids or [])
 
-    normalized: List[RoomObject] = []
-    for obj in objects:
-        label = normalize_label(obj.label)
-
-        # Allow only canonical or pass through (your choice). Here: pass-through but normalized.
-        # If you want strict: if label not in CANONICAL_LABELS: continue
-        x, y, w, h = obj.bbox
-
-        # clamp to image bounds (best effort)
-        x = _clamp_int(x, 0, room_width - 1)
-        y = _clamp_int(y, 0, room_height - 1)
-        w = _clamp_int(w, 1, room_width - x)
-        h = _clamp_int(h, 1, room_height - y)
-
-        obj_type = infer_object_type(label)
-        is_locked = (obj.id in locked) or obj.is_locked
-
-        normalized.append(
-            obj.model_copy(
-                update={
-                    "label": label,
-                    "bbox": [x, y, w, h],
-                    "type": obj_type,
-                    "is_locked": is_locked,
-                }
-            )
-        )
-
-    # ensure unique, stable IDs after normalization
-    normalized = assign_ids(normalized)
+    # clamp to image bounds (best effort), all objects at once
+    bboxes = clamp_bboxes([o.bbox for o in objects], room_width, room_height).tolist()
 
-    # re-apply locked_ids after possible ID changes
-    # if user locked "bed_1" etc. this should already match; if not, you can add a mapping layer later.
-    for i, obj in enumerate(normalized):
-        if obj.id in locked:
-            normalized[i] = obj.model_copy(update={"is_locked": True})
+    # Allow only canonical or pass through (your choice). Here: pass-through but normalized.
+    # If you want strict: if label not in CANONICAL_LABELS: continue
+    labels = [normalize_label(obj.label) for obj in objects]
 
-    return normalized
+    # ensure unique, stable IDs after normalization
+    ids = _stable_ids([obj.id for obj in objects], labels)
+
+    # One copy per object with every normalized field at once. A user lock
+    # matches either the original id or the reassigned one.
+    return [
+        obj.model_copy(
+            update={
+                "id": obj_id,
+                "label": label,
+                "bbox": bbox,
+                "type": _TYPE_TABLE.get(label, ObjectType.MOVABLE),
+                "is_locked": obj.is_locked or obj.id in locked or obj_id in locked,
+            }
+        )
+        for obj, obj_id, label, bbox in zip(objects, ids, labels, bboxes)
+    ]
+
+
+def rescale_output(output: VisionOutput, src: Tuple[int, int], dst: Tuple[int, int]) -> VisionOutput:
+    """Map pixel-space bboxes/wall bounds from a src-sized image onto dst."""
+    if src == dst:
+        return output
+    sx, sy = dst[0] / src[0], dst[1] / src[1]
+
+    def scale(box):
+        x, y, w, h = box
+        return [round(x * sx), round(y * sy), round(w * sx), round(h * sy)]
+
+    return output.model_copy(update={
+        "objects": [o.model_copy(update={"bbox": scale(o.bbox)}) for o in output.objects],
+        "wall_bounds": scale(output.wall_bounds) if output.wall_bounds else output.wall_bounds,
+        "image_width": dst[0] if output.image_width is not None else None,
+        "image_height": dst[1] if output.image_height is not None else None,
+    })
@@ -1,12 +1,34 @@
 # app/vision/providers/base.py
 from __future__ import annotations
 
+import asyncio
 from abc import ABC, abstractmethod
+from typing import List, Union
+
 from app.models.room import VisionOutput
 
+# A base64 string (optionally a data URL), or the raw image bytes when the
+# caller already has them (e.g. a multipart upload) to skip the base64 round trip
+ImageInput = Union[str, bytes]
+
 
 class VisionProvider(ABC):
     @abstractmethod
-    def analyze(self, image_base64: str) -> VisionOutput:
-        """Return a structured VisionOutput from a base64 image."""
+    def analyze(self, image_base64: ImageInput) -> VisionOutput:
+        """Return a structured VisionOutput from a base64 image or raw image bytes."""
         raise NotImplementedError
+
+    def analyze_many(self, images_base64: List[ImageInput]) -> List[VisionOutput]:
+        """
+        Analyze several images, one VisionOutput per image in input order.
+        Providers that can pack images into one request override this.
+        """
+        return [self.analyze(image) for image in images_base64]
+
+    async def analyze_async(self, image_base64: ImageInput) -> VisionOutput:
+        """Async analyze; the default runs the blocking analyze in a worker thread."""
+        return await asyncio.to_thread(self.analyze, image_base64)
+
+    async def analyze_many_async(self, images_base64: List[ImageInput]) -> List[VisionOutput]:
+        """Async analyze_many; the default runs it in a worker thread."""
+        return await asyncio.to_thread(self.analyze_many, images_base64)
@@ -1,67 +1,115 @@
 # app/vision/providers/gemini_provider.py
 from __future__ import annotations
 
-import base64
-import json
-import re
-from typing import Any
+import asyncio
+import hashlib
+import threading
+from collections import OrderedDict
+from functools import lru_cache
+from typing import Any, Literal, Optional
 
-from app.models.room import VisionOutput
+import orjson
+from pydantic import BaseModel, Field
+
+# Imported once here rather than per call; kept optional so your app doesn't
+# crash if the dependency isn't installed yet
+try:
+    from google import genai  # type: ignore
+    from google.genai import types  # type: ignore
+except Exception:  # pragma: no cover
+    genai = None
+    types = None
+
+from app.core import gemini, imaging
+from app.core.json_stream import JsonArrayStreamParser
+from app.models.room import RoomObject, VisionOutput
 from app.vision.config import VisionConfig
+from app.vision.normalize import rescale_output
 from app.vision.providers.base import VisionProvider
 
 
-_JSON_RE = re.compile(r"\{.*\}", re.DOTALL)
+# Bump when the prompt or schema below changes so cached analyses are not reused
+PROMPT_VERSION = "2"
 
+# Parsed analyses from the sync analyze() path (the LangGraph vision node),
+# keyed on the image bytes plus everything that shapes the reply. Stored as
+# JSON so every hit hands back a fresh VisionOutput. The async path is
+# already cached by VisionAgent.
+ANALYSIS_CACHE_SIZE = 256
+_analysis_cache: "OrderedDict[str, str]" = OrderedDict()
+_analysis_cache_lock = threading.Lock()
 
-def _strip_data_url(b64: str) -> str:
-    # supports "data:image/jpeg;base64,...."
-    if "," in b64 and b64.strip().lower().startswith("data:"):
-        return b64.split(",", 1)[1]
-    return b64
 
+def _analysis_cache_get(key: str) -> Optional[str]:
+    with _analysis_cache_lock:
+        output_json = _analysis_cache.get(key)
+        if output_json is not None:
+            _analysis_cache.move_to_end(key)
+        return output_json
 
-def _ensure_json(text: str) -> dict[str, Any]:
+
+def _analysis_cache_put(key: str, output_json: str) -> None:
+    with _analysis_cache_lock:
+        _analysis_cache[key] = output_json
+        _analysis_cache.move_to_end(key)
+        if len(_analysis_cache) > ANALYSIS_CACHE_SIZE:
+            _analysis_cache.popitem(last=False)
+
+
+def _find_json_object(text: str, start: int) -> Optional[str]:
     """
-    Gemini sometimes returns JSON surrounded by text.
-    We extract the first {...} block if needed.
+    Slice the balanced {...} object that opens at text[start], in one
+    forward scan tracking brace depth and skipping string literals.
+    Returns None if the object never closes.
     """
-    text = (text or "").strip()
-    if text.startswith("{") and text.endswith("}"):
-        return json.loads(text)
+    depth = 0
+    in_string = False
+    escaped = False
+    for i in range(start, len(text)):
+        ch = text[i]
+        if in_string:
+            if escaped:
+                escaped = False
+            elif ch == "\\":
+                escaped = True
+            elif ch == '"':
+                in_string = False
+        elif ch == '"':
+            in_string = True
+        elif ch == "{":
+            depth += 1
+        elif ch == "}":
+            depth -= 1
+            if depth == 0:
+                return text[start:i + 1]
+    return None
 
-    m = _JSON_RE.search(text)
-    if not m:
-        raise ValueError(f"Gemini did not return JSON. Got: {text[:200]}...")
-    return json.loads(m.group(0))
 
+def _json_text(text: str) -> str:
+    """
+    The JSON object in the model's reply. Requests use JSON mode, so the
+    reply is normally bare JSON and is returned as is; the brace scan for a
+    {...} block only runs when Gemini wrapped it in fences or prose.
+    """
+    text = text or ""
+    start = text.find("{")
+    if start >= 0 and not text[:start].strip() and not text[text.rfind("}") + 1:].strip():
+        return text
 
-class GeminiVisionProvider(VisionProvider):
-    def __init__(self, cfg: VisionConfig):
-        self.cfg = cfg
-        # Lazy import so your app doesn’t crash if dependency isn’t installed yet
-        try:
-            from google import genai  # type: ignore
-        except Exception as e:
-            raise RuntimeError(
-                "google-genai is not installed or import failed. "
-                "Install it or switch VISION_PROVIDER."
-            ) from e
+    obj = _find_json_object(text, start) if start >= 0 else None
+    if obj is None:
+        raise ValueError(f"Gemini did not return JSON. Got: {text.strip()[:200]}...")
+    return obj
 
-        # API key mode (simple). Vertex/ADC mode is also possible depending on your setup.
-        # If using Vertex via ADC, you can omit api_key and rely on env auth.
-        if cfg.gemini_api_key:
-            self.client = genai.Client(api_key=cfg.gemini_api_key)
-        else:
-            self.client = genai.Client()
 
-    def analyze(self, image_base64: str) -> VisionOutput:
-        from google.genai import types  # type: ignore
+def _ensure_json(text: str) -> dict[str, Any]:
+    """Parse the model's JSON reply into a dict."""
+    return orjson.loads(_json_text(text))
 
-        b64 = _strip_data_url(image_base64)
-        _ = base64.b64decode(b64)  # validate base64 early
 
-        schema_hint = """
+@lru_cache(maxsize=4)
+def _build_prompt(max_objects: int) -> str:
+    schema_hint = """
 Return ONLY valid JSON matching this schema (no markdown, no extra text):
 {
   "room_dimensions": { "width_estimate": int, "height_estimate": int },
@@ -81,30 +129,211 @@ Rules:
 - Include doors/windows if visible.
 - If unsure about label, use "other".
 - Keep object count <= %d.
-""" % self.cfg.max_objects
+""" % max_objects
 
-        prompt = f"""
+    return f"""
 You are a vision extractor for a small bedroom layout planner.
 Analyze the room image and produce structured detections for planning.
 
 {schema_hint}
 """
 
-        contents = [
-            types.Part.from_text(prompt),
-            types.Part.from_bytes(data=base64.b64decode(b64), mime_type="image/jpeg"),
-        ]
 
-        resp = self.client.models.generate_content(
-            model=self.cfg.gemini_model,
-            contents=contents,
+@lru_cache(maxsize=4)
+def _build_multi_prompt(max_objects: int) -> str:
+    return _build_prompt(max_objects) + """
+You will receive several images, each preceded by an "IMAGE n:" label.
+Analyze each image independently and return ONLY:
+{ "images": [ <one object per image, in order, each matching the schema above> ] }
+"""
+
+
+# Structured-output schemas mirroring the prompt's schema. Gemini constrains
+# decoding to them, so replies arrive as bare, well-formed JSON and take the
+# parse fast path. Kept separate from VisionOutput: Gemini's schema subset
+# has no exclusiveMinimum or tuple items.
+class _ReplyDimensions(BaseModel):
+    width_estimate: int
+    height_estimate: int
+
+
+class _ReplyObject(BaseModel):
+    id: str
+    label: str
+    bbox: list[int] = Field(min_length=4, max_length=4)
+    type: Literal["movable", "structural"]
+    orientation: int
+    is_locked: bool
+
+
+class _VisionReply(BaseModel):
+    room_dimensions: _ReplyDimensions
+    objects: list[_ReplyObject]
+
+
+class _MultiVisionReply(BaseModel):
+    images: list[_VisionReply]
+
+
+class GeminiVisionProvider(VisionProvider):
+    def __init__(self, cfg: VisionConfig):
+        self.cfg = cfg
+        if genai is None:
+            raise RuntimeError(
+                "google-genai is not installed or import failed. "
+                "Install it or switch VISION_PROVIDER."
+            )
+
+        # API key mode (simple). Vertex/ADC mode is also possible depending on your setup.
+        # If using Vertex via ADC, you can omit api_key and rely on env auth.
+        # With a key, share the process-wide pooled client (keep-alive
+        # connections reused across requests and agents).
+        if cfg.gemini_api_key:
+            self.client = gemini.get_genai_client(cfg.gemini_api_key)
+        else:
+            self.client = genai.Client()
+
+        # The prompt only depends on config: build it once and send it ahead of
+        # the image, so every request shares the same token prefix and Gemini's
+        # implicit prefix cache can skip reprocessing it. Kept as ready Parts so
+        # the SDK does not re-wrap the strings on every call.
+        self._prompt_part = types.Part.from_text(text=_build_prompt(cfg.max_objects))
+        self._multi_prompt_part = types.Part.from_text(text=_build_multi_prompt(cfg.max_objects))
+        # JSON schema mode: no markdown fences or malformed JSON, so the stream
+        # can be parsed as it arrives
+        self._config = types.GenerateContentConfig(
+            response_mime_type="application/json", response_schema=_VisionReply
+        )
+        self._multi_config = types.GenerateContentConfig(
+            response_mime_type="application/json", response_schema=_MultiVisionReply
         )
 
+    def _image_part(self, image_bytes: bytes) -> tuple[Any, Optional[tuple[tuple[int, int], tuple[int, int]]]]:
+        """
+        Shrink one decoded upload for Gemini to cfg.image_max_side (returned
+        pixel bboxes are scaled back by the caller). Returns the image part and,
+        when it was downscaled, the (sent_size, original_size) pair needed to
+        map the returned pixel coordinates back onto the original image.
+        """
+        # The real type matters when the original is sent as is (re-encode
+        # failed or was not smaller): a PNG labelled image/jpeg can be misread
+        mime = imaging.sniff_mime(image_bytes)
+        if self.cfg.image_max_side <= 0:
+            return types.Part.from_bytes(data=image_bytes, mime_type=mime), None
+        data, mime = imaging.prepare_for_model(image_bytes, mime, max_side=self.cfg.image_max_side)
+        scale = None
+        if data is not image_bytes:
+            original, sent = imaging.image_size(image_bytes), imaging.image_size(data)
+            if original and sent and original != sent:
+                scale = (sent, original)
+        return types.Part.from_bytes(data=data, mime_type=mime), scale
+
+    def _contents(self, image_base64: str | bytes) -> tuple[list[Any], list]:
+        part, scale = self._image_part(imaging.decode_upload(image_base64))
+        return [self._prompt_part, part], [scale]
+
+    def _multi_contents(self, images_base64: list[str | bytes]) -> tuple[list[Any], list]:
+        contents: list[Any] = [self._multi_prompt_part]
+        scales = []
+        for i, image_base64 in enumerate(images_base64, 1):
+            part, scale = self._image_part(imaging.decode_upload(image_base64))
+            contents.append(f"IMAGE {i}:")
+            contents.append(part)
+            scales.append(scale)
+        return contents, scales
+
+    @staticmethod
+    def _restore_scale(output: VisionOutput, scale) -> VisionOutput:
+        return rescale_output(output, *scale) if scale else output
+
+    @staticmethod
+    def _parse(resp: Any) -> VisionOutput:
         # google-genai responses vary: prefer resp.text
         text = getattr(resp, "text", None)
         if not text:
             # try dig in candidates
             text = str(resp)
 
-        data = _ensure_json(text)
-        return VisionOutput.model_validate(data)
+        # pydantic-core parses and validates in one pass, without a dict in between
+        return VisionOutput.model_validate_json(_json_text(text))
+
+    @staticmethod
+    def _parse_many(resp: Any, count: int) -> list[VisionOutput]:
+        text = getattr(resp, "text", None) or str(resp)
+        results = _ensure_json(text).get("images")
+        if not isinstance(results, list) or len(results) != count:
+            got = len(results) if isinstance(results, list) else 0
+            raise ValueError(f"Gemini returned {got} analyses for {count} images")
+        return [VisionOutput.model_validate(data) for data in results]
+
+    def _cache_key(self, image_bytes: bytes) -> str:
+        h = hashlib.blake2b(image_bytes, digest_size=16)
+        h.update(
+            f"|{self.cfg.gemini_model}|{self.cfg.max_objects}|{self.cfg.image_max_side}|{PROMPT_VERSION}".encode()
+        )
+        return h.hexdigest()
+
+    def analyze(self, image_base64: str | bytes) -> VisionOutput:
+        image_bytes = imaging.decode_upload(image_base64)
+        key = self._cache_key(image_bytes)
+        cached = _analysis_cache_get(key)
+        if cached is not None:
+            return VisionOutput.model_validate_json(cached)
+
+        part, scale = self._image_part(image_bytes)
+        resp = self.client.models.generate_content(
+            model=self.cfg.gemini_model,
+            contents=[self._prompt_part, part],
+            config=self._config,
+        )
+        output = self._restore_scale(self._parse(resp), scale)
+        _analysis_cache_put(key, output.model_dump_json())
+        return output
+
+    async def analyze_async(self, image_base64: str | bytes) -> VisionOutput:
+        # Native async client: the request doesn't hold a worker thread, and
+        # it shares the app-wide Gemini concurrency limit and retry policy.
+        # Streamed, so each detection is validated as soon as it closes while
+        # the rest of the response is still arriving.
+        contents, scales = await asyncio.to_thread(self._contents, image_base64)
+        parser = JsonArrayStreamParser("objects")
+        objects: list[RoomObject] = []
+        async for chunk in gemini.generate_content_stream(
+            self.client,
+            model=self.cfg.gemini_model,
+            contents=contents,
+            config=self._config,
+        ):
+            objects.extend(RoomObject.model_validate(o) for o in parser.feed(chunk.text or ""))
+
+        data = _ensure_json(parser.text)
+        # Reuse the streamed objects unless the scanner skipped a malformed one
+        if isinstance(data.get("objects"), list) and len(data["objects"]) == len(objects):
+            data["objects"] = objects
+        return self._restore_scale(VisionOutput.model_validate(data), scales[0])
+
+    def analyze_many(self, images_base64: list[str | bytes]) -> list[VisionOutput]:
+        """Analyze several images in a single generate_content call."""
+        if len(images_base64) == 1:
+            return [self.analyze(images_base64[0])]
+        contents, scales = self._multi_contents(images_base64)
+        resp = self.client.models.generate_content(
+            model=self.cfg.gemini_model,
+            contents=contents,
+            config=self._multi_config,
+        )
+        outputs = self._parse_many(resp, len(images_base64))
+        return [self._restore_scale(o, scale) for o, scale in zip(outputs, scales)]
+
+    async def analyze_many_async(self, images_base64: list[str | bytes]) -> list[VisionOutput]:
+        if len(images_base64) == 1:
+            return [await self.analyze_async(images_base64[0])]
+        contents, scales = await asyncio.to_thread(self._multi_contents, images_base64)
+        resp = await gemini.generate_content(
+            self.client,
+            model=self.cfg.gemini_model,
+            contents=contents,
+            config=self._multi_config,
+        )
+        outputs = self._parse_many(resp, len(images_base64))
+        return [self._restore_scale(o, scale) for o, scale in zip(outputs, scales)]
@@ -0,0 +1,212 @@
+"""
+Tests for shared helpers: streaming JSON parser, fast command parser,
+base64 sniffing and vision output rescaling
+
+Run with: pytest tests/test_helpers.py -v
+"""
+
+import sys
+import os
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import base64
+
+import orjson
+
+from app.core import imaging
+from app.core.json_stream import JsonArrayStreamParser
+from app.agents.chat_editor_node import _fast_parse
+from app.models.room import RoomObject, ObjectType, RoomDimensions, VisionOutput
+from app.vision.normalize import rescale_output
+
+
+# ============ JsonArrayStreamParser Tests ============
+
+STREAM_ITEMS = [
+    {"id": "a", "note": 'brace } and bracket ] in a string'},
+    {"id": "b", "note": 'escaped \\"quote\\" and backslash \\\\', "nested": {"x": [1, 2]}},
+    {"id": "c", "note": "{not an object}"},
+]
+STREAM_TEXT = orjson.dumps({"room": "x", "objects": STREAM_ITEMS, "done": True}).decode()
+
+
+def _feed_in_chunks(text, size, key="objects"):
+    parser = JsonArrayStreamParser(key)
+    items = []
+    for i in range(0, len(text), size):
+        items.extend(parser.feed(text[i:i + size]))
+    return parser, items
+
+
+def test_stream_parser_whole_text():
+    """All array elements come back when the response arrives at once."""
+    parser, items = _feed_in_chunks(STREAM_TEXT, len(STREAM_TEXT))
+    assert items == STREAM_ITEMS
+    assert parser.text == STREAM_TEXT
+    print("✓ Stream parser handles a single chunk")
+
+
+def test_stream_parser_any_chunk_split():
+    """Splits inside strings, escapes and the key itself give the same result."""
+    for size in (1, 2, 3, 5, 7, 13):
+        parser, items = _feed_in_chunks(STREAM_TEXT, size)
+        assert items == STREAM_ITEMS, f"chunk size {size}"
+        assert parser.text == STREAM_TEXT
+    print("✓ Stream parser is independent of chunk boundaries")
+
+
+def test_stream_parser_yields_items_early():
+    """An element is returned as soon as its closing brace arrives."""
+    parser = JsonArrayStreamParser("objects")
+    assert parser.feed('{"objects": [{"id": "a"}, {"id": ') == [{"id": "a"}]
+    assert parser.feed('"b"}]}') == [{"id": "b"}]
+    assert parser.feed(' trailing {"id": "c"}') == []
+    print("✓ Stream parser yields completed elements early")
+
+
+def test_stream_parser_skips_unrelated_arrays():
+    """Arrays before the key's own array, or after a non-array value, are ignored."""
+    text = orjson.dumps({
+        "wall_bounds": [0, 0, 10, 10],
+        "summary": "objects",
+        "meta": {"objects": None, "tags": [{"id": "wrong"}]},
+        "objects": [{"id": "right"}],
+    }).decode()
+    for size in (1, 4, len(text)):
+        _, items = _feed_in_chunks(text, size)
+        assert items == [{"id": "right"}], f"chunk size {size}"
+    print("✓ Stream parser only reads the key's array")
+
+
+def test_stream_parser_missing_key():
+    """No elements are returned when the key never appears."""
+    _, items = _feed_in_chunks('{"plans": [{"id": "a"}]}', 4)
+    assert items == []
+    print("✓ Stream parser ignores other keys")
+
+
+# ============ _fast_parse Tests ============
+
+FAST_LAYOUT = [
+    RoomObject(id="bed_1", label="bed", bbox=[10, 10, 100, 200]),
+    RoomObject(id="chair_1", label="chair", bbox=[150, 10, 40, 40]),
+    RoomObject(id="chair_2", label="chair", bbox=[200, 10, 40, 40]),
+    RoomObject(id="desk_1", label="office_desk", bbox=[150, 100, 80, 50]),
+    RoomObject(id="door_1", label="door", bbox=[0, 0, 30, 5], type=ObjectType.STRUCTURAL),
+]
+
+
+def test_fast_parse_move():
+    """Plain move commands resolve by label, with an optional distance."""
+    parsed = _fast_parse("Move the bed to the left by a lot.", FAST_LAYOUT)
+    assert parsed["action"] == "move"
+    assert parsed["target_object_id"] == "bed_1"
+    assert parsed["parameters"] == {"direction": "left", "distance": "large"}
+
+    parsed = _fast_parse("move office desk up", FAST_LAYOUT)
+    assert parsed["target_object_id"] == "desk_1"
+    assert parsed["parameters"] == {"direction": "up", "distance": "medium"}
+    print("✓ Fast parse accepts move commands")
+
+
+def test_fast_parse_rotate():
+    """Rotate commands resolve by id or label and default to 90 degrees."""
+    parsed = _fast_parse("rotate chair_2 180 degrees", FAST_LAYOUT)
+    assert parsed["action"] == "rotate"
+    assert parsed["target_object_id"] == "chair_2"
+    assert parsed["parameters"] == {"rotation": 180}
+
+    parsed = _fast_parse("rotate the bed", FAST_LAYOUT)
+    assert parsed["parameters"] == {"rotation": 90}
+    print("✓ Fast parse accepts rotate commands")
+
+
+def test_fast_parse_rejects():
+    """Ambiguous, unknown or free-form commands fall through to Gemini."""
+    rejected = [
+        "move the chair left",           # two chairs
+        "move the sofa right",           # no such object
+        "rotate the bed 45 degrees",     # unsupported angle
+        "move the bed next to the door",  # not a plain direction
+        "paint the walls sage green",
+        "",
+    ]
+    for command in rejected:
+        assert _fast_parse(command, FAST_LAYOUT) is None, command
+    print("✓ Fast parse rejects commands it can't resolve")
+
+
+# ============ looks_like_base64 Tests ============
+
+def test_looks_like_base64_accepts_base64():
+    """Standard, urlsafe and line-wrapped base64 pass the check."""
+    payload = bytes(range(256)) * 8
+    assert imaging.looks_like_base64(base64.b64encode(payload).decode())
+    assert imaging.looks_like_base64(base64.urlsafe_b64encode(payload).decode())
+    assert imaging.looks_like_base64(base64.encodebytes(payload).decode())
+    print("✓ looks_like_base64 accepts base64")
+
+
+def test_looks_like_base64_data_url():
+    """A data URL only passes once its prefix is stripped."""
+    data_url = "data:image/png;base64," + base64.b64encode(b"\x89PNG" * 16).decode()
+    assert not imaging.looks_like_base64(data_url)
+    assert imaging.looks_like_base64(imaging.strip_data_url(data_url))
+    print("✓ looks_like_base64 handles data URLs")
+
+
+def test_looks_like_base64_rejects_text():
+    """JSON, URLs and prose are rejected without decoding."""
+    rejected = [
+        "",
+        '{"image": "abc"}',
+        "https://example.com/room.jpg",
+        "this is not an image at all",
+        base64.b64encode(b"x" * 64).decode() + "!",
+    ]
+    for data in rejected:
+        assert not imaging.looks_like_base64(data), data
+    print("✓ looks_like_base64 rejects non-base64 text")
+
+
+# ============ rescale_output Tests ============
+
+def _vision_output(with_size=True):
+    return VisionOutput(
+        room_dimensions=RoomDimensions(width_estimate=400, height_estimate=300),
+        objects=[
+            RoomObject(id="bed_1", label="bed", bbox=[40, 60, 120, 200]),
+            RoomObject(id="desk_1", label="desk", bbox=[250, 20, 80, 50]),
+        ],
+        wall_bounds=[0, 0, 400, 300],
+        image_width=400 if with_size else None,
+        image_height=300 if with_size else None,
+    )
+
+
+def test_rescale_output_round_trip():
+    """Scaling up and back down restores the original pixel coordinates."""
+    original = _vision_output()
+    scaled = rescale_output(original, (400, 300), (800, 600))
+    assert scaled.objects[0].bbox == [80, 120, 240, 400]
+    assert scaled.wall_bounds == [0, 0, 800, 600]
+    assert (scaled.image_width, scaled.image_height) == (800, 600)
+
+    restored = rescale_output(scaled, (800, 600), (400, 300))
+    assert restored == original
+    # The input model is left untouched
+    assert original.objects[0].bbox == [40, 60, 120, 200]
+    print("✓ rescale_output round-trips")
+
+
+def test_rescale_output_same_size_and_missing_fields():
+    """Same-size rescales are a no-op; unset size fields stay unset."""
+    original = _vision_output(with_size=False)
+    assert rescale_output(original, (400, 300), (400, 300)) is original
+
+    original.wall_bounds = None
+    scaled = rescale_output(original, (400, 300), (200, 150))
+    assert scaled.wall_bounds is None
+    assert scaled.image_width is None and scaled.image_height is None
+    assert scaled.objects[1].bbox == [125, 10, 40, 25]
+    print("✓ rescale_output keeps unset fields")